@@ -1,8 +1,93 @@
 from __future__ import annotations
+import logging
+import os
+from contextlib import contextmanager
 from datetime import datetime
-from airflow.sdk import dag, task
+from typing import Iterator
+from airflow.exceptions import AirflowException, AirflowSkipException
+from airflow.sdk import dag, task, get_current_context
 
-from pipeline.etl import extract, clean_validate, transform, load
+from pipeline.etl import (
+    extract,
+    clean_validate,
+    transform,
+    load,
+    stream,
+    quarantine,
+    checkpoint,
+    handoff,
+    metrics,
+)
+
+# Arquivo de entrada. O formato (CSV, CSV comprimido, Parquet ou Arrow IPC) é detectado pela extensão
+INPUT_PATH = os.getenv("PIPELINE_INPUT_PATH", "pipeline/rastreamento.csv")
+
+# Diretório dos arquivos de quarentena com as linhas rejeitadas de cada execução
+QUARANTINE_DIR = "pipeline/quarentena"
+
+# Checkpoint da extração incremental, confirmado apenas após um carregamento
+# bem-sucedido. Cada DAG tem o seu: as DAGs podem rodar ao mesmo tempo, e uma não
+# pode confirmar o offset lido pela outra
+CHECKPOINT_PATH = "pipeline/rastreamento.{dag_id}.checkpoint.json"
+
+# Diretório dos arquivos Parquet trocados entre as tasks. Com mais de um worker,
+# deve apontar para um caminho compartilhado entre eles
+HANDOFF_DIR = os.getenv("PIPELINE_HANDOFF_DIR", "pipeline/handoff")
+
+# Diretório dos relatórios de métricas (JSON por execução e arquivo .prom por DAG)
+METRICS_DIR = os.getenv("PIPELINE_METRICS_DIR", "pipeline/metricas")
+
+logger = logging.getLogger(__name__)
+
+
+def _checkpoint_path(context) -> str:
+    return CHECKPOINT_PATH.format(dag_id=context["dag"].dag_id)
+
+
+def _metricas_da_task(context) -> metrics.RunMetrics:
+    return metrics.RunMetrics(context["dag"].dag_id, context["run_id"])
+
+
+@contextmanager
+def _metricas_parciais(context, parte: str) -> Iterator[metrics.RunMetrics]:
+    """
+    Métricas de uma task, gravadas como parciais da execução mesmo se a task
+    falhar, para que o relatório indique a etapa que falhou.
+    """
+    metricas = _metricas_da_task(context)
+    try:
+        yield metricas
+    finally:
+        try:
+            metricas.save_partial(parte, METRICS_DIR)
+        except Exception as e:
+            logger.exception(f"Não foi possível gravar as métricas parciais: {e}")
+
+
+def _gravar_relatorio(context, sucesso: bool):
+    """
+    Combina as métricas parciais das tasks da execução e grava o relatório final.
+    Chamada pelos callbacks de sucesso e de falha das DAGs, então execuções que
+    falharam ou foram puladas também geram relatório. Erros ao gravá-lo são
+    apenas registrados, para não se sobreporem à falha da execução.
+    """
+    try:
+        metricas = metrics.merge_partials(
+            context["dag"].dag_id, context["run_id"], METRICS_DIR
+        )
+        metricas.finish(sucesso)
+        metricas.write(METRICS_DIR)
+        metrics.prune_partials(METRICS_DIR)
+    except Exception as e:
+        logger.exception(f"Não foi possível gravar o relatório de métricas: {e}")
+
+
+def _relatorio_sucesso(context):
+    _gravar_relatorio(context, True)
+
+
+def _relatorio_falha(context):
+    _gravar_relatorio(context, False)
 
 
 @dag(
@@ -11,8 +96,13 @@ from pipeline.etl import extract, clean_validate, transform, load
     start_date=datetime(2025, 1, 1),
     schedule="@daily",
     catchup=False,
+    # Execuções simultâneas da mesma DAG disputariam o mesmo checkpoint pendente
+    max_active_runs=1,
     tags=["etl", "rastreamento"],
     default_args={"retries": 3},
+    on_success_callback=_relatorio_sucesso,
+    on_failure_callback=_relatorio_falha,
+    params={"load_connections": 1},
 )
 def etl_rastreamento_pipeline():
     """
@@ -22,27 +112,238 @@ def etl_rastreamento_pipeline():
 
     @task(task_id="extrair_dados")
     def task_extract():
-        return extract.extract_from_csv("pipeline/rastreamento.csv")
+        context = get_current_context()
+        checkpoint_path = _checkpoint_path(context)
+        with _metricas_parciais(context, "extrair_dados") as metricas:
+            with metricas.stage("extract") as etapa:
+                df_raw = extract.extract_from_csv(
+                    INPUT_PATH, checkpoint_path, context["run_id"]
+                )
+                etapa["linhas_saida"] = 0 if df_raw is None else len(df_raw)
+        if df_raw is None:
+            # A extração retorna None tanto ao falhar quanto sem linhas novas; só
+            # no segundo caso ela registra o checkpoint pendente desta execução
+            pendente = checkpoint.read_pending_checkpoint(checkpoint_path)
+            if pendente is None or pendente.get("run_id") != context["run_id"]:
+                raise AirflowException(f"Falha na extração do arquivo '{INPUT_PATH}'.")
+            return None
+
+        return handoff.write_handoff(df_raw, context["run_id"], "bruto", HANDOFF_DIR)
 
     @task(task_id="limpar_e_validar_dados")
-    def task_clean_validate(df_raw):
-        return clean_validate.clean_and_validate(df_raw)
+    def task_clean_validate(ref_bruto):
+        # Na extração incremental, dias sem linhas novas não têm o que carregar
+        if ref_bruto is None:
+            raise AirflowSkipException("Nenhuma linha nova para processar.")
+
+        context = get_current_context()
+        run_id = context["run_id"]
+        quarantine_path = quarantine.quarantine_path_for_run(run_id, QUARANTINE_DIR)
+        df_raw = handoff.read_handoff(ref_bruto)
+
+        with _metricas_parciais(context, "limpar_e_validar_dados") as metricas:
+            with metricas.stage("clean_validate", len(df_raw)) as etapa:
+                df_clean = clean_validate.clean_and_validate(df_raw, quarantine_path)
+                etapa["linhas_saida"] = len(df_clean)
+
+        return handoff.write_handoff(df_clean, run_id, "limpo", HANDOFF_DIR)
 
     @task(task_id="transformar_dados")
-    def task_transform(df_clean):
-        return transform.transform(df_clean)
+    def task_transform(ref_limpo):
+        context = get_current_context()
+        run_id = context["run_id"]
+        df_clean = handoff.read_handoff(ref_limpo)
+
+        with _metricas_parciais(context, "transformar_dados") as metricas:
+            with metricas.stage("transform", len(df_clean)) as etapa:
+                df_pacotes, df_eventos = transform.transform(df_clean)
+                etapa["linhas_saida"] = len(df_eventos)
+
+        return {
+            "pacotes": handoff.write_handoff(
+                df_pacotes, run_id, "pacotes", HANDOFF_DIR
+            ),
+            "eventos": handoff.write_handoff(
+                df_eventos, run_id, "eventos", HANDOFF_DIR
+            ),
+        }
 
     @task(task_id="carregar_dados")
-    def task_load(transformed_data):
-        df_pacotes, df_eventos = transformed_data
-        load.load_data(df_pacotes, df_eventos)
+    def task_load(refs_transformados):
+        context = get_current_context()
+        df_pacotes = handoff.read_handoff(refs_transformados["pacotes"])
+        df_eventos = handoff.read_handoff(refs_transformados["eventos"])
+
+        # Com mais de uma conexão, os eventos são carregados em paralelo
+        load_connections = int(context["params"]["load_connections"])
+        with _metricas_parciais(context, "carregar_dados") as metricas:
+            with metrics.collecting(metricas), metricas.stage("load", len(df_eventos)):
+                if load_connections > 1:
+                    load.load_data_parallel(df_pacotes, df_eventos, load_connections)
+                else:
+                    load.load_data(df_pacotes, df_eventos)
+        checkpoint.commit_checkpoint(_checkpoint_path(context), context["run_id"])
+
+        # Execução concluída: os arquivos intermediários não são mais necessários
+        handoff.cleanup_handoff(context["run_id"], HANDOFF_DIR)
+
+    # Fluxo das tasks (pelo XCom trafegam apenas caminhos e contagens de linhas)
+    ref_bruto = task_extract()
+    ref_limpo = task_clean_validate(ref_bruto)
+    refs_transformados = task_transform(ref_limpo)
+    task_load(refs_transformados)
+
+
+@dag(
+    dag_id="dag_pipeline_rastreamento_streaming",
+    description="DAG que executa o pipeline do rastreamento em lotes, com memória limitada.",
+    start_date=datetime(2025, 1, 1),
+    schedule="@daily",
+    catchup=False,
+    max_active_runs=1,
+    tags=["etl", "rastreamento", "streaming"],
+    default_args={"retries": 3},
+    on_success_callback=_relatorio_sucesso,
+    on_failure_callback=_relatorio_falha,
+    params={"chunksize": extract.DEFAULT_CHUNKSIZE},
+)
+def etl_rastreamento_pipeline_streaming():
+    """
+    ETL de Rastreamento em Streaming
+    Uma única task percorre o CSV em lotes por todas as etapas, pois os lotes
+    não podem trafegar entre tasks sem serem materializados.
+    """
+
+    @task(task_id="processar_em_lotes")
+    def task_stream():
+        context = get_current_context()
+        chunksize = int(context["params"]["chunksize"])
+        quarantine_path = quarantine.quarantine_path_for_run(
+            context["run_id"], QUARANTINE_DIR
+        )
+        # As etapas de cada lote são somadas nas métricas da execução
+        with _metricas_parciais(context, "processar_em_lotes") as metricas:
+            with metrics.collecting(metricas):
+                load.load_data_in_chunks(
+                    stream.transform_csv_in_chunks(
+                        INPUT_PATH,
+                        chunksize,
+                        quarantine_path,
+                        _checkpoint_path(context),
+                        context["run_id"],
+                    )
+                )
+        checkpoint.commit_checkpoint(_checkpoint_path(context), context["run_id"])
+
+    task_stream()
+
+
+@dag(
+    dag_id="dag_pipeline_rastreamento_sharded",
+    description="DAG que processa o rastreamento em shards paralelos, com uma carga única ao final.",
+    start_date=datetime(2025, 1, 1),
+    schedule="@daily",
+    catchup=False,
+    max_active_runs=1,
+    tags=["etl", "rastreamento", "sharded"],
+    default_args={"retries": 3},
+    on_success_callback=_relatorio_sucesso,
+    on_failure_callback=_relatorio_falha,
+    params={"num_shards": 4, "load_connections": 1},
+)
+def etl_rastreamento_pipeline_sharded():
+    """
+    ETL de Rastreamento em Shards
+    O CSV é dividido em intervalos de bytes, cada um extraído, limpo e transformado
+    por uma task mapeada dinamicamente. Uma única task final combina os shards na
+    ordem do arquivo e carrega o resultado, idêntico ao da execução serial.
+    """
+
+    @task(task_id="planejar_shards")
+    def task_plan_shards():
+        context = get_current_context()
+        num_shards = int(context["params"]["num_shards"])
+        shards = extract.plan_byte_shards(
+            INPUT_PATH, num_shards, _checkpoint_path(context), context["run_id"]
+        )
+        if not shards:
+            raise AirflowSkipException("Nenhuma linha nova para processar.")
+        return shards
+
+    @task(task_id="processar_shard")
+    def task_process_shard(shard):
+        context = get_current_context()
+        run_id = context["run_id"]
+        numero = shard["numero"]
+
+        # As métricas dos shards são somadas por etapa no relatório da execução
+        with _metricas_parciais(context, f"shard{numero:04d}") as metricas:
+            with metricas.stage("extract") as etapa:
+                df_raw = extract.extract_byte_range(
+                    INPUT_PATH, shard["inicio"], shard["fim"]
+                )
+                etapa["linhas_saida"] = 0 if df_raw is None else len(df_raw)
+            if df_raw is None:
+                return None
+
+            # Cada shard tem seu próprio arquivo de quarentena, evitando escrita concorrente
+            quarantine_path = quarantine.quarantine_path_for_run(
+                f"{run_id}_shard{numero:04d}", QUARANTINE_DIR
+            )
+            with metricas.stage("clean_validate", len(df_raw)) as etapa:
+                df_clean = clean_validate.clean_and_validate(df_raw, quarantine_path)
+                etapa["linhas_saida"] = len(df_clean)
+            with metricas.stage("transform", len(df_clean)) as etapa:
+                df_pacotes, df_eventos = transform.transform(df_clean)
+                etapa["linhas_saida"] = len(df_eventos)
+
+        return {
+            "numero": numero,
+            "pacotes": handoff.write_handoff(
+                df_pacotes, run_id, f"pacotes_{numero:04d}", HANDOFF_DIR
+            ),
+            "eventos": handoff.write_handoff(
+                df_eventos, run_id, f"eventos_{numero:04d}", HANDOFF_DIR
+            ),
+        }
+
+    @task(task_id="carregar_dados")
+    def task_load(resultados):
+        context = get_current_context()
+
+        # Os shards são combinados na ordem do arquivo para reproduzir a execução serial
+        resultados = sorted(
+            (r for r in resultados if r is not None), key=lambda r: r["numero"]
+        )
+        if not resultados:
+            checkpoint.commit_checkpoint(_checkpoint_path(context), context["run_id"])
+            return
+
+        df_pacotes, df_eventos = transform.merge_transformed(
+            [
+                (handoff.read_handoff(r["pacotes"]), handoff.read_handoff(r["eventos"]))
+                for r in resultados
+            ]
+        )
+
+        load_connections = int(context["params"]["load_connections"])
+        with _metricas_parciais(context, "carregar_dados") as metricas:
+            with metrics.collecting(metricas), metricas.stage("load", len(df_eventos)):
+                if load_connections > 1:
+                    load.load_data_parallel(df_pacotes, df_eventos, load_connections)
+                else:
+                    load.load_data(df_pacotes, df_eventos)
+        checkpoint.commit_checkpoint(_checkpoint_path(context), context["run_id"])
+
+        handoff.cleanup_handoff(context["run_id"], HANDOFF_DIR)
 
     # Fluxo das tasks
-    df_bruto = task_extract()
-    df_limpo = task_clean_validate(df_bruto)
-    dados_transformados = task_transform(df_limpo)
-    task_load(dados_transformados)
+    shards = task_plan_shards()
+    resultados = task_process_shard.expand(shard=shards)
+    task_load(resultados)
 
 
-# Instancia a DAG
+# Instancia as DAGs
 etl_rastreamento_pipeline()
+etl_rastreamento_pipeline_streaming()
+etl_rastreamento_pipeline_sharded()
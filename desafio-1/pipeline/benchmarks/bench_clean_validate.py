@@ -0,0 +1,136 @@
+"""
+Compara o caminho antigo de leitura + limpeza (texto como `object` e
+`pd.to_datetime` sem formato) com o schema tipado de `etl/schema.py`.
+
+Uso (a partir de desafio-1/pipeline):
+    python -m benchmarks.bench_clean_validate --linhas 3000000
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+import multiprocessing
+import resource
+
+import numpy as np
+import pandas as pd
+
+from etl.clean_validate import clean_and_validate
+from etl.schema import CSV_DTYPES
+
+CIDADES = ["São Paulo", "Rio de Janeiro", "Natal", "Recife", "Curitiba", "Manaus"]
+STATUS = ["POSTADO", "EM TRÂNSITO", "SAIU PARA ENTREGA", "ENTREGUE", "EXTRAVIADO"]
+
+
+def gerar_dataframe(linhas: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Gera um DataFrame sintético com as colunas de `rastreamento.csv`.
+    """
+    rng = np.random.default_rng(seed)
+    inicio = np.datetime64("2025-01-01T00:00:00")
+    segundos = rng.integers(0, 90 * 24 * 3600, size=linhas).astype("timedelta64[s]")
+
+    return pd.DataFrame(
+        {
+            "id_pacote": rng.integers(1, linhas // 4 + 2, size=linhas),
+            "origem": rng.choice(CIDADES, size=linhas),
+            "destino": rng.choice(CIDADES, size=linhas),
+            "status_rastreamento": rng.choice(STATUS, size=linhas),
+            "data_atualizacao": np.datetime_as_string(inicio + segundos) + "Z",
+        }
+    )
+
+
+def gerar_csv(caminho: str, linhas: int, seed: int = 42):
+    """
+    Gera um CSV sintético no formato de `rastreamento.csv`.
+    """
+    gerar_dataframe(linhas, seed).to_csv(caminho, index=False)
+
+
+def clean_and_validate_antigo(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reprodução do `clean_and_validate` anterior ao schema tipado.
+    """
+    for col in ["origem", "destino", "status_rastreamento"]:
+        df[col] = df[col].astype(str).str.strip()
+
+    df["id_pacote"] = pd.to_numeric(df["id_pacote"], errors="coerce")
+    df["data_atualizacao"] = pd.to_datetime(df["data_atualizacao"], errors="coerce")
+    df[df.isnull().any(axis=1)]
+    df.dropna(inplace=True)
+    df["id_pacote"] = df["id_pacote"].astype(int)
+    return df
+
+
+def _executar(caminho: str, leitura_kwargs: dict, limpeza, fila):
+    """
+    Executa leitura + limpeza em um processo novo e devolve as medições.
+    """
+    logging.disable(logging.CRITICAL)
+    rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+
+    df = pd.read_csv(caminho, **leitura_kwargs)
+    df = limpeza(df)
+
+    duracao = time.perf_counter() - inicio
+    rss_pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    fila.put(
+        (
+            duracao,
+            (rss_pico - rss_inicial) * 1024,
+            df.memory_usage(deep=True).sum(),
+            len(df),
+        )
+    )
+
+
+def medir(nome: str, caminho: str, leitura_kwargs: dict, limpeza):
+    """
+    Mede tempo, pico de RSS e tamanho final do DataFrame. Cada caminho roda
+    em um processo separado para que um não influencie o pico de memória do outro.
+    """
+    contexto = multiprocessing.get_context("spawn")
+    fila = contexto.Queue()
+    processo = contexto.Process(
+        target=_executar, args=(caminho, leitura_kwargs, limpeza, fila)
+    )
+    processo.start()
+    duracao, pico, tamanho, linhas = fila.get()
+    processo.join()
+
+    print(
+        f"{nome:<10} tempo={duracao:7.2f}s  pico RSS={pico / 2**20:9.1f} MiB  "
+        f"DataFrame final={tamanho / 2**20:9.1f} MiB  linhas={linhas}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--linhas", type=int, default=3_000_000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, "rastreamento.csv")
+        # Gera o arquivo em outro processo: o pico de RSS é herdado no exec
+        # e mascararia as medições seguintes
+        gerador = multiprocessing.get_context("spawn").Process(
+            target=gerar_csv, args=(caminho, args.linhas)
+        )
+        gerador.start()
+        gerador.join()
+        print(
+            f"Arquivo com {args.linhas} linhas ({os.path.getsize(caminho) / 2**20:.1f} MiB)"
+        )
+
+        medir("antigo", caminho, {}, clean_and_validate_antigo)
+        medir("tipado", caminho, {"dtype": CSV_DTYPES}, clean_and_validate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compara o tempo de extração do mesmo conjunto de dados em cada formato de
+entrada aceito por `extract_from_csv` (CSV, CSV comprimido, Parquet e Arrow IPC).
+
+Uso (a partir de desafio-1/pipeline):
+    python -m benchmarks.bench_formats --linhas 2000000
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.bench_clean_validate import gerar_dataframe
+from etl.extract import CSV_ENGINE, extract_from_csv
+
+
+def escrever_formatos(diretorio: str, linhas: int) -> dict:
+    """
+    Grava o mesmo DataFrame sintético em todos os formatos disponíveis.
+    """
+    df = gerar_dataframe(linhas)
+    # Colunas extras simulam um export com mais campos do que o pipeline usa
+    df["observacao"] = "sem observações"
+    df["peso_kg"] = 1.5
+
+    arquivos = {
+        "csv": os.path.join(diretorio, "rastreamento.csv"),
+        "csv.gz": os.path.join(diretorio, "rastreamento.csv.gz"),
+        "parquet": os.path.join(diretorio, "rastreamento.parquet"),
+        "arrow": os.path.join(diretorio, "rastreamento.arrow"),
+    }
+    df.to_csv(arquivos["csv"], index=False)
+    df.to_csv(arquivos["csv.gz"], index=False)
+    df.to_parquet(arquivos["parquet"], index=False)
+    df.to_feather(arquivos["arrow"])
+
+    # zstd depende do pacote opcional "zstandard"
+    if importlib.util.find_spec("zstandard"):
+        arquivos["csv.zst"] = os.path.join(diretorio, "rastreamento.csv.zst")
+        df.to_csv(arquivos["csv.zst"], index=False)
+
+    return arquivos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--linhas", type=int, default=2_000_000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        arquivos = escrever_formatos(diretorio, args.linhas)
+        print(f"{args.linhas} linhas, engine de CSV: {CSV_ENGINE}")
+
+        for nome, caminho in arquivos.items():
+            tempos = []
+            for _ in range(args.repeticoes):
+                inicio = time.perf_counter()
+                df = extract_from_csv(caminho)
+                tempos.append(time.perf_counter() - inicio)
+
+            melhor = min(tempos)
+            print(
+                f"{nome:<8} tamanho={os.path.getsize(caminho) / 2**20:8.1f} MiB  "
+                f"melhor tempo={melhor:6.2f}s  ({len(df) / melhor:,.0f} linhas/s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Gera arquivos sintéticos no formato de `rastreamento.csv` em escala de produção
+(milhões de linhas), em blocos para manter a memória constante.
+
+Cada pacote recebe uma sequência de eventos em ordem cronológica (POSTADO,
+EM TRÂNSITO, ..., SAIU PARA ENTREGA, ENTREGUE ou EXTRAVIADO). As proporções de
+eventos por pacote, linhas duplicadas e linhas inválidas são configuráveis.
+
+Uso (a partir de desafio-1/pipeline):
+    python -m benchmarks.gerar_dados --linhas 10000000 --saida rastreamento_10m.csv
+    python -m benchmarks.gerar_dados --linhas 1000000 --eventos-por-pacote 6 \
+        --taxa-duplicadas 0.02 --taxa-invalidas 0.005 --saida rastreamento.csv.gz
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_clean_validate import CIDADES
+from etl.schema import COLUNAS
+
+# Linhas geradas e gravadas por vez
+LINHAS_POR_BLOCO = 1_000_000
+
+# Janela de datas do primeiro evento de cada pacote
+INICIO_DATAS = np.datetime64("2025-01-01T00:00:00")
+JANELA_DIAS = 90
+
+# Intervalo médio entre dois eventos do mesmo pacote
+HORAS_ENTRE_EVENTOS = 12
+
+# Fração dos pacotes com sequência completa que terminam extraviados
+TAXA_EXTRAVIO = 0.02
+
+# Tipos de linha inválida, sorteados com a mesma probabilidade
+INVALIDAS = ["id_pacote", "data_atualizacao", "origem"]
+
+
+def _sequencia_status(eventos_por_pacote: np.ndarray, rng) -> np.ndarray:
+    """
+    Monta o status de cada evento a partir da posição dele na sequência do pacote:
+    o primeiro é POSTADO; em pacotes com 3 ou mais eventos os dois últimos são
+    SAIU PARA ENTREGA e ENTREGUE (ou EXTRAVIADO); os demais são EM TRÂNSITO.
+    """
+    total = int(eventos_por_pacote.sum())
+    inicio_pacote = np.repeat(
+        np.cumsum(eventos_por_pacote) - eventos_por_pacote, eventos_por_pacote
+    )
+    posicao = np.arange(total) - inicio_pacote
+    tamanho = np.repeat(eventos_por_pacote, eventos_por_pacote)
+
+    status = np.full(total, "EM TRÂNSITO", dtype=object)
+    completo = tamanho >= 3
+    status[completo & (posicao == tamanho - 2)] = "SAIU PARA ENTREGA"
+
+    ultimo = completo & (posicao == tamanho - 1)
+    extraviado = np.repeat(
+        rng.random(len(eventos_por_pacote)) < TAXA_EXTRAVIO, eventos_por_pacote
+    )
+    status[ultimo] = "ENTREGUE"
+    status[ultimo & extraviado] = "EXTRAVIADO"
+    status[posicao == 0] = "POSTADO"
+    return status
+
+
+def gerar_bloco(
+    primeiro_id: int,
+    linhas: int,
+    eventos_por_pacote: float,
+    taxa_duplicadas: float,
+    taxa_invalidas: float,
+    rng,
+) -> tuple[pd.DataFrame, int]:
+    """
+    Gera um bloco com aproximadamente `linhas` linhas, com pacotes a partir de
+    `primeiro_id`. Retorna o bloco e o próximo `id_pacote` livre.
+    """
+    linhas_unicas = max(1, int(linhas * (1 - taxa_duplicadas)))
+
+    # Quantidade de eventos de cada pacote: 1 + Poisson, com média `eventos_por_pacote`
+    num_pacotes = max(1, int(linhas_unicas / eventos_por_pacote))
+    por_pacote = 1 + rng.poisson(max(eventos_por_pacote - 1, 0), size=num_pacotes)
+    ids = np.arange(primeiro_id, primeiro_id + num_pacotes, dtype=np.int64)
+
+    origem = rng.choice(CIDADES, size=num_pacotes)
+    destino = rng.choice(CIDADES, size=num_pacotes)
+
+    # Datas crescentes dentro de cada pacote: início sorteado na janela e
+    # intervalos exponenciais entre os eventos
+    inicio = rng.integers(0, JANELA_DIAS * 24 * 3600, size=num_pacotes)
+    intervalos = (
+        rng.exponential(HORAS_ENTRE_EVENTOS * 3600, size=int(por_pacote.sum())).astype(
+            np.int64
+        )
+        + 1
+    )
+    acumulado = np.cumsum(intervalos)
+    primeiros = np.cumsum(por_pacote) - por_pacote
+    deslocamento = acumulado - np.repeat(acumulado[primeiros], por_pacote)
+    segundos = np.repeat(inicio, por_pacote) + deslocamento
+
+    df = pd.DataFrame(
+        {
+            "id_pacote": np.repeat(ids, por_pacote).astype(object),
+            "origem": np.repeat(origem, por_pacote),
+            "destino": np.repeat(destino, por_pacote),
+            "status_rastreamento": _sequencia_status(por_pacote, rng),
+            "data_atualizacao": np.datetime_as_string(
+                INICIO_DATAS + segundos.astype("timedelta64[s]")
+            ).astype(object)
+            + "Z",
+        },
+        columns=COLUNAS,
+    )
+
+    # Linhas duplicadas: cópias exatas de linhas do próprio bloco
+    num_duplicadas = int(len(df) * taxa_duplicadas / (1 - taxa_duplicadas))
+    if num_duplicadas:
+        copias = df.iloc[rng.integers(0, len(df), size=num_duplicadas)]
+        df = pd.concat([df, copias], ignore_index=True)
+
+    # Linhas inválidas: id não numérico, data fora do formato ou origem vazia
+    num_invalidas = int(len(df) * taxa_invalidas)
+    if num_invalidas:
+        alvos = rng.choice(len(df), size=num_invalidas, replace=False)
+        tipos = rng.choice(INVALIDAS, size=num_invalidas)
+        df.loc[alvos[tipos == "id_pacote"], "id_pacote"] = "PCT-INVALIDO"
+        df.loc[alvos[tipos == "data_atualizacao"], "data_atualizacao"] = "31/02/2025"
+        df.loc[alvos[tipos == "origem"], "origem"] = None
+
+    # Os eventos chegam intercalados entre pacotes, como em um export real
+    df = df.iloc[rng.permutation(len(df))]
+    return df, primeiro_id + num_pacotes
+
+
+def gerar_arquivo(
+    caminho: str,
+    linhas: int,
+    eventos_por_pacote: float = 4.0,
+    taxa_duplicadas: float = 0.01,
+    taxa_invalidas: float = 0.001,
+    seed: int = 42,
+) -> int:
+    """
+    Grava o arquivo sintético em blocos de `LINHAS_POR_BLOCO` linhas. A
+    compressão é escolhida pela extensão (".gz", ".zst", ...); cada bloco vira
+    um membro/frame comprimido, o que os leitores tratam como um único arquivo.
+    Retorna a quantidade de linhas gravadas.
+    """
+    rng = np.random.default_rng(seed)
+    proximo_id = 1
+    gravadas = 0
+
+    while gravadas < linhas:
+        tamanho = min(LINHAS_POR_BLOCO, linhas - gravadas)
+        df, proximo_id = gerar_bloco(
+            proximo_id,
+            tamanho,
+            eventos_por_pacote,
+            taxa_duplicadas,
+            taxa_invalidas,
+            rng,
+        )
+        df = df.iloc[:tamanho]
+        primeiro_bloco = gravadas == 0
+        df.to_csv(
+            caminho,
+            mode="w" if primeiro_bloco else "a",
+            header=primeiro_bloco,
+            index=False,
+        )
+        gravadas += len(df)
+
+    return gravadas
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--saida", default="rastreamento_sintetico.csv")
+    parser.add_argument(
+        "--eventos-por-pacote",
+        type=float,
+        default=4.0,
+        help="Média de eventos por pacote (mínimo 1).",
+    )
+    parser.add_argument("--taxa-duplicadas", type=float, default=0.01)
+    parser.add_argument("--taxa-invalidas", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.eventos_por_pacote < 1:
+        parser.error("--eventos-por-pacote deve ser pelo menos 1.")
+    if not 0 <= args.taxa_duplicadas < 1 or not 0 <= args.taxa_invalidas < 1:
+        parser.error("As taxas devem estar no intervalo [0, 1).")
+
+    inicio = time.perf_counter()
+    gravadas = gerar_arquivo(
+        args.saida,
+        args.linhas,
+        args.eventos_por_pacote,
+        args.taxa_duplicadas,
+        args.taxa_invalidas,
+        args.seed,
+    )
+    duracao = time.perf_counter() - inicio
+    print(f"{gravadas} linhas gravadas em {args.saida} ({duracao:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Mede cada etapa do pipeline em lote (extract, clean_validate, transform e load)
+sobre um arquivo sintético ou real, registrando tempo, linhas/s e pico de RSS,
+e compara o resultado com um baseline salvo para sinalizar regressões.
+
+Cada etapa roda em um processo próprio: a entrada vem da etapa anterior em
+Parquet (fora da medição), para que o pico de memória de uma não contamine o
+da outra. A etapa de carga usa o banco de `LOCAL_DATABASE_URL` (por exemplo,
+o container de `docker-compose.dev.yaml`) e é pulada se ele não estiver definido.
+
+Uso (a partir de desafio-1/pipeline):
+    python -m benchmarks.run_benchmarks --linhas 5000000 --salvar-baseline
+    python -m benchmarks.run_benchmarks --linhas 5000000
+    python -m benchmarks.run_benchmarks --arquivo rastreamento.csv --etapas extract,clean_validate
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from benchmarks.gerar_dados import gerar_arquivo
+
+ETAPAS = ["extract", "clean_validate", "transform", "load"]
+
+BASELINE_PADRAO = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Variação aceita em relação ao baseline antes de apontar uma regressão
+TOLERANCIA_PADRAO = 0.15
+
+
+def _ler_parquet(diretorio: str, nome: str) -> pd.DataFrame:
+    return pd.read_parquet(os.path.join(diretorio, f"{nome}.parquet"))
+
+
+def _gravar_parquet(diretorio: str, nome: str, df: pd.DataFrame):
+    df.to_parquet(os.path.join(diretorio, f"{nome}.parquet"), index=False)
+
+
+def _executar_etapa(etapa: str, arquivo: str, diretorio: str, fila):
+    """
+    Executa uma etapa em um processo novo e devolve as medições. A leitura da
+    entrada e a gravação da saída ficam fora do tempo medido.
+    """
+    logging.disable(logging.CRITICAL)
+
+    from etl.clean_validate import clean_and_validate
+    from etl.extract import extract_from_csv
+    from etl.load import load_data
+    from etl.transform import transform
+
+    if etapa == "clean_validate":
+        entrada = _ler_parquet(diretorio, "extract")
+    elif etapa == "transform":
+        entrada = _ler_parquet(diretorio, "clean_validate")
+    elif etapa == "load":
+        entrada = (
+            _ler_parquet(diretorio, "pacotes"),
+            _ler_parquet(diretorio, "eventos"),
+        )
+
+    rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+
+    if etapa == "extract":
+        saida = extract_from_csv(arquivo)
+        linhas = len(saida)
+    elif etapa == "clean_validate":
+        linhas = len(entrada)
+        quarentena = os.path.join(diretorio, "rejeitados.csv")
+        saida = clean_and_validate(entrada, quarantine_path=quarentena)
+    elif etapa == "transform":
+        linhas = len(entrada)
+        saida = transform(entrada)
+    else:
+        linhas = len(entrada[1])
+        load_data(*entrada)
+        saida = None
+
+    duracao = time.perf_counter() - inicio
+    rss_pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if etapa == "transform":
+        _gravar_parquet(diretorio, "pacotes", saida[0])
+        _gravar_parquet(diretorio, "eventos", saida[1])
+    elif saida is not None:
+        _gravar_parquet(diretorio, etapa, saida)
+
+    # ru_maxrss é informado em KiB no Linux
+    fila.put(
+        {
+            "tempo_s": duracao,
+            "linhas": linhas,
+            "linhas_por_s": linhas / duracao if duracao else 0.0,
+            "pico_rss_mib": rss_pico / 1024,
+            "acrescimo_rss_mib": (rss_pico - rss_inicial) / 1024,
+        }
+    )
+
+
+def medir_etapa(etapa: str, arquivo: str, diretorio: str) -> dict:
+    contexto = multiprocessing.get_context("spawn")
+    fila = contexto.Queue()
+    processo = contexto.Process(
+        target=_executar_etapa, args=(etapa, arquivo, diretorio, fila)
+    )
+    processo.start()
+    processo.join()
+    if processo.exitcode != 0:
+        raise RuntimeError(f"A etapa '{etapa}' falhou (código {processo.exitcode}).")
+    return fila.get()
+
+
+def limpar_banco():
+    """
+    Esvazia as tabelas do pipeline, para que a carga meça sempre inserções
+    novas e não atualizações de uma execução anterior.
+    """
+    from etl.load import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                TRUNCATE eventos_rastreamento, pacote_status_atual, pacote_entrega, pacotes;
+                UPDATE kpi_tempo_entrega SET soma_duracao = INTERVAL '0', total_entregas = 0;
+                """
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def comparar(resultados: dict, baseline: dict, tolerancia: float) -> list[str]:
+    """
+    Compara vazão e pico de memória de cada etapa com o baseline. Retorna as
+    regressões encontradas.
+    """
+    regressoes = []
+    for etapa, atual in resultados.items():
+        base = baseline["etapas"].get(etapa)
+        if base is None:
+            continue
+
+        variacao_vazao = atual["linhas_por_s"] / base["linhas_por_s"] - 1
+        variacao_rss = atual["pico_rss_mib"] / base["pico_rss_mib"] - 1
+        print(
+            f"{etapa:<15} vazão {variacao_vazao:+7.1%}  pico RSS {variacao_rss:+7.1%}"
+        )
+
+        if variacao_vazao < -tolerancia:
+            regressoes.append(f"{etapa}: vazão {variacao_vazao:+.1%}")
+        if variacao_rss > tolerancia:
+            regressoes.append(f"{etapa}: pico de RSS {variacao_rss:+.1%}")
+
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--arquivo", help="Arquivo de entrada. Sem ele, um arquivo sintético é gerado."
+    )
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--eventos-por-pacote", type=float, default=4.0)
+    parser.add_argument("--taxa-duplicadas", type=float, default=0.01)
+    parser.add_argument("--taxa-invalidas", type=float, default=0.001)
+    parser.add_argument("--etapas", default=",".join(ETAPAS))
+    parser.add_argument("--baseline", default=BASELINE_PADRAO)
+    parser.add_argument(
+        "--salvar-baseline",
+        action="store_true",
+        help="Grava o resultado desta execução como o novo baseline.",
+    )
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PADRAO)
+    parser.add_argument(
+        "--limpar-banco",
+        action="store_true",
+        help="Esvazia as tabelas do pipeline antes da carga (apenas em banco de teste!).",
+    )
+    args = parser.parse_args()
+
+    etapas = [etapa.strip() for etapa in args.etapas.split(",")]
+    invalidas = set(etapas) - set(ETAPAS)
+    if invalidas:
+        parser.error(f"Etapas desconhecidas: {', '.join(sorted(invalidas))}")
+    # Cada etapa consome a saída da anterior
+    etapas = ETAPAS[: max(ETAPAS.index(etapa) for etapa in etapas) + 1]
+
+    load_dotenv()
+    if "load" in etapas and not os.getenv("LOCAL_DATABASE_URL"):
+        print("LOCAL_DATABASE_URL não definida: a etapa de carga será pulada.")
+        etapas.remove("load")
+
+    parametros = {
+        "arquivo": args.arquivo,
+        "linhas": args.linhas,
+        "eventos_por_pacote": args.eventos_por_pacote,
+        "taxa_duplicadas": args.taxa_duplicadas,
+        "taxa_invalidas": args.taxa_invalidas,
+    }
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as diretorio:
+        arquivo = args.arquivo
+        if arquivo is None:
+            arquivo = os.path.join(diretorio, "rastreamento.csv")
+            # Gera o arquivo em outro processo: o pico de RSS da geração não
+            # deve aparecer nas medições
+            gerador = multiprocessing.get_context("spawn").Process(
+                target=gerar_arquivo,
+                args=(
+                    arquivo,
+                    args.linhas,
+                    args.eventos_por_pacote,
+                    args.taxa_duplicadas,
+                    args.taxa_invalidas,
+                ),
+            )
+            gerador.start()
+            gerador.join()
+        print(f"Entrada: {arquivo} ({os.path.getsize(arquivo) / 2**20:.1f} MiB)")
+
+        if "load" in etapas and args.limpar_banco:
+            limpar_banco()
+
+        for etapa in etapas:
+            resultado = medir_etapa(etapa, arquivo, diretorio)
+            resultados[etapa] = resultado
+            print(
+                f"{etapa:<15} tempo={resultado['tempo_s']:7.2f}s  "
+                f"{resultado['linhas_por_s']:12,.0f} linhas/s  "
+                f"pico RSS={resultado['pico_rss_mib']:8.1f} MiB "
+                f"(+{resultado['acrescimo_rss_mib']:.1f} MiB)"
+            )
+
+    if args.salvar_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"parametros": parametros, "etapas": resultados}, f, indent=2)
+        print(f"Baseline salvo em {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("Nenhum baseline encontrado; use --salvar-baseline para criar um.")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["parametros"] != parametros:
+        print(
+            "Aviso: o baseline foi medido com outros parâmetros "
+            f"({baseline['parametros']}); a comparação pode não ser válida."
+        )
+
+    print(f"Comparação com o baseline (tolerância de {args.tolerancia:.0%}):")
+    regressoes = comparar(resultados, baseline, args.tolerancia)
+    if regressoes:
+        print("Regressões encontradas: " + "; ".join(regressoes))
+        sys.exit(1)
+    print("Nenhuma regressão encontrada.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+from .files import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Quantidade de bytes do início do arquivo usada para identificá-lo
+TAMANHO_FINGERPRINT = 64 * 1024
+
+
+def _fingerprint(file_path: str, tamanho: int) -> str:
+    """
+    Calcula o hash dos primeiros `tamanho` bytes do arquivo. Se o arquivo for
+    rotacionado (substituído por outro), o início dele deixa de coincidir.
+    """
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read(tamanho)).hexdigest()
+
+
+def _pending_path(checkpoint_path: str) -> str:
+    return f"{checkpoint_path}.pending"
+
+
+def build_checkpoint(file_path: str, offset: int, run_id: str | None = None) -> dict:
+    """
+    Monta o checkpoint de um arquivo lido até o byte `offset` pela execução `run_id`.
+    """
+    tamanho_fingerprint = min(offset, TAMANHO_FINGERPRINT)
+    return {
+        "offset": offset,
+        "fingerprint": _fingerprint(file_path, tamanho_fingerprint),
+        "fingerprint_bytes": tamanho_fingerprint,
+        "atualizado_em": datetime.now(timezone.utc).isoformat(),
+        "run_id": run_id,
+    }
+
+
+def read_checkpoint(checkpoint_path: str) -> dict | None:
+    """
+    Lê o último checkpoint confirmado. Retorna None se não existir ou estiver ilegível.
+    """
+    try:
+        with open(checkpoint_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, OSError) as e:
+        logger.warning(f"Checkpoint ilegível em '{checkpoint_path}', ignorando: {e}")
+        return None
+
+
+def resolve_start_offset(file_path: str, checkpoint: dict | None) -> int:
+    """
+    Retorna o byte a partir do qual o arquivo deve ser lido. Retorna 0 (carga
+    completa) quando não há checkpoint ou o arquivo foi rotacionado ou truncado.
+    """
+    if not checkpoint:
+        logger.info("Nenhum checkpoint encontrado. Realizando carga completa.")
+        return 0
+
+    offset = checkpoint["offset"]
+    if os.path.getsize(file_path) < offset:
+        logger.warning(
+            "Arquivo menor que o checkpoint (truncado). Realizando carga completa."
+        )
+        return 0
+
+    fingerprint = _fingerprint(file_path, checkpoint["fingerprint_bytes"])
+    if fingerprint != checkpoint["fingerprint"]:
+        logger.warning(
+            "Arquivo diferente do checkpoint (rotacionado). Realizando carga completa."
+        )
+        return 0
+
+    logger.info(f"Checkpoint encontrado. Lendo a partir do byte {offset}.")
+    return offset
+
+
+def last_complete_line_offset(file_path: str) -> int:
+    """
+    Retorna a posição logo após a última quebra de linha do arquivo, para que
+    uma linha ainda sendo escrita pela origem não seja lida pela metade.
+    """
+    tamanho = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        posicao = tamanho
+        while posicao > 0:
+            inicio_bloco = max(0, posicao - TAMANHO_FINGERPRINT)
+            f.seek(inicio_bloco)
+            bloco = f.read(posicao - inicio_bloco)
+            indice = bloco.rfind(b"\n")
+            if indice != -1:
+                return inicio_bloco + indice + 1
+            posicao = inicio_bloco
+    return 0
+
+
+def save_pending_checkpoint(checkpoint_path: str, checkpoint: dict):
+    """
+    Registra o checkpoint da leitura atual como pendente. Ele só passa a valer
+    após `commit_checkpoint`, chamado depois de um carregamento bem-sucedido.
+    """
+    write_json_atomic(_pending_path(checkpoint_path), checkpoint)
+
+
+def read_pending_checkpoint(checkpoint_path: str) -> dict | None:
+    """
+    Lê o checkpoint pendente, ainda não confirmado. Retorna None se não existir.
+    """
+    return read_checkpoint(_pending_path(checkpoint_path))
+
+
+def discard_pending_checkpoint(checkpoint_path: str):
+    """
+    Remove um checkpoint pendente de uma execução anterior que não chegou a ser
+    confirmada, para que ele nunca seja confirmado por engano.
+    """
+    caminho_pendente = _pending_path(checkpoint_path)
+    if os.path.exists(caminho_pendente):
+        logger.info("Descartando checkpoint pendente de execução anterior.")
+        os.remove(caminho_pendente)
+
+
+def commit_checkpoint(checkpoint_path: str, run_id: str | None = None):
+    """
+    Confirma o checkpoint pendente, fazendo a próxima extração ler apenas as
+    linhas adicionadas depois dele. Com `run_id`, só confirma o checkpoint
+    registrado pela mesma execução: se outra execução o tiver substituído, o
+    offset dela não corresponde às linhas carregadas por esta e é mantido pendente.
+    """
+    caminho_pendente = _pending_path(checkpoint_path)
+    if not os.path.exists(caminho_pendente):
+        logger.info("Nenhum checkpoint pendente para confirmar.")
+        return
+
+    if run_id is not None:
+        dono = read_pending_checkpoint(checkpoint_path)
+        dono = None if dono is None else dono.get("run_id")
+        if dono != run_id:
+            logger.warning(
+                f"Checkpoint pendente pertence a outra execução ({dono}), "
+                f"não a '{run_id}'. Ele não será confirmado."
+            )
+            return
+
+    os.replace(caminho_pendente, checkpoint_path)
+    logger.info(f"Checkpoint confirmado em '{checkpoint_path}'.")
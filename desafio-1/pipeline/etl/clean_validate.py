@@ -1,55 +1,148 @@
 import logging
+import numpy as np
 import pandas as pd
 
+from .quarantine import write_rejected_rows
+from .schema import (
+    COLUNAS,
+    COLUNAS_CATEGORICAS,
+    FORMATO_DATA_ATUALIZACAO,
+    TIPO_ID_PACOTE,
+)
+
 logger = logging.getLogger(__name__)
 
+# Quantidade de linhas rejeitadas exibidas como amostra nos logs
+TAMANHO_AMOSTRA_LOG = 5
+
+
+def _limpar_texto_categorico(serie: pd.Series) -> pd.Series:
+    """
+    Converte a coluna para categórica e remove espaços extras. A limpeza é
+    feita apenas nas categorias distintas, e não em cada linha.
+    """
+    serie = serie.astype("category")
+    categorias_limpas = serie.cat.categories.astype(str).str.strip()
+
+    if categorias_limpas.is_unique:
+        return serie.cat.rename_categories(categorias_limpas)
+
+    # Categorias que só diferem por espaços precisam ser unificadas
+    return serie.astype("string").str.strip().astype("category")
+
+
+def _converter_data_atualizacao(serie: pd.Series) -> pd.Series:
+    """
+    Converte "data_atualizacao" para datetime em UTC usando o formato fixo em
+    Zulu Time. Apenas os valores fora desse formato passam pelo parser
+    ISO-8601 genérico, mais lento. Valores inválidos se tornam NaT.
+    """
+    datas = pd.to_datetime(
+        serie, format=FORMATO_DATA_ATUALIZACAO, utc=True, errors="coerce"
+    )
+
+    fora_do_formato = datas.isna() & serie.notna()
+    if fora_do_formato.any():
+        datas[fora_do_formato] = pd.to_datetime(
+            serie[fora_do_formato], format="ISO8601", utc=True, errors="coerce"
+        )
+
+    return datas
+
 
-def clean_and_validate(df: pd.DataFrame) -> pd.DataFrame:
+def _converter_id_pacote(serie: pd.Series) -> pd.Series:
+    """
+    Converte "id_pacote" para numérico. Valores não numéricos ou fora do
+    intervalo de 32 bits se tornam NaN.
+    """
+    ids = pd.to_numeric(serie, errors="coerce")
+    limites = np.iinfo(TIPO_ID_PACOTE)
+    return ids.where(ids.between(limites.min, limites.max))
+
+
+def _montar_rejeitados(
+    df: pd.DataFrame,
+    brutos: dict,
+    mascaras: dict,
+    mascara_invalida: np.ndarray,
+) -> pd.DataFrame:
+    """
+    Monta o DataFrame das linhas rejeitadas com os valores originais das colunas
+    convertidas e uma coluna `motivo_rejeicao` indicando a primeira coluna inválida.
+    """
+    df_rejeitados = df.loc[mascara_invalida, COLUNAS].copy()
+    for col, serie_bruta in brutos.items():
+        df_rejeitados[col] = serie_bruta[mascara_invalida]
+
+    df_rejeitados["motivo_rejeicao"] = np.select(
+        [mascaras[col][mascara_invalida] for col in COLUNAS],
+        [f"{col} inválido ou ausente" for col in COLUNAS],
+        default="",
+    )
+    return df_rejeitados
+
+
+def clean_and_validate(
+    df: pd.DataFrame, quarantine_path: str | None = None
+) -> pd.DataFrame:
     """
     Realiza a limpeza e validação dos dados do DataFrame
     - Remove espaços extras
-    - Valida e converte os tipos de dados
-    - Remove linhas com dados inválidos ou ausentes
+    - Valida e converte os tipos de dados conforme o schema em `etl/schema.py`
+    - Remove linhas com dados inválidos ou ausentes, gravando-as em
+      `quarantine_path` quando informado
     """
     logger.info("Iniciando limpeza e validação dos dados...")
 
-    # Limpeza nos campos de texto do CSV
-    colunas_texto = ["origem", "destino", "status_rastreamento"]
-    for col in colunas_texto:
-        # Garante que a coluna é do tipo string
-        df[col] = df[col].astype(str).str.strip()
+    # Limpeza nos campos de texto do CSV, armazenados como categóricos
+    for col in COLUNAS_CATEGORICAS:
+        df[col] = _limpar_texto_categorico(df[col])
+
+    # Valores originais das colunas convertidas, preservados para a quarentena
+    brutos = {col: df[col] for col in ["id_pacote", "data_atualizacao"]}
 
     # Validação e conversão de tipos
 
     # Tenta converter "id_pacote" para numérico, se não conseguir transforma em NaN
-    df["id_pacote"] = pd.to_numeric(df["id_pacote"], errors="coerce")
+    df["id_pacote"] = _converter_id_pacote(df["id_pacote"])
     # Tenta converter "data_atualizacao" de Zulu Time para datetime. Se não conseguir, transforma em NaT
-    df["data_atualizacao"] = pd.to_datetime(df["data_atualizacao"], errors="coerce")
+    df["data_atualizacao"] = _converter_data_atualizacao(df["data_atualizacao"])
 
     # Tratamento de dados inválidos/ausentes
     linhas_originais = len(df)
-    linhas_invalidas = df[
-        df.isnull().any(axis=1)
-    ]  # Cópia das linhas inválidas para análise
 
-    if not linhas_invalidas.empty:
-        indices_invalidos = linhas_invalidas.index.tolist()
+    # Monta a máscara coluna a coluna para não materializar um DataFrame booleano inteiro
+    mascaras = {col: df[col].isna().to_numpy() for col in COLUNAS}
+    mascara_invalida = np.zeros(linhas_originais, dtype=bool)
+    for mascara in mascaras.values():
+        mascara_invalida |= mascara
+
+    if mascara_invalida.any():
+        df_rejeitados = _montar_rejeitados(df, brutos, mascaras, mascara_invalida)
+
+        # Nos logs vão apenas as contagens e uma amostra, o conteúdo completo fica na quarentena
+        contagem_motivos = df_rejeitados["motivo_rejeicao"].value_counts().to_dict()
+        amostra_indices = df_rejeitados.index[:TAMANHO_AMOSTRA_LOG].tolist()
         logger.warning(
-            f"Foram encontradas {len(linhas_invalidas)} linhas com dados inválidos/ausentes. Elas serão removidas"
-            f"Índices removidos: {indices_invalidos}"
+            f"Foram encontradas {len(df_rejeitados)} linhas com dados inválidos/ausentes. Elas serão removidas. "
+            f"Motivos: {contagem_motivos}. Amostra de índices: {amostra_indices}"
         )
 
-        # Em nível de DEBUG é possível ver quais linhas são inválidas
-        invalid_rows_json = linhas_invalidas.to_json(
-            orient="records", date_format="iso"
-        )
-        logger.debug(f"Conteúdo detalhado das linhas inválidas: {invalid_rows_json}")
+        # Em nível de DEBUG é possível ver uma amostra das linhas inválidas
+        if logger.isEnabledFor(logging.DEBUG):
+            amostra_json = df_rejeitados.head(TAMANHO_AMOSTRA_LOG).to_json(
+                orient="records", force_ascii=False
+            )
+            logger.debug(f"Amostra das linhas inválidas: {amostra_json}")
+
+        if quarantine_path:
+            write_rejected_rows(df_rejeitados, quarantine_path)
 
-    # Remove as linhas que tenham qualquer valor nulo (NaN ou NaT)
-    df.dropna(inplace=True)
+        # Remove as linhas que tenham qualquer valor nulo (NaN ou NaT)
+        df = df[~mascara_invalida]
 
-    # Com os NaN removidos, volta o tipo da coluna para int
-    df["id_pacote"] = df["id_pacote"].astype(int)
+    # Com os NaN removidos, reduz o tipo da coluna para int de 32 bits
+    df = df.astype({"id_pacote": TIPO_ID_PACOTE})
 
     logger.info(
         f"Limpeza concluída. {len(df)}/{linhas_originais} linhas válidas restantes."
@@ -1,21 +1,284 @@
+import csv
+import importlib.util
+import io
 import logging
 import pandas as pd
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+from .checkpoint import (
+    build_checkpoint,
+    discard_pending_checkpoint,
+    last_complete_line_offset,
+    read_checkpoint,
+    resolve_start_offset,
+    save_pending_checkpoint,
+)
+from .schema import COLUNAS, COLUNAS_CATEGORICAS, CSV_DTYPES
 
 logger = logging.getLogger(__name__)
 
+# Quantidade padrão de linhas por lote no modo de streaming
+DEFAULT_CHUNKSIZE = 100_000
+
+# Formatos de entrada suportados
+FORMATO_CSV = "csv"
+FORMATO_CSV_COMPRIMIDO = "csv_comprimido"
+FORMATO_PARQUET = "parquet"
+FORMATO_ARROW = "arrow"
+
+# Extensões de arquivo reconhecidas em cada formato. O restante é lido como CSV
+_EXTENSOES_FORMATO = {
+    ".parquet": FORMATO_PARQUET,
+    ".pq": FORMATO_PARQUET,
+    ".arrow": FORMATO_ARROW,
+    ".feather": FORMATO_ARROW,
+    ".ipc": FORMATO_ARROW,
+    ".gz": FORMATO_CSV_COMPRIMIDO,
+    ".zst": FORMATO_CSV_COMPRIMIDO,
+    ".bz2": FORMATO_CSV_COMPRIMIDO,
+    ".xz": FORMATO_CSV_COMPRIMIDO,
+}
+
+# Engine de leitura de CSV completo: pyarrow (multithread) quando instalado
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+
+
+def detect_input_format(file_path: str) -> str:
+    """
+    Identifica o formato do arquivo de entrada pela extensão.
+    """
+    caminho = file_path.lower()
+    for extensao, formato in _EXTENSOES_FORMATO.items():
+        if caminho.endswith(extensao):
+            return formato
+    return FORMATO_CSV
+
+
+def _read_csv_pyarrow(file_path: str) -> pd.DataFrame:
+    """
+    Lê o CSV com o leitor nativo do pyarrow. As colunas categóricas são
+    decodificadas direto como dicionário, sem passar por strings Python.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    tipos = {col: pa.dictionary(pa.int32(), pa.string()) for col in COLUNAS_CATEGORICAS}
+    tipos["data_atualizacao"] = pa.string()
+
+    tabela = pa_csv.read_csv(
+        file_path,
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=COLUNAS, column_types=tipos, strings_can_be_null=True
+        ),
+    )
+    return tabela.to_pandas()
+
+
+def _read_full_file(file_path: str, formato: str) -> pd.DataFrame:
+    """
+    Lê o arquivo inteiro no formato indicado, trazendo apenas as colunas usadas
+    pelo pipeline. A compressão do CSV é inferida pela extensão.
+    """
+    if formato == FORMATO_PARQUET:
+        return pd.read_parquet(file_path, columns=COLUNAS)
+    if formato == FORMATO_ARROW:
+        return pd.read_feather(file_path, columns=COLUNAS)
+
+    if CSV_ENGINE == "pyarrow":
+        import pyarrow as pa
+
+        try:
+            return _read_csv_pyarrow(file_path)
+        except pa.ArrowException as e:
+            # O pyarrow infere o tipo de "id_pacote" pelo início do arquivo e
+            # falha se um valor não numérico aparecer depois; também não
+            # descomprime alguns formatos, como o xz
+            logger.warning(
+                f"Leitura com pyarrow falhou, usando o leitor do pandas: {e}"
+            )
+
+    return pd.read_csv(file_path, dtype=CSV_DTYPES, usecols=COLUNAS)
+
+
+def _iter_columnar_chunks(
+    file_path: str, formato: str, chunksize: int
+) -> Iterator[pd.DataFrame]:
+    """
+    Lê um arquivo Parquet ou Arrow IPC em lotes de até `chunksize` linhas,
+    mantendo o índice contínuo entre os lotes como na leitura de CSV.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    linhas_lidas = 0
+    with pa.memory_map(file_path) as fonte:
+        if formato == FORMATO_PARQUET:
+            batches = pq.ParquetFile(fonte).iter_batches(
+                batch_size=chunksize, columns=COLUNAS
+            )
+        else:
+            leitor = pa.ipc.open_file(fonte)
+            batches = (
+                leitor.get_batch(i).select(COLUNAS)
+                for i in range(leitor.num_record_batches)
+            )
+
+        for batch in batches:
+            for inicio in range(0, batch.num_rows, chunksize):
+                df = batch.slice(inicio, chunksize).to_pandas()
+                df.index += linhas_lidas
+                linhas_lidas += len(df)
+                yield df
+
+
+@contextmanager
+def _open_chunks(
+    file_path: str,
+    formato: str,
+    chunksize: int,
+    checkpoint_path: str | None,
+    run_id: str | None = None,
+):
+    """
+    Retorna um iterador de DataFrames com `chunksize` linhas cada, conforme o formato.
+    """
+    if formato in (FORMATO_PARQUET, FORMATO_ARROW):
+        yield _iter_columnar_chunks(file_path, formato, chunksize)
+        return
+
+    with _open_csv(file_path, checkpoint_path, run_id) as (fonte, leitura_kwargs):
+        with pd.read_csv(
+            fonte,
+            dtype=CSV_DTYPES,
+            usecols=COLUNAS,
+            chunksize=chunksize,
+            **leitura_kwargs,
+        ) as leitor:
+            yield leitor
+
+
+def _incremental_checkpoint(
+    file_path: str, formato: str, checkpoint_path: str | None
+) -> str | None:
+    """
+    A extração incremental depende de posições em bytes, então só é possível em
+    CSV sem compressão. Nos demais formatos o checkpoint é ignorado.
+    """
+    if checkpoint_path and formato != FORMATO_CSV:
+        logger.warning(
+            f"Extração incremental indisponível para o formato '{formato}'. "
+            "Lendo o arquivo completo."
+        )
+        return None
+    return checkpoint_path
+
+
+class _ByteRangeReader(io.RawIOBase):
+    """
+    Expõe apenas os próximos `restante` bytes de um arquivo aberto, para que o
+    pandas leia somente o intervalo novo sem carregá-lo inteiro em memória.
+    """
+
+    def __init__(self, arquivo, restante: int):
+        self._arquivo = arquivo
+        self._restante = restante
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._restante <= 0:
+            return 0
+        lidos = self._arquivo.readinto(memoryview(buffer)[: self._restante])
+        self._restante -= lidos
+        return lidos
 
-def extract_from_csv(file_path: str) -> pd.DataFrame | None:
+
+def _read_header(file_path: str) -> Tuple[List[str], int]:
+    """
+    Retorna as colunas do cabeçalho e a posição logo após a linha de cabeçalho.
+    """
+    with open(file_path, "rb") as f:
+        cabecalho = f.readline()
+    colunas = next(csv.reader([cabecalho.decode("utf-8")]), [])
+    return colunas, len(cabecalho)
+
+
+def _align_to_next_line(arquivo, posicao: int) -> int:
+    """
+    Avança `posicao` até o início da próxima linha, para que nenhum shard
+    comece ou termine no meio de uma linha.
+    """
+    if posicao <= 0:
+        return 0
+    arquivo.seek(posicao - 1)
+    arquivo.readline()
+    return arquivo.tell()
+
+
+@contextmanager
+def _open_csv(file_path: str, checkpoint_path: str | None, run_id: str | None = None):
+    """
+    Retorna a fonte e os argumentos extras do `pd.read_csv`. Com `checkpoint_path`,
+    lê apenas as linhas adicionadas desde o último checkpoint confirmado e, ao
+    final da leitura, registra o novo checkpoint como pendente da execução `run_id`.
+    """
+    if not checkpoint_path:
+        yield file_path, {}
+        return
+
+    discard_pending_checkpoint(checkpoint_path)
+    fim = last_complete_line_offset(file_path)
+    inicio = resolve_start_offset(file_path, read_checkpoint(checkpoint_path))
+
+    leitura_kwargs = {}
+    if inicio > 0:
+        # A partir do meio do arquivo não há cabeçalho, então ele é lido à parte
+        colunas, _ = _read_header(file_path)
+        leitura_kwargs = {"header": None, "names": colunas}
+
+    logger.info(f"Lendo {fim - inicio} bytes novos do arquivo.")
+    with open(file_path, "rb") as f:
+        f.seek(inicio)
+        yield io.BufferedReader(_ByteRangeReader(f, fim - inicio)), leitura_kwargs
+
+    save_pending_checkpoint(checkpoint_path, build_checkpoint(file_path, fim, run_id))
+
+
+def extract_from_csv(
+    file_path: str, checkpoint_path: str | None = None, run_id: str | None = None
+) -> pd.DataFrame | None:
     """
     Extrai dados de um arquivo CSV, tratando possíveis erros
-    e em caso de sucesso retorna um DataFrame
+    e em caso de sucesso retorna um DataFrame.
+    - Aceita também CSV comprimido (gzip, zstd, bz2, xz), Parquet e Arrow IPC,
+      detectados pela extensão, lendo apenas as colunas usadas pelo pipeline.
+    - Com `checkpoint_path`, extrai apenas as linhas novas desde a última carga
+      (somente CSV sem compressão). O checkpoint pendente é registrado em nome
+      de `run_id`, que deve ser repassado a `commit_checkpoint`.
     """
 
     try:
-        logger.info(f"Iniciando a extração do arquivo: {file_path}")
-        df = pd.read_csv(file_path)
+        formato = detect_input_format(file_path)
+        logger.info(
+            f"Iniciando a extração do arquivo: {file_path} (formato: {formato})"
+        )
+        checkpoint_path = _incremental_checkpoint(file_path, formato, checkpoint_path)
+
+        if checkpoint_path:
+            with _open_csv(file_path, checkpoint_path, run_id) as (
+                fonte,
+                leitura_kwargs,
+            ):
+                df = pd.read_csv(
+                    fonte, dtype=CSV_DTYPES, usecols=COLUNAS, **leitura_kwargs
+                )
+        else:
+            df = _read_full_file(file_path, formato)
 
         if df.empty:
-            logger.warning(f"O arquivo '{file_path}' está vazio.")
+            logger.warning(f"O arquivo '{file_path}' está vazio ou sem linhas novas.")
             return None
 
         logger.info(f"Extração concluída com sucesso. {len(df)} linhas encontradas.")
@@ -27,3 +290,117 @@ def extract_from_csv(file_path: str) -> pd.DataFrame | None:
     except Exception as e:
         logger.exception(f"Ocorreu um erro inesperado ao ler o arquivo: {e}")
         return None
+
+
+def extract_csv_in_chunks(
+    file_path: str,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    checkpoint_path: str | None = None,
+    run_id: str | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Extrai dados de um arquivo CSV em lotes de `chunksize` linhas, mantendo
+    em memória apenas um lote por vez. Erros no meio da leitura são propagados
+    para que o carregamento possa fazer rollback da transação.
+    - Aceita os mesmos formatos de `extract_from_csv`.
+    - Com `checkpoint_path`, extrai apenas as linhas novas desde a última carga
+      (somente CSV sem compressão), registrando o checkpoint em nome de `run_id`.
+    """
+
+    formato = detect_input_format(file_path)
+    logger.info(
+        f"Iniciando a extração em lotes de {chunksize} linhas do arquivo: {file_path} "
+        f"(formato: {formato})"
+    )
+    checkpoint_path = _incremental_checkpoint(file_path, formato, checkpoint_path)
+
+    total_linhas = 0
+    try:
+        with _open_chunks(
+            file_path, formato, chunksize, checkpoint_path, run_id
+        ) as lotes:
+            for numero_lote, df in enumerate(lotes, start=1):
+                total_linhas += len(df)
+                logger.info(f"Lote {numero_lote} extraído com {len(df)} linhas.")
+                yield df
+    except FileNotFoundError:
+        logger.error(f"O arquivo não foi encontrado no caminho: {file_path}")
+        return
+    except pd.errors.EmptyDataError:
+        logger.warning(f"O arquivo '{file_path}' está vazio.")
+        return
+
+    logger.info(f"Extração concluída com sucesso. {total_linhas} linhas encontradas.")
+
+
+def plan_byte_shards(
+    file_path: str,
+    num_shards: int,
+    checkpoint_path: str | None = None,
+    run_id: str | None = None,
+) -> List[dict]:
+    """
+    Divide as linhas do CSV em até `num_shards` intervalos de bytes consecutivos,
+    alinhados ao início das linhas, para processamento em paralelo.
+    Com `checkpoint_path`, considera apenas as linhas novas desde a última carga
+    e registra o checkpoint pendente da execução `run_id`, como em `extract_from_csv`.
+    """
+    if detect_input_format(file_path) != FORMATO_CSV:
+        raise ValueError("A divisão em shards por bytes exige um CSV sem compressão.")
+
+    colunas, fim_cabecalho = _read_header(file_path)
+    if not colunas:
+        logger.warning(f"O arquivo '{file_path}' está vazio.")
+        return []
+
+    fim = last_complete_line_offset(file_path)
+    inicio = fim_cabecalho
+    if checkpoint_path:
+        discard_pending_checkpoint(checkpoint_path)
+        checkpoint = read_checkpoint(checkpoint_path)
+        inicio = max(resolve_start_offset(file_path, checkpoint), fim_cabecalho)
+        save_pending_checkpoint(
+            checkpoint_path, build_checkpoint(file_path, fim, run_id)
+        )
+
+    tamanho = fim - inicio
+    limites = [inicio]
+    with open(file_path, "rb") as f:
+        for i in range(1, num_shards):
+            limite = _align_to_next_line(f, inicio + tamanho * i // num_shards)
+            limites.append(min(max(limite, limites[-1]), fim))
+    limites.append(fim)
+
+    shards = [
+        {"numero": numero, "inicio": shard_inicio, "fim": shard_fim}
+        for numero, (shard_inicio, shard_fim) in enumerate(zip(limites, limites[1:]))
+        if shard_fim > shard_inicio
+    ]
+    logger.info(f"{tamanho} bytes divididos em {len(shards)} shards: {shards}")
+    return shards
+
+
+def extract_byte_range(file_path: str, inicio: int, fim: int) -> pd.DataFrame | None:
+    """
+    Extrai as linhas contidas no intervalo de bytes [inicio, fim) do CSV,
+    normalmente um shard gerado por `plan_byte_shards`.
+    """
+    logger.info(f"Extraindo bytes {inicio} a {fim} do arquivo: {file_path}")
+    colunas, _ = _read_header(file_path)
+
+    with open(file_path, "rb") as f:
+        f.seek(inicio)
+        df = pd.read_csv(
+            io.BufferedReader(_ByteRangeReader(f, fim - inicio)),
+            dtype=CSV_DTYPES,
+            usecols=COLUNAS,
+            header=None,
+            names=colunas,
+        )
+
+    if df.empty:
+        logger.warning("Intervalo sem linhas.")
+        return None
+
+    logger.info(f"Extração concluída com sucesso. {len(df)} linhas encontradas.")
+    return df
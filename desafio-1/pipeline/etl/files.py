@@ -0,0 +1,29 @@
+import json
+import os
+import re
+
+
+def safe_file_name(texto: str) -> str:
+    """
+    Substitui os caracteres que não podem compor um nome de arquivo.
+    """
+    # run_id do Airflow contém caracteres como ":" e "+", inválidos em alguns sistemas de arquivos
+    return re.sub(r"[^\w.-]", "_", texto)
+
+
+def write_text_atomic(path: str, conteudo: str):
+    """
+    Grava o texto em um arquivo temporário e o move para `path`, para que uma
+    falha no meio da escrita não deixe um arquivo corrompido.
+    """
+    caminho_temp = f"{path}.tmp"
+    with open(caminho_temp, "w") as f:
+        f.write(conteudo)
+    os.replace(caminho_temp, path)
+
+
+def write_json_atomic(path: str, dados: dict, **opcoes_json):
+    """
+    Grava o JSON de forma atômica, como em `write_text_atomic`.
+    """
+    write_text_atomic(path, json.dumps(dados, **opcoes_json))
@@ -0,0 +1,57 @@
+import logging
+import os
+import shutil
+import pandas as pd
+
+from .files import safe_file_name
+
+logger = logging.getLogger(__name__)
+
+# Diretório padrão dos arquivos trocados entre as tasks, relativo ao diretório de execução
+DEFAULT_HANDOFF_DIR = "handoff"
+
+
+def _run_dir(run_id: str, base_dir: str | None = None) -> str:
+    """
+    Retorna o diretório dos arquivos de uma execução. O diretório base pode ser
+    definido por `base_dir` ou pela variável de ambiente PIPELINE_HANDOFF_DIR,
+    e deve ser compartilhado entre os workers que executam as tasks.
+    """
+    base_dir = base_dir or os.getenv("PIPELINE_HANDOFF_DIR", DEFAULT_HANDOFF_DIR)
+    return os.path.join(base_dir, safe_file_name(run_id))
+
+
+def write_handoff(
+    df: pd.DataFrame, run_id: str, nome: str, base_dir: str | None = None
+) -> dict:
+    """
+    Grava o DataFrame em Parquet e retorna uma referência pequena, com o caminho
+    e a quantidade de linhas, que pode trafegar pelo XCom no lugar dos dados.
+    """
+    diretorio = _run_dir(run_id, base_dir)
+    os.makedirs(diretorio, exist_ok=True)
+
+    path = os.path.join(diretorio, f"{nome}.parquet")
+    df.to_parquet(path, index=False)
+    logger.info(f"{len(df)} linhas gravadas para a próxima task em: {path}")
+
+    return {"path": path, "rows": len(df)}
+
+
+def read_handoff(referencia: dict) -> pd.DataFrame:
+    """
+    Lê o DataFrame apontado por uma referência criada em `write_handoff`.
+    """
+    df = pd.read_parquet(referencia["path"])
+    logger.info(f"{len(df)} linhas lidas da task anterior em: {referencia['path']}")
+    return df
+
+
+def cleanup_handoff(run_id: str, base_dir: str | None = None):
+    """
+    Remove os arquivos trocados entre as tasks de uma execução concluída.
+    """
+    diretorio = _run_dir(run_id, base_dir)
+    if os.path.isdir(diretorio):
+        shutil.rmtree(diretorio)
+        logger.info(f"Arquivos intermediários removidos: {diretorio}")
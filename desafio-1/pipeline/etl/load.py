@@ -3,9 +3,22 @@ import os
 import pandas as pd
 from dotenv import load_dotenv
 import io
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Tuple
+
+from .metrics import timed_statement
+from .schema import COLUNAS_CATEGORICAS
 
 logger = logging.getLogger(__name__)
 
+# Quantidade de linhas renderizadas para CSV por vez durante o COPY
+LINHAS_POR_BLOCO_COPY = 10_000
+
+# Tamanho em bytes de cada leitura feita pelo psycopg2 ao enviar o COPY
+TAMANHO_BUFFER_COPY = 64 * 1024
+
 
 def get_db_connection():
     """
@@ -31,85 +44,307 @@ def get_db_connection():
         return psycopg2.connect(database_url)
 
 
-def load_data(df_pacotes: pd.DataFrame, df_eventos: pd.DataFrame):
+class _IteratorStream(io.RawIOBase):
     """
-    Carrega os DataFrames de pacotes e eventos no banco de dados por meio de uma transação.
-    - Estratégia "upsert" para ambas as tabela `pacotes` e `eventos_rastreamento`.
+    Arquivo somente leitura alimentado por um gerador de blocos de bytes. Permite
+    ao `copy_expert` consumir os dados sob demanda, sem um CSV inteiro em memória.
     """
-    conn = None
 
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    def __init__(self, blocos: Iterator[bytes]):
+        self._blocos = blocos
+        self._bloco = memoryview(b"")
 
-        # [Pacotes]
-        logger.info(
-            f"Iniciando carregamento de {len(df_pacotes)} registros na tabela 'pacotes'..."
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._bloco:
+            try:
+                self._bloco = memoryview(next(self._blocos))
+            except StopIteration:
+                return 0
+
+        tamanho = min(len(buffer), len(self._bloco))
+        buffer[:tamanho] = self._bloco[:tamanho]
+        self._bloco = self._bloco[tamanho:]
+        return tamanho
+
+
+def _csv_blocks(df: pd.DataFrame, linhas_por_bloco: int) -> Iterator[bytes]:
+    """
+    Gera o DataFrame em CSV (com aspas onde necessário) um bloco de linhas por vez.
+    """
+    for inicio in range(0, len(df), linhas_por_bloco):
+        bloco = df.iloc[inicio : inicio + linhas_por_bloco]
+        yield bloco.to_csv(index=False, header=False).encode("utf-8")
+
+
+def _copy_dataframe(
+    cursor, df: pd.DataFrame, tabela: str, nome_metrica: str | None = None
+):
+    """
+    Envia o DataFrame para `tabela` via `COPY ... FROM STDIN` em formato CSV,
+    o que preserva valores com vírgulas, aspas ou quebras de linha.
+    """
+    colunas = ", ".join(df.columns)
+    opcoes = "FORMAT csv"
+    # No formato CSV, um campo vazio sem aspas vira NULL. Um texto vazio (como uma
+    # origem só com espaços, após a limpeza) deve ser carregado como '', e não
+    # violar o NOT NULL das tabelas
+    colunas_texto = [col for col in df.columns if col in COLUNAS_CATEGORICAS]
+    if colunas_texto:
+        opcoes += f", FORCE_NOT_NULL ({', '.join(colunas_texto)})"
+    copy_sql = f"COPY {tabela} ({colunas}) FROM STDIN WITH ({opcoes})"
+
+    inicio = time.perf_counter()
+    with timed_statement(nome_metrica or f"copy_{tabela}", cursor):
+        cursor.copy_expert(
+            copy_sql,
+            _IteratorStream(_csv_blocks(df, LINHAS_POR_BLOCO_COPY)),
+            size=TAMANHO_BUFFER_COPY,
         )
+    duracao = time.perf_counter() - inicio
+
+    linhas_por_segundo = len(df) / duracao if duracao > 0 else float("inf")
+    logger.info(
+        f"COPY de {len(df)} linhas em '{tabela}' concluído em {duracao:.2f}s "
+        f"({linhas_por_segundo:.0f} linhas/s)."
+    )
+
 
-        # Upsert: Inserir em uma tabela temporária e depois usar 'ON CONFLICT' para
-        # inserir apenas pacotes novos no banco
+def _create_temp_tables(cursor):
+    """
+    Cria as tabelas temporárias usadas como área de staging do upsert.
+    Elas são descartadas automaticamente ao final da transação.
+    """
+    with timed_statement("create_temp_tables"):
         cursor.execute(
             """
             CREATE TEMPORARY TABLE pacotes_temp (
                 id_pacote INT,
                 origem VARCHAR,
-                destino VARCHAR         
+                destino VARCHAR
             ) ON COMMIT DROP;
         """
         )
-
-        # Converte o DataFrame de pacotes para um CSV em memória
-        string_io = io.StringIO()
-        df_pacotes.to_csv(string_io, index=False, header=False)
-        string_io.seek(0)
-
-        cursor.copy_from(string_io, "pacotes_temp", columns=df_pacotes.columns, sep=",")
-
-        upsert_pacotes_sql = """
-            INSERT INTO pacotes (id_pacote, origem, destino)
-            SELECT id_pacote, origem, destino
-                        FROM pacotes_temp
-                        ON CONFLICT (id_pacote) DO NOTHING;
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE eventos_temp (
+                id_pacote INT,
+                status_rastreamento VARCHAR,
+                data_evento TIMESTAMP WITH TIME ZONE
+            ) ON COMMIT DROP;
         """
-        cursor.execute(upsert_pacotes_sql)
-        logger.info(f"[*] {cursor.rowcount} novos registros de pacotes inseridos.")
-
-        # [Eventos]
-        logger.info(
-            f"Iniciando carregamento de {len(df_eventos)} registros na tabela 'eventos_rastreamento'..."
         )
-
-        # Upsert: Inserir em uma tabela temporária e depois usar 'ON CONFLICT' para
-        # inserir apenas eventos novos no banco
         cursor.execute(
             """
-            CREATE TEMPORARY TABLE eventos_temp (
+            CREATE TEMPORARY TABLE eventos_inseridos (
                 id_pacote INT,
                 status_rastreamento VARCHAR,
-                data_evento TIMESTAMP WITH TIME ZONE         
+                data_evento TIMESTAMP WITH TIME ZONE
             ) ON COMMIT DROP;
         """
         )
 
-        # Converte o DataFrame de eventos para um CSV em memória
-        string_io = io.StringIO()
-        df_eventos.to_csv(string_io, index=False, header=False)
-        string_io.seek(0)
 
-        cursor.copy_from(string_io, "eventos_temp", columns=df_eventos.columns, sep=",")
+def _upsert_pacotes(cursor, df_pacotes: pd.DataFrame) -> int:
+    """
+    Carrega os pacotes pela tabela temporária `pacotes_temp`, sem commit.
+    Retorna a quantidade de pacotes novos inseridos.
+    """
+    logger.info(
+        f"Iniciando carregamento de {len(df_pacotes)} registros na tabela 'pacotes'..."
+    )
+
+    # Upsert: Inserir em uma tabela temporária e depois usar 'ON CONFLICT' para
+    # inserir apenas pacotes novos no banco
+    with timed_statement("truncate_pacotes_temp"):
+        cursor.execute("TRUNCATE pacotes_temp;")
+    _copy_dataframe(cursor, df_pacotes, "pacotes_temp")
+
+    upsert_pacotes_sql = """
+        INSERT INTO pacotes (id_pacote, origem, destino)
+        SELECT id_pacote, origem, destino
+                    FROM pacotes_temp
+                    ON CONFLICT (id_pacote) DO NOTHING;
+    """
+    with timed_statement("upsert_pacotes", cursor):
+        cursor.execute(upsert_pacotes_sql)
+    pacotes_inseridos = cursor.rowcount
+    logger.info(f"[*] {pacotes_inseridos} novos registros de pacotes inseridos.")
+    return pacotes_inseridos
 
-        upsert_eventos_sql = """
+
+def _upsert_status_atual(cursor, tabela_origem: str):
+    """
+    Atualiza `pacote_status_atual` com o evento mais recente de cada pacote em
+    `tabela_origem`. A linha só é sobrescrita se o evento for mais novo que o
+    armazenado, então eventos atrasados ou fora de ordem não regridem o status.
+    """
+    upsert_status_sql = f"""
+        INSERT INTO pacote_status_atual (id_pacote, status_rastreamento, data_evento)
+        SELECT DISTINCT ON (id_pacote) id_pacote, status_rastreamento, data_evento
+                    FROM {tabela_origem}
+                    ORDER BY id_pacote, data_evento DESC
+                    ON CONFLICT (id_pacote) DO UPDATE
+                    SET status_rastreamento = EXCLUDED.status_rastreamento,
+                        data_evento = EXCLUDED.data_evento
+                    WHERE pacote_status_atual.data_evento < EXCLUDED.data_evento;
+    """
+    with timed_statement("upsert_status_atual", cursor):
+        cursor.execute(upsert_status_sql)
+    logger.info(f"[*] {cursor.rowcount} status atuais de pacotes atualizados.")
+
+
+def _atualizar_kpi_entrega(cursor, tabela_origem: str):
+    """
+    Atualiza `pacote_entrega` (primeiro evento e data de entrega de cada pacote)
+    e o agregado `kpi_tempo_entrega` com os eventos de `tabela_origem`.
+
+    O agregado recebe apenas a diferença entre a contribuição nova e a anterior
+    de cada pacote afetado, então eventos atrasados ou fora de ordem (que mudam
+    o início ou a entrega de um pacote já contabilizado) continuam corretos.
+    """
+    # Trava a linha do agregado antes de ler os valores anteriores, para que
+    # cargas concorrentes não calculem a diferença sobre o mesmo estado
+    with timed_statement("lock_kpi_tempo_entrega"):
+        cursor.execute("SELECT 1 FROM kpi_tempo_entrega WHERE id = 1 FOR UPDATE;")
+
+    atualizar_kpi_sql = f"""
+        WITH novos AS (
+            SELECT
+                id_pacote,
+                MIN(data_evento) AS primeiro_evento,
+                MAX(CASE WHEN status_rastreamento = 'ENTREGUE' THEN data_evento END) AS data_entrega
+            FROM {tabela_origem}
+            GROUP BY id_pacote
+        ),
+        anteriores AS (
+            SELECT pe.id_pacote, pe.primeiro_evento, pe.data_entrega
+            FROM pacote_entrega pe
+            JOIN novos USING (id_pacote)
+        ),
+        atualizados AS (
+            INSERT INTO pacote_entrega (id_pacote, primeiro_evento, data_entrega)
+            SELECT id_pacote, primeiro_evento, data_entrega FROM novos
+            ON CONFLICT (id_pacote) DO UPDATE
+            SET primeiro_evento = LEAST(pacote_entrega.primeiro_evento, EXCLUDED.primeiro_evento),
+                data_entrega = GREATEST(pacote_entrega.data_entrega, EXCLUDED.data_entrega)
+            RETURNING primeiro_evento, data_entrega
+        )
+        UPDATE kpi_tempo_entrega
+        SET soma_duracao = soma_duracao
+                + COALESCE((SELECT SUM(data_entrega - primeiro_evento) FROM atualizados), INTERVAL '0')
+                - COALESCE((SELECT SUM(data_entrega - primeiro_evento) FROM anteriores), INTERVAL '0'),
+            total_entregas = total_entregas
+                + (SELECT COUNT(data_entrega) FROM atualizados)
+                - (SELECT COUNT(data_entrega) FROM anteriores)
+        WHERE id = 1;
+    """
+    with timed_statement("atualizar_kpi_entrega"):
+        cursor.execute(atualizar_kpi_sql)
+
+
+def _merge_eventos(cursor, tabela_origem: str) -> int:
+    """
+    Insere em `eventos_rastreamento` os eventos novos presentes em `tabela_origem`
+    e atualiza a projeção `pacote_status_atual` e o KPI de tempo de entrega.
+    Retorna a quantidade de eventos novos inseridos.
+
+    A projeção e o KPI são calculados apenas com os eventos efetivamente
+    inseridos (guardados em `eventos_inseridos`): um evento reprocessado com a
+    mesma chave e outro status é descartado pelo ON CONFLICT e não pode
+    divergir do que está em `eventos_rastreamento`.
+    """
+    with timed_statement("truncate_eventos_inseridos"):
+        cursor.execute("TRUNCATE eventos_inseridos;")
+
+    upsert_eventos_sql = f"""
+        WITH inseridos AS (
             INSERT INTO eventos_rastreamento (id_pacote, status_rastreamento, data_evento)
             SELECT id_pacote, status_rastreamento, data_evento
-                        FROM eventos_temp
-                        ON CONFLICT (id_pacote, data_evento) DO NOTHING;
-        """
+                        FROM {tabela_origem}
+                        ON CONFLICT (id_pacote, data_evento) DO NOTHING
+            RETURNING id_pacote, status_rastreamento, data_evento
+        )
+        INSERT INTO eventos_inseridos (id_pacote, status_rastreamento, data_evento)
+        SELECT id_pacote, status_rastreamento, data_evento FROM inseridos;
+    """
+    with timed_statement("upsert_eventos", cursor):
         cursor.execute(upsert_eventos_sql)
-        logger.info(f"[*] {cursor.rowcount} novos registros de eventos inseridos.")
+    eventos_inseridos = cursor.rowcount
+    logger.info(f"[*] {eventos_inseridos} novos registros de eventos inseridos.")
+
+    _upsert_status_atual(cursor, "eventos_inseridos")
+    _atualizar_kpi_entrega(cursor, "eventos_inseridos")
+    return eventos_inseridos
+
+
+def _load_chunk(
+    cursor, df_pacotes: pd.DataFrame, df_eventos: pd.DataFrame
+) -> Tuple[int, int]:
+    """
+    Carrega um lote de pacotes e eventos pelas tabelas temporárias, sem commit.
+    Retorna a quantidade de pacotes e eventos novos inseridos.
+    """
+
+    # [Pacotes]
+    pacotes_inseridos = _upsert_pacotes(cursor, df_pacotes)
+
+    # [Eventos]
+    logger.info(
+        f"Iniciando carregamento de {len(df_eventos)} registros na tabela 'eventos_rastreamento'..."
+    )
+
+    # Upsert: Inserir em uma tabela temporária e depois usar 'ON CONFLICT' para
+    # inserir apenas eventos novos no banco
+    with timed_statement("truncate_eventos_temp"):
+        cursor.execute("TRUNCATE eventos_temp;")
+    _copy_dataframe(cursor, df_eventos, "eventos_temp")
+    eventos_inseridos = _merge_eventos(cursor, "eventos_temp")
 
+    return pacotes_inseridos, eventos_inseridos
+
+
+def load_data(df_pacotes: pd.DataFrame, df_eventos: pd.DataFrame):
+    """
+    Carrega os DataFrames de pacotes e eventos no banco de dados por meio de uma transação.
+    - Estratégia "upsert" para ambas as tabela `pacotes` e `eventos_rastreamento`.
+    """
+    load_data_in_chunks([(df_pacotes, df_eventos)])
+
+
+def load_data_in_chunks(lotes: Iterable[Tuple[pd.DataFrame, pd.DataFrame]]):
+    """
+    Carrega uma sequência de lotes (pacotes, eventos) em uma única transação.
+    - Cada lote passa pelas tabelas temporárias e é descartado em seguida, então
+      a memória usada não depende do tamanho total da entrada.
+    - O commit acontece apenas uma vez, após o último lote.
+    """
+    conn = None
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        _create_temp_tables(cursor)
+
+        total_pacotes = 0
+        total_eventos = 0
+        for numero_lote, (df_pacotes, df_eventos) in enumerate(lotes, start=1):
+            logger.info(f"Carregando lote {numero_lote}...")
+            pacotes_inseridos, eventos_inseridos = _load_chunk(
+                cursor, df_pacotes, df_eventos
+            )
+            total_pacotes += pacotes_inseridos
+            total_eventos += eventos_inseridos
+
+        logger.info(
+            f"Total inserido: {total_pacotes} pacotes e {total_eventos} eventos."
+        )
         logger.info("Transação concluída com sucesso. Realizando commit...")
-        conn.commit()
+        with timed_statement("commit"):
+            conn.commit()
 
     except Exception as e:
         logger.exception(f"Erro na transação. Fazendo rollback...")
@@ -121,3 +356,115 @@ def load_data(df_pacotes: pd.DataFrame, df_eventos: pd.DataFrame):
         if conn:
             logger.info("Conexão com banco de dados fechada.")
             conn.close()
+
+
+def _copy_shard(df_shard: pd.DataFrame, tabela_staging: str, numero_shard: int):
+    """
+    Copia um shard de eventos para a tabela de staging em uma conexão própria.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        logger.info(f"Shard {numero_shard}: copiando {len(df_shard)} eventos...")
+        _copy_dataframe(cursor, df_shard, tabela_staging, "copy_eventos_staging")
+        with timed_statement("commit_shard"):
+            conn.commit()
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+
+def _drop_staging_table(tabela_staging: str):
+    """
+    Remove a tabela de staging usada na carga paralela.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        conn.cursor().execute(f"DROP TABLE IF EXISTS {tabela_staging};")
+        conn.commit()
+    except Exception:
+        logger.exception(
+            f"Não foi possível remover a tabela de staging '{tabela_staging}'."
+        )
+    finally:
+        if conn:
+            conn.close()
+
+
+def load_data_parallel(
+    df_pacotes: pd.DataFrame, df_eventos: pd.DataFrame, num_conexoes: int = 4
+):
+    """
+    Carrega pacotes e eventos usando `num_conexoes` conexões simultâneas.
+    - Os eventos são particionados por hash de `id_pacote` e cada shard é copiado
+      em paralelo para uma tabela de staging UNLOGGED, sem restrições.
+    - Uma transação final insere os pacotes (garantindo a FK) e mescla a staging
+      em `eventos_rastreamento`, mantendo a semântica de tudo ou nada.
+    """
+    tabela_staging = f"eventos_staging_{uuid.uuid4().hex[:12]}"
+    conn = None
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        # Fase 1: Tabela de staging visível para todas as conexões
+        with timed_statement("create_staging_table"):
+            cursor.execute(
+                f"""
+                CREATE UNLOGGED TABLE {tabela_staging} (
+                    id_pacote INT,
+                    status_rastreamento VARCHAR,
+                    data_evento TIMESTAMP WITH TIME ZONE
+                );
+            """
+            )
+            conn.commit()
+
+        # Fase 2: Cópia paralela dos shards de eventos
+        shards = [
+            df_shard
+            for _, df_shard in df_eventos.groupby(
+                df_eventos["id_pacote"] % num_conexoes, sort=False
+            )
+        ]
+        logger.info(
+            f"Copiando {len(df_eventos)} eventos em {len(shards)} shards "
+            f"com até {num_conexoes} conexões..."
+        )
+        with ThreadPoolExecutor(max_workers=num_conexoes) as executor:
+            futuros = [
+                executor.submit(_copy_shard, df_shard, tabela_staging, numero)
+                for numero, df_shard in enumerate(shards, start=1)
+            ]
+            for futuro in futuros:
+                futuro.result()
+
+        # Fase 3: Transação final com pacotes e eventos
+        _create_temp_tables(cursor)
+        _upsert_pacotes(cursor, df_pacotes)
+        _merge_eventos(cursor, tabela_staging)
+        with timed_statement("drop_staging_table"):
+            cursor.execute(f"DROP TABLE {tabela_staging};")
+
+        logger.info("Transação concluída com sucesso. Realizando commit...")
+        with timed_statement("commit"):
+            conn.commit()
+
+    except Exception as e:
+        logger.exception(f"Erro na carga paralela. Fazendo rollback...")
+        logger.exception(f"Erro: {e}")
+        if conn:
+            conn.rollback()
+        _drop_staging_table(tabela_staging)
+        raise
+    finally:
+        if conn:
+            logger.info("Conexão com banco de dados fechada.")
+            conn.close()
@@ -0,0 +1,376 @@
+import json
+import logging
+import os
+import resource
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator
+
+from .files import safe_file_name, write_json_atomic, write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+# Diretório padrão dos relatórios de execução, relativo ao diretório de execução
+DEFAULT_METRICS_DIR = "metricas"
+
+# Idade a partir da qual as métricas parciais de uma execução que não gerou
+# relatório (por exemplo, interrompida) são removidas
+IDADE_MAXIMA_PARCIAIS_S = 7 * 24 * 3600
+
+# Intervalo entre as leituras de memória durante uma etapa
+INTERVALO_AMOSTRA_MEMORIA_S = 0.05
+
+_TAMANHO_PAGINA = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Métricas da execução ativa, usadas pelas etapas internas (streaming) e pelo
+# tempo de cada statement do `load_data`
+_ativo = None
+
+
+def _rss_atual() -> int | None:
+    """
+    Memória residente atual do processo (Linux). Retorna None se indisponível.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _TAMANHO_PAGINA
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _AmostradorMemoria:
+    """
+    Lê a memória residente em uma thread enquanto a etapa executa e guarda o
+    pico. Sem /proc, usa o pico do processo inteiro (`ru_maxrss`).
+    """
+
+    def __init__(self):
+        self.pico = _rss_atual()
+        self._parar = threading.Event()
+        self._thread = None
+        if self.pico is not None:
+            self._thread = threading.Thread(target=self._amostrar, daemon=True)
+            self._thread.start()
+
+    def _amostrar(self):
+        while not self._parar.wait(INTERVALO_AMOSTRA_MEMORIA_S):
+            self.pico = max(self.pico, _rss_atual() or 0)
+
+    def parar(self) -> int:
+        if self._thread is None:
+            # ru_maxrss é informado em KiB no Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        self._parar.set()
+        self._thread.join()
+        return max(self.pico, _rss_atual() or 0)
+
+
+class RunMetrics:
+    """
+    Métricas de uma execução do pipeline: duração, linhas de entrada e saída,
+    linhas/s e pico de memória de cada etapa, e o tempo de cada statement da
+    carga. Etapas e statements repetidos (lotes do modo streaming) são somados.
+    """
+
+    def __init__(self, pipeline: str, run_id: str):
+        self.pipeline = pipeline
+        self.run_id = run_id
+        self.inicio = datetime.now(timezone.utc)
+        self.duracao_s = None
+        self.sucesso = None
+        self.etapas: dict[str, dict] = {}
+        self.statements: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, nome: str, linhas_entrada: int | None = None) -> Iterator[dict]:
+        """
+        Mede uma etapa. O dicionário retornado recebe `linhas_saida` ao final.
+        """
+        registro = {"linhas_entrada": linhas_entrada, "linhas_saida": None}
+        amostrador = _AmostradorMemoria()
+        inicio = time.perf_counter()
+        sucesso = False
+        try:
+            yield registro
+            sucesso = True
+        finally:
+            self._add_stage(
+                nome,
+                {
+                    "chamadas": 1,
+                    "duracao_s": time.perf_counter() - inicio,
+                    "linhas_entrada": registro["linhas_entrada"],
+                    "linhas_saida": registro["linhas_saida"],
+                    "pico_rss_bytes": amostrador.parar(),
+                    "sucesso": sucesso,
+                },
+            )
+
+    def _add_stage(self, nome: str, medicao: dict):
+        with self._lock:
+            etapa = self.etapas.setdefault(
+                nome,
+                {
+                    "chamadas": 0,
+                    "duracao_s": 0.0,
+                    "linhas_entrada": None,
+                    "linhas_saida": None,
+                    "pico_rss_bytes": 0,
+                    "sucesso": True,
+                },
+            )
+            etapa["chamadas"] += medicao["chamadas"]
+            etapa["duracao_s"] += medicao["duracao_s"]
+            for chave in ("linhas_entrada", "linhas_saida"):
+                if medicao[chave] is not None:
+                    etapa[chave] = (etapa[chave] or 0) + medicao[chave]
+            etapa["pico_rss_bytes"] = max(
+                etapa["pico_rss_bytes"], medicao["pico_rss_bytes"]
+            )
+            etapa["sucesso"] = etapa["sucesso"] and medicao["sucesso"]
+
+    def record_statement(
+        self, nome: str, duracao_s: float, linhas: int | None = None, chamadas: int = 1
+    ):
+        with self._lock:
+            statement = self.statements.setdefault(
+                nome, {"chamadas": 0, "duracao_s": 0.0, "linhas": 0}
+            )
+            statement["chamadas"] += chamadas
+            statement["duracao_s"] += duracao_s
+            # rowcount é -1 para statements que não afetam linhas
+            if linhas is not None and linhas >= 0:
+                statement["linhas"] += linhas
+
+    def finish(self, sucesso: bool):
+        self.sucesso = sucesso
+        self.duracao_s = (datetime.now(timezone.utc) - self.inicio).total_seconds()
+
+    def report(self) -> dict:
+        etapas = {}
+        for nome, etapa in self.etapas.items():
+            linhas = etapa["linhas_entrada"] or etapa["linhas_saida"] or 0
+            etapas[nome] = {
+                **etapa,
+                "linhas_por_s": (
+                    linhas / etapa["duracao_s"] if etapa["duracao_s"] else 0.0
+                ),
+            }
+
+        return {
+            "pipeline": self.pipeline,
+            "run_id": self.run_id,
+            "inicio": self.inicio.isoformat(),
+            "duracao_s": self.duracao_s,
+            "sucesso": self.sucesso,
+            "etapas": etapas,
+            "statements": self.statements,
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Formata o relatório no formato texto do Prometheus, para ser exposto
+        pelo textfile collector do node_exporter ou enviado a um Pushgateway.
+        """
+        relatorio = self.report()
+        rotulo = f'pipeline="{self.pipeline}"'
+        linhas = []
+
+        # Todas são gauges: cada arquivo descreve apenas a última execução
+        def metrica(nome: str, ajuda: str, valores: list[tuple[str, float]]):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} gauge")
+            for rotulos, valor in valores:
+                linhas.append(f"{nome}{{{rotulos}}} {valor}")
+
+        metrica(
+            "pipeline_run_timestamp_seconds",
+            "Início da última execução.",
+            [(rotulo, self.inicio.timestamp())],
+        )
+        metrica(
+            "pipeline_run_duration_seconds",
+            "Duração da última execução.",
+            [(rotulo, relatorio["duracao_s"] or 0)],
+        )
+        metrica(
+            "pipeline_run_success",
+            "1 se a última execução terminou com sucesso.",
+            [(rotulo, int(bool(relatorio["sucesso"])))],
+        )
+
+        etapas = relatorio["etapas"].items()
+        for nome, chave, ajuda in [
+            ("pipeline_stage_duration_seconds", "duracao_s", "Duração de cada etapa."),
+            ("pipeline_stage_rows_in", "linhas_entrada", "Linhas recebidas por etapa."),
+            ("pipeline_stage_rows_out", "linhas_saida", "Linhas produzidas por etapa."),
+            ("pipeline_stage_rows_per_second", "linhas_por_s", "Vazão de cada etapa."),
+            (
+                "pipeline_stage_peak_rss_bytes",
+                "pico_rss_bytes",
+                "Pico de memória residente.",
+            ),
+        ]:
+            metrica(
+                nome,
+                ajuda,
+                [
+                    (f'{rotulo},stage="{etapa}"', valores[chave])
+                    for etapa, valores in etapas
+                    if valores[chave] is not None
+                ],
+            )
+
+        statements = relatorio["statements"].items()
+        for nome, chave, ajuda in [
+            (
+                "pipeline_db_statement_seconds",
+                "duracao_s",
+                "Tempo no banco por statement.",
+            ),
+            ("pipeline_db_statement_calls", "chamadas", "Execuções de cada statement."),
+            ("pipeline_db_statement_rows", "linhas", "Linhas afetadas por statement."),
+        ]:
+            metrica(
+                nome,
+                ajuda,
+                [
+                    (f'{rotulo},statement="{s}"', valores[chave])
+                    for s, valores in statements
+                ],
+            )
+
+        return "\n".join(linhas) + "\n"
+
+    def write(self, base_dir: str | None = None) -> str:
+        """
+        Grava o relatório JSON da execução e atualiza o arquivo `.prom` do
+        pipeline. O diretório pode ser definido por `base_dir` ou pela variável
+        de ambiente PIPELINE_METRICS_DIR. Retorna o caminho do relatório.
+        """
+        base_dir = base_dir or os.getenv("PIPELINE_METRICS_DIR", DEFAULT_METRICS_DIR)
+        os.makedirs(base_dir, exist_ok=True)
+
+        path = os.path.join(base_dir, f"relatorio_{safe_file_name(self.run_id)}.json")
+        write_json_atomic(path, self.report(), indent=2, ensure_ascii=False)
+
+        path_prom = os.path.join(base_dir, f"{safe_file_name(self.pipeline)}.prom")
+        write_text_atomic(path_prom, self.to_prometheus())
+
+        logger.info(f"Relatório de métricas da execução gravado em: {path}")
+        return path
+
+    def save_partial(self, parte: str, base_dir: str | None = None):
+        """
+        Grava as métricas de uma parte da execução (uma task do Airflow), para
+        serem combinadas por `merge_partials` na última task.
+        """
+        base_dir = base_dir or os.getenv("PIPELINE_METRICS_DIR", DEFAULT_METRICS_DIR)
+        diretorio = os.path.join(base_dir, "parciais", safe_file_name(self.run_id))
+        os.makedirs(diretorio, exist_ok=True)
+        write_json_atomic(
+            os.path.join(diretorio, f"{safe_file_name(parte)}.json"),
+            self.report(),
+            indent=2,
+            ensure_ascii=False,
+        )
+
+
+def merge_partials(
+    pipeline: str, run_id: str, base_dir: str | None = None
+) -> RunMetrics:
+    """
+    Combina as métricas parciais gravadas pelas tasks de uma execução em um
+    único `RunMetrics` e remove os arquivos parciais.
+    """
+    base_dir = base_dir or os.getenv("PIPELINE_METRICS_DIR", DEFAULT_METRICS_DIR)
+    diretorio = os.path.join(base_dir, "parciais", safe_file_name(run_id))
+    metricas = RunMetrics(pipeline, run_id)
+    if not os.path.isdir(diretorio):
+        return metricas
+
+    for nome_arquivo in sorted(os.listdir(diretorio)):
+        with open(os.path.join(diretorio, nome_arquivo)) as f:
+            parcial = json.load(f)
+
+        metricas.inicio = min(
+            metricas.inicio, datetime.fromisoformat(parcial["inicio"])
+        )
+        for nome, etapa in parcial["etapas"].items():
+            metricas._add_stage(nome, etapa)
+        for nome, statement in parcial["statements"].items():
+            metricas.record_statement(
+                nome, statement["duracao_s"], statement["linhas"], statement["chamadas"]
+            )
+
+    shutil.rmtree(diretorio)
+    return metricas
+
+
+def prune_partials(
+    base_dir: str | None = None, idade_maxima_s: float = IDADE_MAXIMA_PARCIAIS_S
+) -> int:
+    """
+    Remove as métricas parciais de execuções antigas que nunca foram combinadas
+    em um relatório. Retorna a quantidade de execuções removidas.
+    """
+    base_dir = base_dir or os.getenv("PIPELINE_METRICS_DIR", DEFAULT_METRICS_DIR)
+    diretorio_parciais = os.path.join(base_dir, "parciais")
+    if not os.path.isdir(diretorio_parciais):
+        return 0
+
+    limite = time.time() - idade_maxima_s
+    removidas = 0
+    for nome in os.listdir(diretorio_parciais):
+        diretorio = os.path.join(diretorio_parciais, nome)
+        if os.path.isdir(diretorio) and os.path.getmtime(diretorio) < limite:
+            shutil.rmtree(diretorio, ignore_errors=True)
+            removidas += 1
+
+    if removidas:
+        logger.info(f"Métricas parciais de {removidas} execuções antigas removidas.")
+    return removidas
+
+
+@contextmanager
+def collecting(metricas: RunMetrics) -> Iterator[RunMetrics]:
+    """
+    Torna `metricas` a execução ativa, para que as etapas internas e os
+    statements da carga sejam registrados nela.
+    """
+    global _ativo
+    anterior, _ativo = _ativo, metricas
+    try:
+        yield metricas
+    finally:
+        _ativo = anterior
+
+
+@contextmanager
+def stage(nome: str, linhas_entrada: int | None = None) -> Iterator[dict]:
+    """
+    Mede uma etapa na execução ativa. Sem execução ativa, não faz nada.
+    """
+    if _ativo is None:
+        yield {"linhas_entrada": linhas_entrada, "linhas_saida": None}
+        return
+    with _ativo.stage(nome, linhas_entrada) as registro:
+        yield registro
+
+
+@contextmanager
+def timed_statement(nome: str, cursor=None) -> Iterator[None]:
+    """
+    Mede o tempo de um statement no banco e, com `cursor`, as linhas afetadas.
+    Sem execução ativa, não faz nada. Statements que falham não são registrados.
+    """
+    ativo = _ativo
+    inicio = time.perf_counter()
+    yield
+    if ativo is not None:
+        linhas = cursor.rowcount if cursor is not None else None
+        ativo.record_statement(nome, time.perf_counter() - inicio, linhas)
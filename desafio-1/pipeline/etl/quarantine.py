@@ -0,0 +1,43 @@
+import logging
+import os
+import pandas as pd
+
+from .files import safe_file_name
+
+logger = logging.getLogger(__name__)
+
+# Diretório padrão dos arquivos de quarentena, relativo ao diretório de execução
+DEFAULT_QUARANTINE_DIR = "quarentena"
+
+
+def quarantine_path_for_run(run_id: str, base_dir: str | None = None) -> str:
+    """
+    Retorna o caminho do arquivo de quarentena de uma execução do pipeline.
+    O diretório pode ser definido por `base_dir` ou pela variável de ambiente
+    PIPELINE_QUARANTINE_DIR. Um arquivo deixado por uma tentativa anterior da
+    mesma execução é descartado, evitando linhas duplicadas em retentativas.
+    """
+    base_dir = base_dir or os.getenv("PIPELINE_QUARANTINE_DIR", DEFAULT_QUARANTINE_DIR)
+    os.makedirs(base_dir, exist_ok=True)
+
+    path = os.path.join(base_dir, f"rejeitados_{safe_file_name(run_id)}.csv")
+
+    if os.path.exists(path):
+        logger.info(f"Descartando arquivo de quarentena de tentativa anterior: {path}")
+        os.remove(path)
+
+    return path
+
+
+def write_rejected_rows(df_rejeitados: pd.DataFrame, path: str):
+    """
+    Grava em lote as linhas rejeitadas no arquivo de quarentena. Chamadas
+    sucessivas na mesma execução (modo streaming) acrescentam ao arquivo.
+    """
+    escrever_cabecalho = not os.path.exists(path)
+    df_rejeitados.to_csv(
+        path, mode="a", header=escrever_cabecalho, index_label="indice"
+    )
+    logger.info(
+        f"{len(df_rejeitados)} linhas rejeitadas gravadas na quarentena: {path}"
+    )
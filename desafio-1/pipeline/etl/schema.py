@@ -0,0 +1,23 @@
+import numpy as np
+
+# Colunas esperadas no CSV de rastreamento, na ordem do arquivo
+COLUNAS = ["id_pacote", "origem", "destino", "status_rastreamento", "data_atualizacao"]
+
+# Colunas de texto com poucos valores distintos, armazenadas como categóricas
+COLUNAS_CATEGORICAS = ["origem", "destino", "status_rastreamento"]
+
+# Formato de "data_atualizacao" enviado pela origem (ISO-8601 em Zulu Time).
+# O "%z" aceita o sufixo "Z" e mantém o pandas no parser ISO rápido
+FORMATO_DATA_ATUALIZACAO = "%Y-%m-%dT%H:%M:%S%z"
+
+# "id_pacote" é INT no banco, então cabe em 32 bits
+TIPO_ID_PACOTE = np.int32
+
+# Tipos usados na leitura do CSV. "id_pacote" fica com a inferência do pandas
+# e "data_atualizacao" é lida como texto, ambos convertidos na limpeza
+CSV_DTYPES = {
+    "origem": "category",
+    "destino": "category",
+    "status_rastreamento": "category",
+    "data_atualizacao": "object",
+}
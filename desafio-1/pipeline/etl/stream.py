@@ -0,0 +1,47 @@
+import logging
+import pandas as pd
+from typing import Iterator, Tuple
+
+from .extract import DEFAULT_CHUNKSIZE, extract_csv_in_chunks
+from .clean_validate import clean_and_validate
+from .transform import transform
+from .metrics import stage
+
+logger = logging.getLogger(__name__)
+
+
+def transform_csv_in_chunks(
+    file_path: str,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    quarantine_path: str | None = None,
+    checkpoint_path: str | None = None,
+    run_id: str | None = None,
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    Encadeia extração, limpeza e transformação lote a lote, gerando tuplas
+    (pacotes, eventos) prontas para o `load_data_in_chunks`. As linhas
+    rejeitadas de todos os lotes vão para o mesmo arquivo de quarentena.
+    Com métricas ativas, o tempo de cada etapa é somado entre os lotes.
+    """
+
+    lotes = extract_csv_in_chunks(file_path, chunksize, checkpoint_path, run_id)
+    while True:
+        with stage("extract") as etapa:
+            df_raw = next(lotes, None)
+            etapa["linhas_saida"] = 0 if df_raw is None else len(df_raw)
+        if df_raw is None:
+            return
+
+        with stage("clean_validate", len(df_raw)) as etapa:
+            df_clean = clean_and_validate(df_raw, quarantine_path=quarantine_path)
+            etapa["linhas_saida"] = len(df_clean)
+
+        if df_clean.empty:
+            logger.info("Lote sem linhas válidas. Ignorando...")
+            continue
+
+        with stage("transform", len(df_clean)) as etapa:
+            df_pacotes, df_eventos = transform(df_clean)
+            etapa["linhas_saida"] = len(df_eventos)
+
+        yield df_pacotes, df_eventos
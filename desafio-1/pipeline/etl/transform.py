@@ -1,6 +1,6 @@
 import logging
 import pandas as pd
-from typing import Tuple
+from typing import List, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -33,3 +33,21 @@ def transform(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
     )
 
     return df_pacotes, df_eventos
+
+
+def merge_transformed(
+    partes: List[Tuple[pd.DataFrame, pd.DataFrame]],
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Combina os resultados de `transform` de partes consecutivas do arquivo,
+    na ordem do arquivo. Mantém apenas o primeiro registro de cada pacote,
+    produzindo o mesmo resultado do processamento serial.
+    """
+    df_pacotes = pd.concat([pacotes for pacotes, _ in partes], ignore_index=True)
+    df_pacotes = df_pacotes.drop_duplicates(subset=["id_pacote"], keep="first")
+    df_eventos = pd.concat([eventos for _, eventos in partes], ignore_index=True)
+
+    logger.info(
+        f"{len(partes)} partes combinadas: {len(df_pacotes)} pacotes únicos e {len(df_eventos)} eventos."
+    )
+    return df_pacotes, df_eventos
@@ -19,4 +19,38 @@ CREATE TABLE eventos_rastreamento (
 );
 
 -- Criar um índice para ganho de desempenho em busca de eventos
-CREATE INDEX idx_eventos_id_pacote ON eventos_rastreamento(id_pacote);
\ No newline at end of file
+CREATE INDEX idx_eventos_id_pacote ON eventos_rastreamento(id_pacote);
+
+-- Projeção com o status mais recente de cada pacote, mantida pelo loader.
+-- Permite contar pacotes por status sem varrer todo o histórico de eventos.
+CREATE TABLE pacote_status_atual (
+    id_pacote INT PRIMARY KEY,
+    status_rastreamento VARCHAR(100) NOT NULL,
+    data_evento TIMESTAMP WITH TIME ZONE NOT NULL,
+
+    CONSTRAINT fk_status_atual_pacotes
+        FOREIGN KEY(id_pacote)
+        REFERENCES pacotes(id_pacote)
+);
+
+CREATE INDEX idx_status_atual_status ON pacote_status_atual(status_rastreamento);
+
+-- Primeiro evento e data de entrega de cada pacote, mantidos pelo loader.
+CREATE TABLE pacote_entrega (
+    id_pacote INT PRIMARY KEY,
+    primeiro_evento TIMESTAMP WITH TIME ZONE NOT NULL,
+    data_entrega TIMESTAMP WITH TIME ZONE,
+
+    CONSTRAINT fk_entrega_pacotes
+        FOREIGN KEY(id_pacote)
+        REFERENCES pacotes(id_pacote)
+);
+
+-- Soma e contagem dos tempos de entrega, para ler o KPI de tempo médio em uma linha.
+CREATE TABLE kpi_tempo_entrega (
+    id SMALLINT PRIMARY KEY CHECK (id = 1),
+    soma_duracao INTERVAL NOT NULL,
+    total_entregas BIGINT NOT NULL
+);
+
+INSERT INTO kpi_tempo_entrega (id, soma_duracao, total_entregas) VALUES (1, INTERVAL '0', 0);
@@ -1,8 +1,14 @@
 import logging
+import os
+from datetime import datetime
 from etl.extract import extract_from_csv
 from etl.clean_validate import clean_and_validate
 from etl.transform import transform
-from etl.load import load_data
+from etl.load import load_data, load_data_in_chunks, load_data_parallel
+from etl.quarantine import quarantine_path_for_run
+from etl.checkpoint import commit_checkpoint
+from etl.stream import transform_csv_in_chunks
+from etl.metrics import RunMetrics, collecting
 
 
 def setup_logging():
@@ -17,22 +23,108 @@ def setup_logging():
     )
 
 
-def run_pipeline():
+def run_pipeline(chunksize: int | None = None, load_connections: int = 1):
+    """
+    Executa o pipeline ETL completo. Se `chunksize` for informado, o CSV é
+    processado em lotes (modo streaming) com memória limitada. Fora do modo
+    streaming, `load_connections` > 1 ativa a carga paralela.
+    Ao final, um relatório com as métricas de cada etapa é gravado em
+    PIPELINE_METRICS_DIR (JSON e formato texto do Prometheus).
+    """
     logging.info("--- Início da Execução do Pipeline ETL ---")
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
 
-    df_raw = extract_from_csv("rastreamento.csv")
+    # Linhas rejeitadas desta execução vão para um arquivo de quarentena próprio
+    quarantine_path = quarantine_path_for_run(run_id)
 
-    if df_raw is not None:
-        df_clean = clean_and_validate(df_raw)
+    # Apenas as linhas adicionadas desde a última carga bem-sucedida são lidas
+    checkpoint_path = os.getenv(
+        "PIPELINE_CHECKPOINT_PATH", "rastreamento.checkpoint.json"
+    )
 
-        if not df_clean.empty:
-            df_pacotes, df_eventos = transform(df_clean)
+    # Aceita CSV, CSV comprimido, Parquet ou Arrow IPC, detectados pela extensão
+    input_path = os.getenv("PIPELINE_INPUT_PATH", "rastreamento.csv")
 
-            load_data(df_pacotes=df_pacotes, df_eventos=df_eventos)
+    metricas = RunMetrics("pipeline_rastreamento", run_id)
+    sucesso = False
+    try:
+        with collecting(metricas):
+            if chunksize:
+                logging.info(f"Modo streaming ativado com lotes de {chunksize} linhas.")
+                # As etapas de cada lote são medidas em `transform_csv_in_chunks`
+                with metricas.stage("streaming"):
+                    load_data_in_chunks(
+                        transform_csv_in_chunks(
+                            input_path,
+                            chunksize,
+                            quarantine_path,
+                            checkpoint_path,
+                            run_id,
+                        )
+                    )
+            else:
+                _run_stages(
+                    input_path,
+                    checkpoint_path,
+                    quarantine_path,
+                    load_connections,
+                    metricas,
+                )
+
+        # Só chega aqui se o carregamento não falhou
+        commit_checkpoint(checkpoint_path, run_id)
+        sucesso = True
+    finally:
+        # Uma falha ao gravar o relatório não deve esconder o erro do pipeline
+        try:
+            metricas.finish(sucesso)
+            metricas.write()
+        except Exception as e:
+            logging.exception(f"Não foi possível gravar o relatório de métricas: {e}")
 
     logging.info("--- Fim da Execução do Pipeline ETL ---")
 
 
+def _run_stages(
+    input_path: str,
+    checkpoint_path: str,
+    quarantine_path: str,
+    load_connections: int,
+    metricas: RunMetrics,
+):
+    """
+    Executa as etapas do pipeline sobre o arquivo inteiro, medindo cada uma.
+    """
+    with metricas.stage("extract") as etapa:
+        df_raw = extract_from_csv(input_path, checkpoint_path, metricas.run_id)
+        etapa["linhas_saida"] = 0 if df_raw is None else len(df_raw)
+    if df_raw is None:
+        return
+
+    with metricas.stage("clean_validate", len(df_raw)) as etapa:
+        df_clean = clean_and_validate(df_raw, quarantine_path=quarantine_path)
+        etapa["linhas_saida"] = len(df_clean)
+    if df_clean.empty:
+        return
+
+    with metricas.stage("transform", len(df_clean)) as etapa:
+        df_pacotes, df_eventos = transform(df_clean)
+        etapa["linhas_saida"] = len(df_eventos)
+
+    with metricas.stage("load", len(df_eventos)):
+        if load_connections > 1:
+            load_data_parallel(df_pacotes, df_eventos, load_connections)
+        else:
+            load_data(df_pacotes=df_pacotes, df_eventos=df_eventos)
+
+
 if __name__ == "__main__":
     setup_logging()
-    run_pipeline()
+    # Define PIPELINE_CHUNKSIZE para ativar o modo streaming
+    chunksize = os.getenv("PIPELINE_CHUNKSIZE")
+    # Define PIPELINE_LOAD_CONNECTIONS > 1 para ativar a carga paralela
+    load_connections = int(os.getenv("PIPELINE_LOAD_CONNECTIONS", "1"))
+    run_pipeline(
+        chunksize=int(chunksize) if chunksize else None,
+        load_connections=load_connections,
+    )
@@ -26,48 +26,25 @@ def buscar_dados_no_banco():
     try:
         engine = create_engine(db_url)
         with engine.connect() as conn:
-            # Query #1: Contagem de pacotes por status atual
+            # Query #1: Contagem de pacotes por status atual, lida da projeção
+            # mantida pelo loader (uma linha por pacote)
             query_status = text(
                 """
-                WITH ultimo_evento AS (
-                    SELECT 
-                        id_pacote, 
-                        status_rastreamento, 
-                        ROW_NUMBER() OVER(PARTITION BY id_pacote ORDER BY data_evento DESC) as rn
-                    FROM eventos_rastreamento             
-                )
                 SELECT
                     status_rastreamento,
-                    COUNT(id_pacote) AS total_pacotes
-                FROM ultimo_evento
-                WHERE rn = 1
+                    COUNT(*) AS total_pacotes
+                FROM pacote_status_atual
                 GROUP BY status_rastreamento;
             """
             )
             df_status = pd.read_sql(query_status, conn)
 
-            # Query #2: Tempo médio de entrega
+            # Query #2: Tempo médio de entrega, lido do agregado mantido pelo loader
             query_tempo_entrega = text(
                 """
-                WITH entregas_finalizadas AS (
-                    SELECT
-                        id_pacote,
-                        MIN(data_evento) AS data_inicio,
-                        MAX(CASE 
-                                WHEN status_rastreamento = 'ENTREGUE' THEN data_evento 
-                                ELSE NULL 
-                            END) AS data_entrega
-                    FROM
-                        eventos_rastreamento
-                    GROUP BY id_pacote                
-                )
-                                   
-                SELECT
-                    AVG(data_entrega - data_inicio) AS tempo_medio_entrega
-                FROM
-                    entregas_finalizadas
-                WHERE
-                    data_entrega IS NOT NULL;
+                SELECT soma_duracao / NULLIF(total_entregas, 0) AS tempo_medio_entrega
+                FROM kpi_tempo_entrega
+                WHERE id = 1;
             """
             )
 
@@ -0,0 +1,87 @@
+"""
+Compara a vazão de decodificação das mensagens do tópico em JSON e no formato
+binário compacto, isolada e somada à validação feita pelo consumer.
+
+Uso (a partir de desafio-2/dashboard-realtime):
+    python -m benchmarks.bench_codec --mensagens 200000
+"""
+
+import argparse
+import json
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from etl.clean_validate import clean_validate_single_record
+from etl.codec import STATUS_POR_CODIGO, decode_event, encode_binary
+
+CIDADES = ["São Paulo", "Rio de Janeiro", "Natal", "Recife", "Curitiba", "Manaus"]
+
+
+def gerar_eventos(quantidade: int, seed: int = 42) -> list[dict]:
+    """
+    Gera eventos sintéticos no formato enviado pela API.
+    """
+    rng = random.Random(seed)
+    inicio = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    status = list(STATUS_POR_CODIGO.values())
+    return [
+        {
+            "id_pacote": rng.randint(1, 1_000_000),
+            "origem": rng.choice(CIDADES),
+            "destino": rng.choice(CIDADES),
+            "status_rastreamento": rng.choice(status),
+            "data_atualizacao": (inicio + timedelta(seconds=rng.randint(0, 10**7)))
+            .isoformat()
+            .replace("+00:00", "Z"),
+        }
+        for _ in range(quantidade)
+    ]
+
+
+def medir(mensagens: list[bytes], funcao, repeticoes: int) -> float:
+    """
+    Retorna o melhor tempo de aplicar `funcao` a todas as mensagens.
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for valor in mensagens:
+            funcao(valor)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mensagens", type=int, default=200_000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    eventos = gerar_eventos(args.mensagens)
+    formatos = {
+        "json": [json.dumps(e).encode("utf-8") for e in eventos],
+        "binario": [encode_binary(e) for e in eventos],
+    }
+
+    print(f"{args.mensagens} mensagens")
+    for nome, mensagens in formatos.items():
+        tamanho_medio = sum(len(m) for m in mensagens) / len(mensagens)
+        decodificacao = medir(mensagens, decode_event, args.repeticoes)
+        com_validacao = medir(
+            mensagens,
+            lambda v: clean_validate_single_record(decode_event(v)),
+            args.repeticoes,
+        )
+        print(
+            f"{nome:<8} tamanho médio={tamanho_medio:5.1f} B  "
+            f"decodificação={args.mensagens / decodificacao:10,.0f} msg/s  "
+            f"decodificação+validação={args.mensagens / com_validacao:10,.0f} msg/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+Mede a vazão sustentada (eventos/s) e a latência ponta a ponta do caminho em
+tempo real: da data do evento (`data_atualizacao`, carimbada no instante de
+envio) até o commit no banco, passando por decodificação, limpeza/validação,
+transformação e carga, nos três modos do consumer.
+
+As mensagens vêm de uma fonte plugável:
+- "fake": um substituto em memória do KafkaConsumer (poll, commit e seek), que
+  libera as mensagens no ritmo de `--taxa`, isolando o custo do consumer;
+- "kafka": o broker local do docker-compose, alimentado por um producer em
+  paralelo, com um grupo de consumo novo a cada execução.
+
+A carga é feita no TimescaleDB de `TIMESCALE_DATABASE_URL`; use um banco de
+teste, pois os eventos sintéticos são gravados nele.
+
+Uso (a partir de desafio-2/dashboard-realtime):
+    python -m benchmarks.bench_e2e --modo lote --eventos 200000 --taxa 5000
+    python -m benchmarks.bench_e2e --modo pipeline --fonte kafka --taxa 0
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, NamedTuple
+
+from kafka import TopicPartition
+
+from benchmarks.bench_codec import CIDADES
+from consumer import (
+    BATCH_LINGER_MS,
+    BATCH_SIZE,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_WORKERS,
+    TOPIC_NAME,
+    consume_batches,
+    consume_messages,
+    consume_pipeline,
+    create_kafka_consumer,
+)
+from etl.cache import CACHE_MEMORY_MB, HotKeyCache
+from etl.codec import FORMATO_BINARIO, FORMATO_JSON, STATUS_POR_CODIGO, encode_binary
+from etl.load import close_pool, init_pool
+from producer import enviar_eventos, inicializar_producer
+
+MODOS = ["mensagem", "lote", "pipeline"]
+
+# Intervalo entre as mensagens de progresso durante a execução
+INTERVALO_PROGRESSO_S = 5
+
+
+def gerar_eventos(
+    quantidade: int, taxa: float, pacotes: int, seed: int = 42
+) -> Iterator[dict]:
+    """
+    Gera eventos sintéticos sob demanda. Com `taxa`, a data de cada evento é o
+    instante programado para o seu envio; sem ela, o instante em que é gerado.
+    """
+    rng = random.Random(seed)
+    status = list(STATUS_POR_CODIGO.values())
+    inicio = datetime.now(timezone.utc)
+
+    for i in range(quantidade):
+        if taxa:
+            data = inicio + timedelta(seconds=i / taxa)
+        else:
+            data = datetime.now(timezone.utc)
+        yield {
+            "id_pacote": rng.randint(1, pacotes),
+            "origem": rng.choice(CIDADES),
+            "destino": rng.choice(CIDADES),
+            "status_rastreamento": rng.choice(status),
+            "data_atualizacao": data.isoformat().replace("+00:00", "Z"),
+        }
+
+
+class Mensagem(NamedTuple):
+    topic: str
+    partition: int
+    offset: int
+    key: bytes
+    value: bytes
+
+
+class FakeKafkaConsumer:
+    """
+    Substituto em memória do KafkaConsumer, com a parte da interface usada pelo
+    consumer. As mensagens ficam disponíveis no ritmo dos eventos gerados e são
+    distribuídas entre partições pela chave, como no producer. Mensagens abaixo
+    do offset confirmado são descartadas.
+    """
+
+    def __init__(
+        self,
+        eventos: Iterator[dict],
+        taxa: float,
+        particoes: int = 3,
+        formato: str = FORMATO_JSON,
+        enable_auto_commit: bool = True,
+    ):
+        self._eventos = eventos
+        self._taxa = taxa
+        self._particoes = [TopicPartition(TOPIC_NAME, p) for p in range(particoes)]
+        self._formato = formato
+        self._auto_commit = enable_auto_commit
+        self._log = {tp: {} for tp in self._particoes}
+        self._fim_log = {tp: 0 for tp in self._particoes}
+        self._posicao = {tp: 0 for tp in self._particoes}
+        self._gerados = 0
+        self._esgotado = False
+        # O relógio começa no primeiro poll, junto com a geração dos eventos
+        self._inicio = None
+
+    def _produzir(self, max_records: int | None):
+        """
+        Gera as mensagens cujo instante de envio já chegou.
+        """
+        if self._inicio is None:
+            self._inicio = time.monotonic()
+
+        if self._taxa:
+            disponiveis = int((time.monotonic() - self._inicio) * self._taxa) + 1
+        else:
+            # Sem taxa, gera apenas o que o poll pode entregar, para que o tempo
+            # de espera na fonte não entre na latência
+            pendentes = sum(
+                self._fim_log[tp] - self._posicao[tp] for tp in self._particoes
+            )
+            disponiveis = self._gerados + max(0, (max_records or 500) - pendentes)
+
+        while not self._esgotado and self._gerados < disponiveis:
+            evento = next(self._eventos, None)
+            if evento is None:
+                self._esgotado = True
+                break
+
+            chave = str(evento["id_pacote"]).encode("utf-8")
+            if self._formato == FORMATO_BINARIO:
+                valor = encode_binary(evento)
+            else:
+                valor = json.dumps(evento).encode("utf-8")
+
+            tp = self._particoes[zlib.crc32(chave) % len(self._particoes)]
+            offset = self._fim_log[tp]
+            self._log[tp][offset] = Mensagem(
+                tp.topic, tp.partition, offset, chave, valor
+            )
+            self._fim_log[tp] = offset + 1
+            self._gerados += 1
+
+    def poll(self, timeout_ms: int = 0, max_records: int | None = None) -> dict:
+        prazo = time.monotonic() + timeout_ms / 1000
+        while True:
+            self._produzir(max_records)
+            registros = {}
+            restante = max_records or float("inf")
+            for tp in self._particoes:
+                fim = min(self._fim_log[tp], self._posicao[tp] + restante)
+                if fim > self._posicao[tp]:
+                    registros[tp] = [
+                        self._log[tp][offset]
+                        for offset in range(self._posicao[tp], fim)
+                    ]
+                    restante -= fim - self._posicao[tp]
+                    self._posicao[tp] = fim
+            if self._auto_commit:
+                self.commit()
+
+            espera = prazo - time.monotonic()
+            if registros or espera <= 0:
+                return registros
+            time.sleep(min(espera, 1 / self._taxa if self._taxa else 0.001))
+
+    def commit(self, offsets: dict | None = None):
+        if offsets is None:
+            offsets = {tp: posicao for tp, posicao in self._posicao.items()}
+        else:
+            offsets = {tp: oam.offset for tp, oam in offsets.items()}
+
+        for tp, confirmado in offsets.items():
+            log = self._log[tp]
+            for offset in [o for o in log if o < confirmado]:
+                del log[offset]
+
+    def seek(self, tp: TopicPartition, offset: int):
+        self._posicao[tp] = offset
+
+    def highwater(self, tp: TopicPartition) -> int | None:
+        return self._fim_log.get(tp)
+
+    def assignment(self) -> set[TopicPartition]:
+        return set(self._particoes)
+
+    def position(self, tp: TopicPartition) -> int:
+        return self._posicao[tp]
+
+    def close(self):
+        pass
+
+
+class MedidorLatencia:
+    """
+    Registra a latência de cada evento no momento em que o consumer informa que
+    ele foi persistido. Tem a interface de `on_persisted`/`tick` do publicador
+    de snapshots, aceita por todos os modos do consumer.
+    """
+
+    def __init__(self):
+        self.latencias: list[float] = []
+        self.ultimo_commit = None
+
+    @property
+    def total(self) -> int:
+        return len(self.latencias)
+
+    def on_persisted(self, eventos: list[dict]):
+        agora = datetime.now(timezone.utc)
+        self.latencias.extend(
+            (agora - evento["data_evento"]).total_seconds() for evento in eventos
+        )
+        self.ultimo_commit = time.monotonic()
+
+    def tick(self):
+        pass
+
+    def publish(self):
+        pass
+
+
+def _criar_fonte(args, eventos: Iterator[dict]):
+    """
+    Cria o consumer da fonte escolhida. Na fonte "kafka", inicia também o
+    producer, depois que o grupo novo recebeu suas partições.
+    """
+    auto_commit = args.modo == "mensagem"
+    if args.fonte == "fake":
+        return (
+            FakeKafkaConsumer(
+                eventos, args.taxa, args.particoes, args.formato, auto_commit
+            ),
+            None,
+        )
+
+    consumer = create_kafka_consumer(
+        group_id=f"benchmark-{uuid.uuid4().hex[:8]}",
+        auto_offset_reset="latest",
+        enable_auto_commit=auto_commit,
+    )
+    while not consumer.assignment():
+        consumer.poll(timeout_ms=100)
+
+    producer = inicializar_producer(formato=args.formato)
+    if producer is None:
+        raise RuntimeError("Não foi possível conectar o producer ao Kafka.")
+    envio = threading.Thread(
+        target=enviar_eventos, args=(producer, eventos, args.taxa or None), daemon=True
+    )
+    envio.start()
+    return consumer, producer
+
+
+def _consumir(args, consumer, cache, medidor, parar):
+    if args.modo == "mensagem":
+        consume_messages(consumer, cache, medidor, parar)
+    elif args.modo == "lote":
+        consume_batches(
+            consumer, args.batch_size, args.linger_ms, cache, medidor, parar
+        )
+    else:
+        consume_pipeline(
+            consumer,
+            args.workers,
+            args.queue_size,
+            args.batch_size,
+            args.linger_ms,
+            cache,
+            medidor,
+            parar,
+        )
+
+
+def _percentil(ordenadas: list[float], p: float) -> float:
+    return ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--modo", choices=MODOS, default="lote")
+    parser.add_argument("--fonte", choices=["fake", "kafka"], default="fake")
+    parser.add_argument("--eventos", type=int, default=100_000)
+    parser.add_argument(
+        "--taxa",
+        type=float,
+        default=2000,
+        help="Eventos por segundo oferecidos ao consumer (0 = o mais rápido possível).",
+    )
+    parser.add_argument("--pacotes", type=int, default=50_000)
+    parser.add_argument("--particoes", type=int, default=3)
+    parser.add_argument(
+        "--formato", choices=[FORMATO_JSON, FORMATO_BINARIO], default=FORMATO_JSON
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--linger-ms", type=int, default=BATCH_LINGER_MS)
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE)
+    parser.add_argument("--cache-mb", type=float, default=CACHE_MEMORY_MB)
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=600,
+        help="Tempo máximo de execução, em segundos.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    init_pool()
+    cache = HotKeyCache(args.cache_mb) if args.cache_mb > 0 else None
+    medidor = MedidorLatencia()
+    parar = threading.Event()
+    consumer, producer = None, None
+
+    try:
+        eventos = gerar_eventos(args.eventos, args.taxa, args.pacotes)
+        consumer, producer = _criar_fonte(args, eventos)
+
+        inicio = time.monotonic()
+        consumo = threading.Thread(
+            target=_consumir, args=(args, consumer, cache, medidor, parar), daemon=True
+        )
+        consumo.start()
+
+        proximo_progresso = inicio + INTERVALO_PROGRESSO_S
+        while medidor.total < args.eventos and consumo.is_alive():
+            if time.monotonic() - inicio > args.timeout:
+                print(f"Tempo máximo atingido com {medidor.total} eventos persistidos.")
+                break
+            if time.monotonic() >= proximo_progresso:
+                print(f"{medidor.total}/{args.eventos} eventos persistidos...")
+                proximo_progresso += INTERVALO_PROGRESSO_S
+            time.sleep(0.1)
+
+        parar.set()
+        consumo.join()
+
+    finally:
+        if consumer is not None:
+            consumer.close()
+        if producer is not None:
+            producer.close()
+        close_pool()
+
+    if not medidor.latencias:
+        print("Nenhum evento foi persistido.")
+        return
+
+    duracao = medidor.ultimo_commit - inicio
+    latencias = sorted(medidor.latencias)
+    print(
+        f"modo={args.modo} fonte={args.fonte} formato={args.formato} "
+        f"taxa oferecida={args.taxa or 'máxima'}"
+    )
+    print(
+        f"{medidor.total} eventos em {duracao:.2f}s: "
+        f"{medidor.total / duracao:,.0f} eventos/s sustentados"
+    )
+    print(
+        "latência ponta a ponta: "
+        f"p50={_percentil(latencias, 0.50) * 1000:.1f} ms  "
+        f"p95={_percentil(latencias, 0.95) * 1000:.1f} ms  "
+        f"p99={_percentil(latencias, 0.99) * 1000:.1f} ms  "
+        f"máx={latencias[-1] * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,38 @@
-import json
+import argparse
 import logging
-from kafka import KafkaConsumer
+import os
+import threading
+import time
+from kafka import KafkaConsumer, TopicPartition
 
+from etl.codec import FormatoInvalidoError, decode_event
 from etl.clean_validate import clean_validate_single_record
 from etl.transform import transform_single_record
-from etl.load import load_single_record
+from etl.cache import CACHE_MEMORY_MB, HotKeyCache
+from etl.load import (
+    ERROS_CONEXAO,
+    close_pool,
+    init_pool,
+    load_batch_isolating_errors,
+    load_single_record,
+)
+from consumer_metrics import (
+    METRICAS,
+    METRICS_PORT,
+    MOTIVO_CARGA,
+    MOTIVO_DECODE,
+    MOTIVO_ERRO,
+    MOTIVO_VALIDACAO,
+    start_metrics_server,
+    stop_metrics_server,
+)
+from consumer_pipeline import run_pipeline
+from kpi_aggregator import (
+    DESTINO_ARQUIVO,
+    DESTINO_TABELA,
+    SNAPSHOT_PATH,
+    SnapshotPublisher,
+)
 
 
 def setup_logging():
@@ -25,43 +53,394 @@ KAFKA_BROKER_URL = "localhost:9094"
 TOPIC_NAME = "eventos_rastreamento"
 CONSUMER_GROUP_ID = "rastreamento_consumer_group"
 
+# Modo em lote: máximo de mensagens por lote e tempo máximo de espera para completá-lo
+BATCH_SIZE = int(os.getenv("CONSUMER_BATCH_SIZE", "500"))
+BATCH_LINGER_MS = int(os.getenv("CONSUMER_BATCH_LINGER_MS", "200"))
 
-def run_consumer():
+# Modo pipeline: threads de validação/transformação e tamanho das filas entre estágios
+PIPELINE_WORKERS = int(os.getenv("CONSUMER_PIPELINE_WORKERS", "4"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("CONSUMER_PIPELINE_QUEUE_SIZE", "1000"))
+
+# Espera antes de reprocessar um lote cuja carga no banco falhou
+RETRY_BACKOFF_S = 1.0
+
+# Modo por mensagem: espera máxima de cada poll, para publicar o snapshot de KPIs
+# mesmo quando não chegam mensagens
+POLL_TIMEOUT_MS = 1000
+
+# Modo por mensagem: uma a cada LOG_SAMPLE mensagens recebidas é registrada em
+# DEBUG. Valores menores que 1 registram todas
+LOG_SAMPLE = max(1, int(os.getenv("CONSUMER_LOG_SAMPLE", "1000")))
+
+
+def _create_cache(memoria_mb: float) -> HotKeyCache | None:
+    """
+    Cria os caches de pacotes e eventos. Um orçamento de 0 MiB os desativa.
+    """
+    if memoria_mb <= 0:
+        logger.info("Caches do consumer desativados.")
+        return None
+    return HotKeyCache(memoria_mb)
+
+
+def _create_publisher(destino: str | None, path: str) -> SnapshotPublisher | None:
+    """
+    Cria o publicador do snapshot de KPIs. Sem destino, o consumer apenas grava
+    os eventos e a dashboard calcula os KPIs no banco.
+    """
+    if destino is None:
+        return None
+    logger.info(f"Publicando snapshot de KPIs no destino '{destino}'.")
+    return SnapshotPublisher(destino, path)
+
+
+def _close_publisher(publicador: SnapshotPublisher | None):
+    if publicador is not None:
+        publicador.publish()
+
+
+def create_kafka_consumer(
+    group_id: str = CONSUMER_GROUP_ID,
+    auto_offset_reset: str = "earliest",
+    enable_auto_commit: bool = True,
+) -> KafkaConsumer:
+    consumer = KafkaConsumer(
+        TOPIC_NAME,
+        bootstrap_servers=KAFKA_BROKER_URL,
+        group_id=group_id,
+        auto_offset_reset=auto_offset_reset,
+        enable_auto_commit=enable_auto_commit,
+    )
+    logger.info(f"Consumidor conectado e escutando o tópico '{TOPIC_NAME}'...")
+    return consumer
+
+
+def _ativo(parar: threading.Event | None) -> bool:
+    return parar is None or not parar.is_set()
+
+
+def consume_messages(
+    consumer: KafkaConsumer,
+    cache: HotKeyCache | None = None,
+    publicador: SnapshotPublisher | None = None,
+    parar: threading.Event | None = None,
+):
+    """
+    Laço do modo por mensagem: realiza o ETL de cada mensagem em sua própria
+    transação até `parar` ser sinalizado. O `consumer` pode ser qualquer objeto
+    com a interface de poll do KafkaConsumer, e o `publicador` qualquer objeto
+    com `on_persisted` e `tick` (como nos benchmarks).
+    """
+    while _ativo(parar):
+        registros = consumer.poll(timeout_ms=POLL_TIMEOUT_MS)
+        METRICAS.update_lag(consumer)
+        for mensagens_particao in registros.values():
+            for message in mensagens_particao:
+                _consume_single_message(message, cache, publicador)
+
+        if publicador is not None:
+            publicador.tick()
+
+
+def run_consumer(
+    cache_mb: float = CACHE_MEMORY_MB,
+    snapshot: str | None = None,
+    snapshot_path: str = SNAPSHOT_PATH,
+):
     """
     Inicia o consumidor Kafka e orquestra o pipeline ETL para cada mensagem.
     """
     consumer = None
+    publicador = None
+    cache = _create_cache(cache_mb)
     logger.info("Iniciando o Kafka Consumer...")
     try:
-        consumer = KafkaConsumer(
-            TOPIC_NAME,
-            bootstrap_servers=KAFKA_BROKER_URL,
-            group_id=CONSUMER_GROUP_ID,
-            auto_offset_reset="earliest",
-            value_deserializer=lambda v: json.loads(v.decode("utf-8")),
-        )
-        logger.info(f"Consumidor conectado e escutando o tópico '{TOPIC_NAME}'...")
+        init_pool()
+        publicador = _create_publisher(snapshot, snapshot_path)
+        consumer = create_kafka_consumer()
 
         # Para cada mensagem realiza um processo de ETL de registro único
-        for message in consumer:
-            try:
-                evento_bruto = message.value
-                logger.info(f"Mensagem recebida: {evento_bruto}")
+        consume_messages(consumer, cache, publicador)
 
-                evento_limpo = clean_validate_single_record(evento_bruto)
-                if evento_limpo is None:
-                    continue
+    except KeyboardInterrupt:
+        logger.warning("Processo de encerramento iniciado pelo usuário (Ctrl+C).")
 
-                pacote_db, evento_db = transform_single_record(evento_limpo)
+    except Exception as e:
+        logger.exception(f"Falha crítica no consumidor: {e}")
 
-                load_single_record(pacote_db, evento_db)
+    finally:
+        if consumer:
+            logger.info("Fechando conexão do Kafka Consumer...")
+            consumer.close()
+            logger.info("Consumer encerrado com sucesso.")
+        if cache is not None:
+            cache.log_stats()
+        _close_publisher(publicador)
+        close_pool()
+
+
+def _consume_single_message(
+    message, cache: HotKeyCache | None, publicador: SnapshotPublisher | None
+):
+    """
+    Realiza o ETL de uma única mensagem, gravando-a em sua própria transação.
+    """
+    try:
+        total = METRICAS.message_received()
+        if total % LOG_SAMPLE == 0:
+            logger.debug("Mensagem recebida (#%s): %s", total, message.value)
+
+        registro = _process_message(message.value)
+        if registro is None:
+            return
+
+        pacote_db, evento_db = registro
+
+        try:
+            with METRICAS.timed("load"):
+                load_single_record(pacote_db, evento_db, cache)
+        except Exception:
+            METRICAS.load_failed()
+            raise
+        METRICAS.persisted(1)
+
+        if publicador is not None:
+            publicador.on_persisted([evento_db])
+
+    except Exception as e:
+        METRICAS.rejected(MOTIVO_ERRO)
+        logger.exception(f"Erro inesperado ao processar a mensagem: {e}")
 
-            except json.JSONDecodeError:
-                logger.error(
-                    f"Não foi possível decodificar a mensagem JSON: {message.value}"
-                )
-            except Exception as e:
-                logger.exception(f"Erro inesperado ao processar a mensagem: {e}")
+
+def _poll_batch(consumer: KafkaConsumer, batch_size: int, linger_ms: int) -> list:
+    """
+    Busca mensagens até completar `batch_size` ou até passarem `linger_ms`
+    milissegundos, o que ocorrer primeiro.
+    """
+    mensagens = []
+    prazo = time.monotonic() + linger_ms / 1000
+
+    while len(mensagens) < batch_size:
+        restante_ms = int((prazo - time.monotonic()) * 1000)
+        if restante_ms <= 0:
+            break
+        registros = consumer.poll(
+            timeout_ms=restante_ms, max_records=batch_size - len(mensagens)
+        )
+        METRICAS.update_lag(consumer)
+        for mensagens_particao in registros.values():
+            mensagens.extend(mensagens_particao)
+
+    return mensagens
+
+
+def _process_message(valor: bytes) -> tuple[dict, dict] | None:
+    """
+    Decodifica (JSON ou binário), limpa, valida e transforma o conteúdo de uma
+    mensagem. Retorna os dicionários de pacote e evento, ou None se ela for inválida.
+    """
+    try:
+        with METRICAS.timed("decode"):
+            evento_bruto = decode_event(valor)
+    except FormatoInvalidoError as e:
+        METRICAS.rejected(MOTIVO_DECODE)
+        logger.error(f"Não foi possível decodificar a mensagem: {valor}. Erro: {e}")
+        return None
+
+    with METRICAS.timed("validate"):
+        evento_limpo = clean_validate_single_record(evento_bruto)
+    if evento_limpo is None:
+        METRICAS.rejected(MOTIVO_VALIDACAO)
+        return None
+
+    with METRICAS.timed("transform"):
+        return transform_single_record(evento_limpo)
+
+
+def _process_batch(mensagens: list) -> tuple[list, list]:
+    """
+    Processa as mensagens de um lote, descartando as inválidas e as que
+    provocarem um erro inesperado. Retorna as listas de pacotes e eventos.
+    """
+    pacotes, eventos = [], []
+    for message in mensagens:
+        try:
+            registro = _process_message(message.value)
+        except Exception as e:
+            METRICAS.rejected(MOTIVO_ERRO)
+            logger.exception(f"Erro inesperado ao processar a mensagem: {e}")
+            continue
+        if registro is None:
+            continue
+
+        pacote_db, evento_db = registro
+        pacotes.append(pacote_db)
+        eventos.append(evento_db)
+
+    return pacotes, eventos
+
+
+def _rewind(consumer: KafkaConsumer, mensagens: list):
+    """
+    Volta cada partição para a primeira mensagem do lote, para que ele seja
+    consumido de novo após uma falha na carga.
+    """
+    primeiros_offsets = {}
+    for message in mensagens:
+        tp = (message.topic, message.partition)
+        primeiros_offsets.setdefault(tp, message.offset)
+
+    for (topic, partition), offset in primeiros_offsets.items():
+        consumer.seek(TopicPartition(topic, partition), offset)
+
+
+def consume_batches(
+    consumer: KafkaConsumer,
+    batch_size: int = BATCH_SIZE,
+    linger_ms: int = BATCH_LINGER_MS,
+    cache: HotKeyCache | None = None,
+    publicador: SnapshotPublisher | None = None,
+    parar: threading.Event | None = None,
+):
+    """
+    Laço do modo em micro-lotes, executado até `parar` ser sinalizado. O
+    `consumer` deve ter o auto-commit desativado.
+    """
+    while _ativo(parar):
+        mensagens = _poll_batch(consumer, batch_size, linger_ms)
+        if not mensagens:
+            if publicador is not None:
+                publicador.tick()
+            continue
+
+        METRICAS.message_received(len(mensagens))
+        pacotes, eventos = _process_batch(mensagens)
+
+        rejeitados = []
+        try:
+            if eventos:
+                with METRICAS.timed("load"):
+                    rejeitados = load_batch_isolating_errors(pacotes, eventos, cache)
+        except ERROS_CONEXAO as e:
+            # Só falhas de conexão são repetidas; um erro nos dados se repetiria
+            # a cada tentativa, então esses registros são descartados na carga
+            METRICAS.load_failed()
+            logger.exception(f"Falha ao gravar o lote, ele será reprocessado: {e}")
+            _rewind(consumer, mensagens)
+            time.sleep(RETRY_BACKOFF_S)
+            continue
+
+        if rejeitados:
+            for _ in rejeitados:
+                METRICAS.rejected(MOTIVO_CARGA)
+            descartados = set(rejeitados)
+            eventos = [e for i, e in enumerate(eventos) if i not in descartados]
+
+        METRICAS.persisted(len(eventos))
+        if publicador is not None:
+            publicador.on_persisted(eventos)
+
+        # Só confirma os offsets depois que o lote está persistido no banco
+        consumer.commit()
+        logger.info(
+            f"Lote de {len(mensagens)} mensagens confirmado ({len(eventos)} eventos válidos)."
+        )
+
+
+def run_consumer_batch(
+    batch_size: int = BATCH_SIZE,
+    linger_ms: int = BATCH_LINGER_MS,
+    cache_mb: float = CACHE_MEMORY_MB,
+    snapshot: str | None = None,
+    snapshot_path: str = SNAPSHOT_PATH,
+):
+    """
+    Inicia o consumidor Kafka em modo de micro-lotes: cada lote de até `batch_size`
+    mensagens (ou o que chegar em `linger_ms`) é gravado no banco em uma única
+    transação. Os offsets só são confirmados no Kafka após o commit no banco.
+    """
+    consumer = None
+    publicador = None
+    cache = _create_cache(cache_mb)
+    logger.info(
+        f"Iniciando o Kafka Consumer em lotes (até {batch_size} mensagens ou {linger_ms} ms)..."
+    )
+    try:
+        init_pool()
+        publicador = _create_publisher(snapshot, snapshot_path)
+        consumer = create_kafka_consumer(enable_auto_commit=False)
+
+        consume_batches(consumer, batch_size, linger_ms, cache, publicador)
+
+    except KeyboardInterrupt:
+        logger.warning("Processo de encerramento iniciado pelo usuário (Ctrl+C).")
+
+    except Exception as e:
+        logger.exception(f"Falha crítica no consumidor: {e}")
+
+    finally:
+        if consumer:
+            logger.info("Fechando conexão do Kafka Consumer...")
+            consumer.close()
+            logger.info("Consumer encerrado com sucesso.")
+        if cache is not None:
+            cache.log_stats()
+        _close_publisher(publicador)
+        close_pool()
+
+
+def consume_pipeline(
+    consumer: KafkaConsumer,
+    num_workers: int = PIPELINE_WORKERS,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    batch_size: int = BATCH_SIZE,
+    linger_ms: int = BATCH_LINGER_MS,
+    cache: HotKeyCache | None = None,
+    publicador: SnapshotPublisher | None = None,
+    parar: threading.Event | None = None,
+):
+    """
+    Executa o modo pipeline com o ETL do consumer até `parar` ser sinalizado.
+    O `consumer` deve ter o auto-commit desativado.
+    """
+    run_pipeline(
+        consumer,
+        _process_message,
+        num_workers,
+        queue_size,
+        batch_size,
+        linger_ms,
+        cache,
+        publicador,
+        parar,
+    )
+
+
+def run_consumer_pipeline(
+    num_workers: int = PIPELINE_WORKERS,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    batch_size: int = BATCH_SIZE,
+    linger_ms: int = BATCH_LINGER_MS,
+    cache_mb: float = CACHE_MEMORY_MB,
+    snapshot: str | None = None,
+    snapshot_path: str = SNAPSHOT_PATH,
+):
+    """
+    Inicia o consumidor Kafka em modo pipeline: busca, validação/transformação
+    e escrita no banco rodam em estágios paralelos ligados por filas limitadas.
+    """
+    consumer = None
+    publicador = None
+    cache = _create_cache(cache_mb)
+    logger.info("Iniciando o Kafka Consumer em modo pipeline...")
+    try:
+        init_pool()
+        publicador = _create_publisher(snapshot, snapshot_path)
+        consumer = create_kafka_consumer(enable_auto_commit=False)
+
+        consume_pipeline(
+            consumer, num_workers, queue_size, batch_size, linger_ms, cache, publicador
+        )
 
     except KeyboardInterrupt:
         logger.warning("Processo de encerramento iniciado pelo usuário (Ctrl+C).")
@@ -74,8 +453,76 @@ def run_consumer():
             logger.info("Fechando conexão do Kafka Consumer...")
             consumer.close()
             logger.info("Consumer encerrado com sucesso.")
+        if cache is not None:
+            cache.log_stats()
+        _close_publisher(publicador)
+        close_pool()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Consumidor Kafka do rastreamento.")
+    parser.add_argument(
+        "--modo",
+        choices=["mensagem", "lote", "pipeline"],
+        default="mensagem",
+        help=(
+            "'mensagem' grava cada evento em sua própria transação; 'lote' usa micro-lotes; "
+            "'pipeline' separa busca, transformação e escrita em threads."
+        ),
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--linger-ms", type=int, default=BATCH_LINGER_MS)
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE)
+    parser.add_argument(
+        "--cache-mb",
+        type=float,
+        default=CACHE_MEMORY_MB,
+        help="Memória dos caches de pacotes e eventos já gravados (0 desativa).",
+    )
+    parser.add_argument(
+        "--snapshot",
+        choices=[DESTINO_ARQUIVO, DESTINO_TABELA],
+        default=None,
+        help=(
+            "Mantém os KPIs em memória e publica um snapshot em um arquivo JSON ou na "
+            "tabela kpi_snapshot, para a dashboard ler sem consultar o histórico."
+        ),
+    )
+    parser.add_argument("--snapshot-path", default=SNAPSHOT_PATH)
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=METRICS_PORT,
+        help="Porta do endpoint HTTP /metrics no formato do Prometheus (0 desativa).",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
     setup_logging()
-    run_consumer()
+    args = parse_args()
+    servidor_metricas = start_metrics_server(args.metrics_port)
+    try:
+        if args.modo == "lote":
+            run_consumer_batch(
+                args.batch_size,
+                args.linger_ms,
+                args.cache_mb,
+                args.snapshot,
+                args.snapshot_path,
+            )
+        elif args.modo == "pipeline":
+            run_consumer_pipeline(
+                args.workers,
+                args.queue_size,
+                args.batch_size,
+                args.linger_ms,
+                args.cache_mb,
+                args.snapshot,
+                args.snapshot_path,
+            )
+        else:
+            run_consumer(args.cache_mb, args.snapshot, args.snapshot_path)
+    finally:
+        stop_metrics_server(servidor_metricas)
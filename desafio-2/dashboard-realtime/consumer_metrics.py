@@ -0,0 +1,266 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+# Porta do endpoint /metrics (0 desativa) e endereço em que ele escuta
+METRICS_PORT = int(os.getenv("CONSUMER_METRICS_PORT", "9108"))
+METRICS_HOST = os.getenv("CONSUMER_METRICS_HOST", "0.0.0.0")
+
+ETAPAS = ("decode", "validate", "transform", "load")
+
+# Limites superiores (em segundos) dos buckets dos histogramas de latência. A
+# decodificação leva microssegundos e uma carga em lote, centenas de milissegundos
+BUCKETS_S = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+MOTIVO_DECODE = "decode"
+MOTIVO_VALIDACAO = "validacao"
+MOTIVO_ERRO = "erro"
+# Registro aceito pela validação, mas rejeitado pelo banco na carga
+MOTIVO_CARGA = "carga"
+
+
+class Histograma:
+    """
+    Histograma cumulativo no formato do Prometheus, com buckets fixos.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS_S):
+        self.buckets = buckets
+        # Uma posição a mais para as observações acima do último bucket (+Inf)
+        self._contagens = [0] * (len(buckets) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observe(self, valor: float):
+        self._contagens[bisect.bisect_left(self.buckets, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def cumulativo(self) -> list[tuple[str, int]]:
+        acumulado = 0
+        linhas = []
+        for limite, contagem in zip(self.buckets, self._contagens):
+            acumulado += contagem
+            linhas.append((repr(limite), acumulado))
+        linhas.append(("+Inf", self.total))
+        return linhas
+
+
+class ConsumerMetrics:
+    """
+    Contadores e histogramas do consumer: mensagens recebidas, eventos
+    gravados, registros rejeitados por motivo, falhas de carga, latência de
+    cada etapa e o lag de cada partição. É atualizado pelas threads do consumer
+    e lido pela thread do endpoint /metrics, por isso todo acesso usa um lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.mensagens_recebidas = 0
+        self.eventos_gravados = 0
+        self.falhas_carga = 0
+        self.rejeitados: dict[str, int] = {}
+        self.latencias = {etapa: Histograma() for etapa in ETAPAS}
+        self.lag: dict[tuple[str, int], int] = {}
+
+    def message_received(self, quantidade: int = 1) -> int:
+        """
+        Conta mensagens recebidas do Kafka. Retorna o total acumulado.
+        """
+        with self._lock:
+            self.mensagens_recebidas += quantidade
+            return self.mensagens_recebidas
+
+    def rejected(self, motivo: str):
+        with self._lock:
+            self.rejeitados[motivo] = self.rejeitados.get(motivo, 0) + 1
+
+    def persisted(self, eventos: int):
+        with self._lock:
+            self.eventos_gravados += eventos
+
+    def load_failed(self):
+        with self._lock:
+            self.falhas_carga += 1
+
+    def observe(self, etapa: str, duracao_s: float):
+        with self._lock:
+            self.latencias[etapa].observe(duracao_s)
+
+    @contextmanager
+    def timed(self, etapa: str) -> Iterator[None]:
+        """
+        Mede a duração do bloco no histograma da etapa, mesmo que ele falhe.
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(etapa, time.perf_counter() - inicio)
+
+    def update_lag(self, consumer):
+        """
+        Atualiza o lag de todas as partições atribuídas ao consumer: a diferença
+        entre o highwater conhecido pelo consumer (atualizado a cada fetch, sem
+        consultar o broker) e a posição de leitura. Partições que não trouxeram
+        mensagens no último poll também são atualizadas, para que o lag cresça
+        quando o consumo para de avançar (como ao repetir um lote que falhou).
+        Deve ser chamado na thread que faz o poll.
+        """
+        for tp in consumer.assignment():
+            highwater = consumer.highwater(tp)
+            if highwater is None:
+                continue
+            # Com o highwater conhecido já houve um fetch, então a posição
+            # também é conhecida e a consulta não vai ao broker
+            posicao = consumer.position(tp)
+            if posicao is None:
+                continue
+            with self._lock:
+                self.lag[(tp.topic, tp.partition)] = max(0, highwater - posicao)
+
+    def to_prometheus(self) -> str:
+        """
+        Formata as métricas no formato texto do Prometheus.
+        """
+        linhas = []
+
+        def cabecalho(nome: str, tipo: str, ajuda: str):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+
+        with self._lock:
+            cabecalho(
+                "consumer_messages_received_total",
+                "counter",
+                "Mensagens recebidas do Kafka.",
+            )
+            linhas.append(
+                f"consumer_messages_received_total {self.mensagens_recebidas}"
+            )
+
+            cabecalho(
+                "consumer_events_persisted_total",
+                "counter",
+                "Eventos gravados no banco.",
+            )
+            linhas.append(f"consumer_events_persisted_total {self.eventos_gravados}")
+
+            cabecalho(
+                "consumer_records_rejected_total",
+                "counter",
+                "Registros descartados, por motivo.",
+            )
+            for motivo, total in sorted(self.rejeitados.items()):
+                linhas.append(
+                    f'consumer_records_rejected_total{{reason="{motivo}"}} {total}'
+                )
+
+            cabecalho(
+                "consumer_load_failures_total",
+                "counter",
+                "Cargas no banco que falharam.",
+            )
+            linhas.append(f"consumer_load_failures_total {self.falhas_carga}")
+
+            cabecalho(
+                "consumer_stage_duration_seconds",
+                "histogram",
+                "Duração de cada etapa (por mensagem; a carga, por transação).",
+            )
+            for etapa, histograma in self.latencias.items():
+                for limite, acumulado in histograma.cumulativo():
+                    linhas.append(
+                        f'consumer_stage_duration_seconds_bucket{{stage="{etapa}",le="{limite}"}} '
+                        f"{acumulado}"
+                    )
+                linhas.append(
+                    f'consumer_stage_duration_seconds_sum{{stage="{etapa}"}} {histograma.soma}'
+                )
+                linhas.append(
+                    f'consumer_stage_duration_seconds_count{{stage="{etapa}"}} {histograma.total}'
+                )
+
+            cabecalho(
+                "consumer_lag",
+                "gauge",
+                "Mensagens no tópico ainda não lidas, por partição.",
+            )
+            for (topic, partition), lag in sorted(self.lag.items()):
+                linhas.append(
+                    f'consumer_lag{{topic="{topic}",partition="{partition}"}} {lag}'
+                )
+
+        return "\n".join(linhas) + "\n"
+
+
+# Métricas do processo, compartilhadas por todos os modos do consumer
+METRICAS = ConsumerMetrics()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        corpo = METRICAS.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        # Cada scrape geraria uma linha no stderr
+        pass
+
+
+def start_metrics_server(
+    port: int = METRICS_PORT, host: str = METRICS_HOST
+) -> ThreadingHTTPServer | None:
+    """
+    Serve as métricas em http://<host>:<port>/metrics em uma thread separada,
+    fora do laço de consumo. Com a porta 0, o endpoint fica desativado.
+    """
+    if not port:
+        return None
+    servidor = ThreadingHTTPServer((host, port), _MetricsHandler)
+    servidor.daemon_threads = True
+    threading.Thread(
+        target=servidor.serve_forever, name="consumer-metrics", daemon=True
+    ).start()
+    logger.info(f"Métricas do consumer disponíveis em http://{host}:{port}/metrics")
+    return servidor
+
+
+def stop_metrics_server(servidor: ThreadingHTTPServer | None):
+    if servidor is not None:
+        servidor.shutdown()
+        servidor.server_close()
@@ -0,0 +1,349 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+from typing import Callable
+
+from kafka import KafkaConsumer, TopicPartition
+from kafka.errors import CommitFailedError
+from kafka.structs import OffsetAndMetadata
+
+from consumer_metrics import METRICAS, MOTIVO_CARGA, MOTIVO_ERRO
+from etl.cache import HotKeyCache
+from etl.load import ERROS_CONEXAO, load_batch_isolating_errors
+from kpi_aggregator import SnapshotPublisher
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre commits dos offsets já persistidos
+COMMIT_INTERVAL_S = 1.0
+
+# Tempo máximo bloqueado em uma fila antes de verificar se o pipeline foi encerrado
+QUEUE_TIMEOUT_S = 0.5
+
+# Espera antes de repetir um lote cuja carga no banco falhou
+RETRY_BACKOFF_S = 1.0
+
+# Tentativas de um lote que falha por um erro inesperado (fora do banco); falhas
+# de conexão são repetidas até o pipeline ser encerrado
+TENTATIVAS_CARGA = 3
+
+# Espera máxima por cada thread no encerramento
+JOIN_TIMEOUT_S = 10.0
+
+# Marca o fim do fluxo em uma fila
+_FIM = object()
+
+
+class OffsetTracker:
+    """
+    Acompanha, por partição, as mensagens despachadas e as já persistidas.
+    Como os workers terminam fora de ordem, o offset confirmável de cada partição
+    é o da mensagem pendente mais antiga: nada depois dela é confirmado antes
+    que ela seja gravada.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pendentes: dict[TopicPartition, set[int]] = {}
+        self._proximo: dict[TopicPartition, int] = {}
+        self._confirmados: dict[TopicPartition, int] = {}
+
+    def registrar(self, tp: TopicPartition, offset: int):
+        with self._lock:
+            self._pendentes.setdefault(tp, set()).add(offset)
+            self._proximo[tp] = max(self._proximo.get(tp, 0), offset + 1)
+
+    def concluir(self, tp: TopicPartition, offset: int):
+        with self._lock:
+            self._pendentes[tp].discard(offset)
+
+    def offsets_para_commit(self) -> dict[TopicPartition, OffsetAndMetadata]:
+        """
+        Retorna os offsets que avançaram desde o último commit.
+        """
+        offsets = {}
+        with self._lock:
+            for tp, pendentes in self._pendentes.items():
+                confirmavel = min(pendentes) if pendentes else self._proximo[tp]
+                if confirmavel > self._confirmados.get(tp, -1):
+                    offsets[tp] = confirmavel
+        return {tp: OffsetAndMetadata(offset, "", -1) for tp, offset in offsets.items()}
+
+    def marcar_confirmados(self, offsets: dict[TopicPartition, OffsetAndMetadata]):
+        with self._lock:
+            for tp, oam in offsets.items():
+                self._confirmados[tp] = oam.offset
+
+
+def _put(fila: queue.Queue, item, parar: threading.Event) -> bool:
+    """
+    Coloca o item na fila, bloqueando enquanto ela estiver cheia (backpressure).
+    Retorna False se o pipeline for encerrado durante a espera.
+    """
+    while True:
+        try:
+            fila.put(item, timeout=QUEUE_TIMEOUT_S)
+            return True
+        except queue.Full:
+            if parar.is_set():
+                return False
+
+
+def _worker(
+    entrada: queue.Queue,
+    saida: queue.Queue,
+    processar: Callable,
+    parar: threading.Event,
+):
+    """
+    Estágio de validação e transformação. Cada worker recebe sempre as mesmas
+    chaves, e processa sua fila em ordem, preservando a ordem por `id_pacote`.
+    """
+    while True:
+        item = entrada.get()
+        if item is _FIM:
+            _put(saida, _FIM, parar)
+            return
+
+        message = item
+        try:
+            registro = processar(message.value)
+        except Exception as e:
+            METRICAS.rejected(MOTIVO_ERRO)
+            logger.exception(f"Erro inesperado ao processar a mensagem: {e}")
+            registro = None
+
+        tp = TopicPartition(message.topic, message.partition)
+        # Mensagens inválidas também seguem para o writer, para que seus offsets
+        # só sejam liberados na ordem em que chegaram
+        if not _put(saida, (tp, message.offset, registro), parar):
+            return
+
+
+def _gravar_lote(
+    lote: list,
+    tracker: OffsetTracker,
+    parar: threading.Event,
+    cache: HotKeyCache | None,
+    publicador: SnapshotPublisher | None,
+) -> bool:
+    """
+    Persiste um lote e libera seus offsets. Registros rejeitados pelo banco são
+    descartados (ver `load_batch_isolating_errors`); falhas de conexão são
+    repetidas, e outros erros até `TENTATIVAS_CARGA` vezes. Se a carga não for
+    concluída, ou se o pipeline for encerrado durante as tentativas, retorna
+    False sem liberar os offsets, e as mensagens serão consumidas de novo.
+    Os eventos persistidos são repassados ao publicador do snapshot de KPIs.
+    """
+    pacotes = [registro[0] for _, _, registro in lote if registro is not None]
+    eventos = [registro[1] for _, _, registro in lote if registro is not None]
+
+    rejeitados = []
+    falhas = 0
+    while True:
+        try:
+            if eventos:
+                with METRICAS.timed("load"):
+                    rejeitados = load_batch_isolating_errors(pacotes, eventos, cache)
+            break
+        except Exception as e:
+            METRICAS.load_failed()
+            if parar.is_set():
+                logger.error(
+                    f"Lote de {len(lote)} mensagens não gravado no encerramento: {e}"
+                )
+                return False
+            if not isinstance(e, ERROS_CONEXAO):
+                falhas += 1
+                if falhas >= TENTATIVAS_CARGA:
+                    logger.exception(
+                        f"Lote de {len(lote)} mensagens não gravado após {falhas} tentativas: {e}"
+                    )
+                    return False
+            logger.warning(f"Falha ao gravar lote, tentando novamente: {e}")
+            time.sleep(RETRY_BACKOFF_S)
+
+    if rejeitados:
+        for _ in rejeitados:
+            METRICAS.rejected(MOTIVO_CARGA)
+        descartados = set(rejeitados)
+        eventos = [e for i, e in enumerate(eventos) if i not in descartados]
+
+    METRICAS.persisted(len(eventos))
+    if publicador is not None:
+        publicador.on_persisted(eventos)
+
+    for tp, offset, _ in lote:
+        tracker.concluir(tp, offset)
+    return True
+
+
+def _writer(
+    entrada: queue.Queue,
+    num_workers: int,
+    tracker: OffsetTracker,
+    batch_size: int,
+    linger_ms: int,
+    parar: threading.Event,
+    cache: HotKeyCache | None,
+    publicador: SnapshotPublisher | None,
+):
+    """
+    Estágio de escrita: agrupa os resultados dos workers em lotes de até
+    `batch_size` itens ou `linger_ms` milissegundos e grava cada lote no banco.
+    Termina quando todos os workers enviarem o fim do fluxo ou, com o pipeline
+    sendo encerrado, quando a fila ficar vazia, pois um worker que desistiu de
+    uma fila cheia não envia o fim do fluxo.
+    """
+    workers_ativos = num_workers
+    lote = []
+    prazo = None
+
+    while workers_ativos:
+        timeout = QUEUE_TIMEOUT_S if prazo is None else max(0, prazo - time.monotonic())
+        try:
+            item = entrada.get(timeout=timeout)
+        except queue.Empty:
+            if parar.is_set():
+                break
+            item = None
+
+        if item is _FIM:
+            workers_ativos -= 1
+        elif item is not None:
+            if not lote:
+                prazo = time.monotonic() + linger_ms / 1000
+            lote.append(item)
+        elif publicador is not None:
+            publicador.tick()
+
+        if lote and (len(lote) >= batch_size or time.monotonic() >= prazo):
+            if not _gravar_lote(lote, tracker, parar, cache, publicador):
+                return
+            lote, prazo = [], None
+
+    if lote:
+        _gravar_lote(lote, tracker, parar, cache, publicador)
+
+
+def _commit(consumer: KafkaConsumer, tracker: OffsetTracker):
+    offsets = tracker.offsets_para_commit()
+    if not offsets:
+        return
+    try:
+        consumer.commit(offsets=offsets)
+        tracker.marcar_confirmados(offsets)
+    except CommitFailedError as e:
+        # Ocorre após um rebalanceamento; as mensagens serão reentregues
+        # e as cargas são idempotentes
+        logger.warning(f"Falha ao confirmar offsets após rebalanceamento: {e}")
+
+
+def _worker_index(message, num_workers: int) -> int:
+    """
+    Escolhe o worker pela chave da mensagem (o `id_pacote`), para que eventos do
+    mesmo pacote sigam sempre pela mesma fila. Sem chave, usa a partição.
+    """
+    if message.key is not None:
+        return zlib.crc32(message.key) % num_workers
+    return message.partition % num_workers
+
+
+def run_pipeline(
+    consumer: KafkaConsumer,
+    processar: Callable,
+    num_workers: int,
+    queue_size: int,
+    batch_size: int,
+    linger_ms: int,
+    cache: HotKeyCache | None = None,
+    publicador: SnapshotPublisher | None = None,
+    parar: threading.Event | None = None,
+):
+    """
+    Executa o consumo em pipeline: a thread atual busca as mensagens no Kafka,
+    `num_workers` threads validam e transformam e uma thread grava no banco.
+    As filas limitadas a `queue_size` aplicam backpressure entre os estágios.
+
+    O KafkaConsumer não é thread-safe, então o poll e os commits ficam nesta
+    thread; são confirmados apenas os offsets até o último evento persistido.
+    O `publicador` de KPIs, se houver, é usado apenas pela thread de escrita.
+    Sinalizar `parar` encerra o pipeline da mesma forma que um Ctrl+C.
+    """
+    if parar is None:
+        parar = threading.Event()
+    tracker = OffsetTracker()
+    filas_workers = [queue.Queue(maxsize=queue_size) for _ in range(num_workers)]
+    fila_writer = queue.Queue(maxsize=queue_size)
+
+    workers = [
+        threading.Thread(
+            target=_worker,
+            args=(fila, fila_writer, processar, parar),
+            name=f"consumer-worker-{i}",
+            daemon=True,
+        )
+        for i, fila in enumerate(filas_workers)
+    ]
+    writer = threading.Thread(
+        target=_writer,
+        args=(
+            fila_writer,
+            num_workers,
+            tracker,
+            batch_size,
+            linger_ms,
+            parar,
+            cache,
+            publicador,
+        ),
+        name="consumer-writer",
+        daemon=True,
+    )
+    for thread in workers + [writer]:
+        thread.start()
+
+    logger.info(
+        f"Pipeline iniciado com {num_workers} workers e filas de {queue_size} mensagens."
+    )
+    ultimo_commit = time.monotonic()
+    try:
+        while writer.is_alive() and not parar.is_set():
+            registros = consumer.poll(timeout_ms=int(QUEUE_TIMEOUT_S * 1000))
+            METRICAS.update_lag(consumer)
+            for mensagens_particao in registros.values():
+                METRICAS.message_received(len(mensagens_particao))
+                for message in mensagens_particao:
+                    tracker.registrar(
+                        TopicPartition(message.topic, message.partition), message.offset
+                    )
+                    fila = filas_workers[_worker_index(message, num_workers)]
+                    if not _put(fila, message, parar):
+                        return
+
+            if time.monotonic() - ultimo_commit >= COMMIT_INTERVAL_S:
+                _commit(consumer, tracker)
+                ultimo_commit = time.monotonic()
+
+        if not writer.is_alive():
+            logger.error("A thread de escrita foi encerrada. Parando o pipeline.")
+
+    finally:
+        # Encerramento: os workers esvaziam suas filas, o writer grava o que
+        # restou e os offsets persistidos são confirmados uma última vez
+        logger.info("Encerrando o pipeline...")
+        parar.set()
+        for fila, worker in zip(filas_workers, workers):
+            while worker.is_alive():
+                try:
+                    fila.put(_FIM, timeout=QUEUE_TIMEOUT_S)
+                    break
+                except queue.Full:
+                    continue
+        for thread in workers + [writer]:
+            thread.join(timeout=JOIN_TIMEOUT_S)
+            if thread.is_alive():
+                logger.warning(f"A thread {thread.name} não terminou no encerramento.")
+        _commit(consumer, tracker)
@@ -2,7 +2,11 @@ import streamlit as st
 import plotly.express as px
 from streamlit_autorefresh import st_autorefresh
 
-from src.data import buscar_dados_do_banco
+from src.data import (
+    INTERVALO_ATUALIZACAO_S,
+    buscar_kpis,
+    buscar_series_do_banco,
+)
 from src.utils import formatar_timedelta
 
 # --- Configuração da Página ---
@@ -11,14 +15,16 @@ st.set_page_config(
 )
 
 # Atualização Automática
-# Atualiza a página a cada 5 segundos
-st_autorefresh(interval=5000, key="datarefresh")
+# Atualiza a página a cada 5 segundos; as queries ficam em cache pelo mesmo
+# intervalo e são compartilhadas entre todas as sessões abertas
+st_autorefresh(interval=INTERVALO_ATUALIZACAO_S * 1000, key="datarefresh")
 
 # Construção da Interface do Dashboard
 st.title("⚡ Dashboard de Monitoramento de Entregas (Real-Time)")
 
 # 1. Busca os dados a cada atualização da página
-df_status, tempo_medio = buscar_dados_do_banco()
+df_status, tempo_medio = buscar_kpis()
+df_eventos_hora, df_entregas_dia = buscar_series_do_banco()
 
 # 2. Renderiza a interface
 if df_status is not None:
@@ -47,6 +53,37 @@ if df_status is not None:
             st.subheader("Total de Pacotes")
             st.metric(label="Total de Pacotes Únicos no Sistema", value=total_pacotes)
 
+    col3, col4 = st.columns(2)
+
+    with col3:
+        with st.container(border=True):
+            st.subheader("Eventos por Hora")
+            if df_eventos_hora is not None and not df_eventos_hora.empty:
+                fig = px.bar(
+                    df_eventos_hora,
+                    x="hora",
+                    y="total_eventos",
+                    color="status_rastreamento",
+                    title="Eventos por Status (últimas 24 horas)",
+                )
+                st.plotly_chart(fig, config={"responsive": True})
+            else:
+                st.info("Sem eventos recentes.")
+
+    with col4:
+        with st.container(border=True):
+            st.subheader("Entregas por Dia")
+            if df_entregas_dia is not None and not df_entregas_dia.empty:
+                fig = px.bar(
+                    df_entregas_dia,
+                    x="dia",
+                    y="total_entregas",
+                    title="Entregas Concluídas (últimos 30 dias)",
+                )
+                st.plotly_chart(fig, config={"responsive": True})
+            else:
+                st.info("Sem entregas registradas.")
+
     with st.container(border=True):
         st.subheader("Dados de Status")
         st.dataframe(df_status, width="stretch")
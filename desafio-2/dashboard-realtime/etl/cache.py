@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Memória total, em MiB, reservada para os caches do consumer
+CACHE_MEMORY_MB = float(os.getenv("CONSUMER_CACHE_MB", "64"))
+
+# Fração do orçamento destinada aos pacotes conhecidos; o restante vai para os eventos
+FRACAO_PACOTES = 0.25
+
+# Custo aproximado, em bytes, de cada entrada em memória (objeto int + slot na estrutura)
+BYTES_POR_PACOTE = 100
+BYTES_POR_EVENTO = 70
+
+# A cada quantas consultas as estatísticas são registradas no log
+INTERVALO_LOG_ESTATISTICAS = 10_000
+
+
+class KnownPacotesLRU:
+    """
+    LRU limitado dos `id_pacote` já gravados na tabela `pacotes`. Após o primeiro
+    evento de um pacote, o upsert dele não altera mais nada e pode ser pulado.
+    """
+
+    def __init__(self, capacidade: int):
+        self.capacidade = max(1, capacidade)
+        self._itens: OrderedDict[int, None] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, id_pacote: int) -> bool:
+        if id_pacote in self._itens:
+            self._itens.move_to_end(id_pacote)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self, id_pacote: int):
+        self._itens[id_pacote] = None
+        self._itens.move_to_end(id_pacote)
+        if len(self._itens) > self.capacidade:
+            self._itens.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+
+class RecentEventsFilter:
+    """
+    Filtro compacto dos pares (`id_pacote`, `data_evento`) gravados recentemente.
+    Guarda apenas uma impressão digital de 64 bits de cada par, em duas gerações:
+    quando a atual enche, ela passa a ser a antiga e a mais velha é descartada.
+
+    Diferente de um Bloom filter, um falso positivo aqui exige uma colisão de
+    64 bits, então na prática um evento novo nunca é descartado por engano.
+    """
+
+    def __init__(self, capacidade: int):
+        self.capacidade_geracao = max(1, capacidade // 2)
+        self._atual: set[int] = set()
+        self._anterior: set[int] = set()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _fingerprint(id_pacote: int, data_evento: datetime) -> int:
+        chave = f"{id_pacote}|{data_evento.timestamp()!r}".encode()
+        return int.from_bytes(hashlib.blake2b(chave, digest_size=8).digest(), "little")
+
+    def __contains__(self, evento: dict) -> bool:
+        fp = self._fingerprint(evento["id_pacote"], evento["data_evento"])
+        if fp in self._atual or fp in self._anterior:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self, evento: dict):
+        if len(self._atual) >= self.capacidade_geracao:
+            self._anterior = self._atual
+            self._atual = set()
+        self._atual.add(self._fingerprint(evento["id_pacote"], evento["data_evento"]))
+
+    def __len__(self) -> int:
+        return len(self._atual) + len(self._anterior)
+
+
+class HotKeyCache:
+    """
+    Agrupa os caches usados pelo loader para pular escritas que não podem mudar
+    nada no banco. Os itens só devem ser adicionados após o commit da transação.
+    Não é thread-safe: deve ser usado apenas pela thread que grava no banco.
+    """
+
+    def __init__(self, memoria_mb: float = CACHE_MEMORY_MB):
+        orcamento = int(memoria_mb * 1024 * 1024)
+        self.pacotes = KnownPacotesLRU(
+            int(orcamento * FRACAO_PACOTES) // BYTES_POR_PACOTE
+        )
+        self.eventos = RecentEventsFilter(
+            int(orcamento * (1 - FRACAO_PACOTES)) // BYTES_POR_EVENTO
+        )
+        self._consultas = 0
+        logger.info(
+            f"Caches do consumer criados ({memoria_mb:g} MiB): até "
+            f"{self.pacotes.capacidade} pacotes e {self.eventos.capacidade_geracao * 2} eventos."
+        )
+
+    def filter_new(self, pacotes: list[dict], eventos: list[dict]) -> tuple[list, list]:
+        """
+        Remove os pacotes já conhecidos e os eventos já gravados recentemente.
+        """
+        pacotes_novos = [p for p in pacotes if p["id_pacote"] not in self.pacotes]
+        eventos_novos = [e for e in eventos if e not in self.eventos]
+
+        self._consultas += len(pacotes) + len(eventos)
+        if self._consultas >= INTERVALO_LOG_ESTATISTICAS:
+            self._consultas = 0
+            self.log_stats()
+
+        return pacotes_novos, eventos_novos
+
+    def mark_persisted(self, pacotes: list[dict], eventos: list[dict]):
+        """
+        Registra pacotes e eventos cuja transação já foi confirmada.
+        """
+        for pacote in pacotes:
+            self.pacotes.add(pacote["id_pacote"])
+        for evento in eventos:
+            self.eventos.add(evento)
+
+    def stats(self) -> dict:
+        return {
+            "pacotes_hits": self.pacotes.hits,
+            "pacotes_misses": self.pacotes.misses,
+            "pacotes_tamanho": len(self.pacotes),
+            "eventos_hits": self.eventos.hits,
+            "eventos_misses": self.eventos.misses,
+            "eventos_tamanho": len(self.eventos),
+        }
+
+    def log_stats(self):
+        e = self.stats()
+        logger.info(
+            f"Cache de pacotes: {e['pacotes_hits']} hits, {e['pacotes_misses']} misses "
+            f"({e['pacotes_tamanho']} itens). Filtro de eventos: {e['eventos_hits']} "
+            f"duplicados, {e['eventos_misses']} novos ({e['eventos_tamanho']} itens)."
+        )
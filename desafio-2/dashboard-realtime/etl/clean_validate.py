@@ -3,6 +3,10 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Intervalo da coluna `id_pacote` no banco (integer, 32 bits)
+ID_PACOTE_MIN = -(2**31)
+ID_PACOTE_MAX = 2**31 - 1
+
 
 def clean_validate_single_record(evento: dict) -> dict | None:
     """
@@ -29,11 +33,15 @@ def clean_validate_single_record(evento: dict) -> dict | None:
 
         # 3. Validação e Conversão de Tipos
         evento["id_pacote"] = int(evento["id_pacote"])
-        evento["data_atualizacao"] = datetime.fromisoformat(
-            evento["data_atualizacao"].replace("Z", "+00:00")
-        )
+        if not ID_PACOTE_MIN <= evento["id_pacote"] <= ID_PACOTE_MAX:
+            raise ValueError("id_pacote fora do intervalo de 32 bits")
+        # Mensagens no formato binário já trazem a data convertida
+        if not isinstance(evento["data_atualizacao"], datetime):
+            evento["data_atualizacao"] = datetime.fromisoformat(
+                evento["data_atualizacao"].replace("Z", "+00:00")
+            )
 
-    except (ValueError, TypeError) as e:
+    except (ValueError, TypeError, AttributeError) as e:
         logger.warning(
             f"Registro descartado - dados inválidos (tipo ou formato): {evento}. Erro: {e}"
         )
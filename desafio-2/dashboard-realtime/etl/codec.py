@@ -0,0 +1,139 @@
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+
+# Primeiro byte das mensagens binárias. Uma mensagem JSON sempre começa com
+# '{' ou espaço em branco, então o formato pode ser detectado a cada mensagem.
+MAGIC_BINARIO = 0xB1
+VERSAO_BINARIO = 1
+
+FORMATO_JSON = "json"
+FORMATO_BINARIO = "binario"
+
+# Layout v1 (little-endian): magic, versão, id_pacote (int32), data_atualizacao
+# em microssegundos desde a época (int64), código do status (uint8) e os
+# tamanhos de origem, destino e status livre (uint16), seguidos dos textos em UTF-8
+_CABECALHO = struct.Struct("<BBiqBHHH")
+
+# Códigos dos status conhecidos; 0 indica um status fora da tabela, enviado como texto
+STATUS_POR_CODIGO = {
+    1: "POSTADO",
+    2: "EM TRÂNSITO",
+    3: "SAIU PARA ENTREGA",
+    4: "ENTREGUE",
+    5: "EXTRAVIADO",
+    6: "AGUARDANDO RETIRADA",
+}
+CODIGO_POR_STATUS = {status: codigo for codigo, status in STATUS_POR_CODIGO.items()}
+STATUS_LIVRE = 0
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class FormatoInvalidoError(ValueError):
+    """
+    Mensagem que não pôde ser decodificada em nenhum dos formatos aceitos.
+    """
+
+
+def _para_microssegundos(data: datetime | str) -> int:
+    if isinstance(data, str):
+        data = datetime.fromisoformat(data.replace("Z", "+00:00"))
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone.utc)
+    return (data - _EPOCH) // timedelta(microseconds=1)
+
+
+def encode_binary(evento: dict) -> bytes:
+    """
+    Serializa um evento no formato binário compacto. A data pode ser um
+    `datetime` ou uma string ISO 8601; datas sem fuso são tratadas como UTC.
+    """
+    status = evento["status_rastreamento"]
+    codigo = CODIGO_POR_STATUS.get(status, STATUS_LIVRE)
+    origem = evento["origem"].encode("utf-8")
+    destino = evento["destino"].encode("utf-8")
+    status_livre = status.encode("utf-8") if codigo == STATUS_LIVRE else b""
+
+    cabecalho = _CABECALHO.pack(
+        MAGIC_BINARIO,
+        VERSAO_BINARIO,
+        int(evento["id_pacote"]),
+        _para_microssegundos(evento["data_atualizacao"]),
+        codigo,
+        len(origem),
+        len(destino),
+        len(status_livre),
+    )
+    return cabecalho + origem + destino + status_livre
+
+
+def _decode_binary(valor: bytes) -> dict:
+    try:
+        (
+            _,
+            versao,
+            id_pacote,
+            microssegundos,
+            codigo,
+            tam_origem,
+            tam_destino,
+            tam_status,
+        ) = _CABECALHO.unpack_from(valor)
+    except struct.error as e:
+        raise FormatoInvalidoError(f"Mensagem binária truncada: {e}") from e
+
+    if versao != VERSAO_BINARIO:
+        raise FormatoInvalidoError(f"Versão do formato binário não suportada: {versao}")
+
+    inicio = _CABECALHO.size
+    fim_origem = inicio + tam_origem
+    fim_destino = fim_origem + tam_destino
+    if len(valor) != fim_destino + tam_status:
+        raise FormatoInvalidoError(
+            "Tamanho da mensagem binária não confere com o cabeçalho."
+        )
+
+    if codigo != STATUS_LIVRE and codigo not in STATUS_POR_CODIGO:
+        raise FormatoInvalidoError(f"Código de status desconhecido: {codigo}")
+
+    try:
+        origem = valor[inicio:fim_origem].decode("utf-8")
+        destino = valor[fim_origem:fim_destino].decode("utf-8")
+        if codigo == STATUS_LIVRE:
+            status = valor[fim_destino:].decode("utf-8")
+        else:
+            status = STATUS_POR_CODIGO[codigo]
+        data_atualizacao = _EPOCH + timedelta(microseconds=microssegundos)
+    except (UnicodeDecodeError, OverflowError) as e:
+        raise FormatoInvalidoError(f"Conteúdo inválido na mensagem binária: {e}") from e
+
+    return {
+        "id_pacote": id_pacote,
+        "origem": origem,
+        "destino": destino,
+        "status_rastreamento": status,
+        "data_atualizacao": data_atualizacao,
+    }
+
+
+def detect_format(valor: bytes) -> str:
+    return FORMATO_BINARIO if valor[:1] == bytes([MAGIC_BINARIO]) else FORMATO_JSON
+
+
+def decode_event(valor: bytes) -> dict:
+    """
+    Decodifica uma mensagem em JSON ou no formato binário, detectado pelo
+    primeiro byte. No formato binário, `id_pacote` já vem como int e
+    `data_atualizacao` como `datetime`, dispensando conversões na validação.
+    """
+    if detect_format(valor) == FORMATO_BINARIO:
+        return _decode_binary(valor)
+
+    try:
+        evento = json.loads(valor)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise FormatoInvalidoError(f"JSON inválido: {e}") from e
+    if not isinstance(evento, dict):
+        raise FormatoInvalidoError("A mensagem JSON não é um objeto.")
+    return evento
@@ -1,66 +1,467 @@
 import logging
 import os
+import weakref
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import psycopg2
+from psycopg2.extras import Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from typing import List
+
+from .cache import HotKeyCache
 
 logger = logging.getLogger(__name__)
 
 
-def get_db_connection():
-    """
-    Retorna uma conexão de banco de dados (padrão DBAPI) para o TimescaleDB.
-    """
+# Tamanho do pool de conexões do consumer (máximo e mínimo mantido aberto). O
+# pool fecha as conexões devolvidas além do mínimo, então por padrão o mínimo é
+# igual ao máximo e as conexões (e seus statements preparados) são reaproveitadas
+POOL_MAX_CONEXOES = int(os.getenv("DB_POOL_MAX_CONN", "4"))
+POOL_MIN_CONEXOES = int(os.getenv("DB_POOL_MIN_CONN", str(POOL_MAX_CONEXOES)))
+
+# Tentativas de uma carga quando a conexão com o banco cai no meio dela
+TENTATIVAS_RECONEXAO = 2
+
+# Erros transitórios: conexão perdida ou banco indisponível. Repetir a carga pode
+# resolver; qualquer outro erro do banco vem dos dados e se repetiria sempre
+ERROS_CONEXAO = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+# Statements preparados no servidor, criados uma vez por conexão do pool
+PREPARE_UPSERT_PACOTE = """
+    PREPARE upsert_pacote (integer, text, text) AS
+    INSERT INTO pacotes (id_pacote, origem, destino)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (id_pacote) DO NOTHING;
+"""
+PREPARE_UPSERT_EVENTO = """
+    PREPARE upsert_evento (integer, text, timestamptz) AS
+    INSERT INTO eventos_rastreamento (id_pacote, status_rastreamento, data_evento)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (id_pacote, data_evento) DO NOTHING;
+"""
+# A projeção só é sobrescrita por um evento mais novo que o armazenado, então
+# eventos atrasados ou fora de ordem não regridem o status do pacote
+PREPARE_UPSERT_STATUS_ATUAL = """
+    PREPARE upsert_status_atual (integer, text, timestamptz) AS
+    INSERT INTO pacote_status_atual (id_pacote, status_rastreamento, data_evento)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (id_pacote) DO UPDATE
+    SET status_rastreamento = EXCLUDED.status_rastreamento,
+        data_evento = EXCLUDED.data_evento,
+        atualizado_em = clock_timestamp()
+    WHERE pacote_status_atual.data_evento < EXCLUDED.data_evento;
+"""
+
+# Trava a linha do KPI de tempo de entrega antes de ler os valores anteriores,
+# para que cargas concorrentes não calculem a diferença sobre o mesmo estado
+LOCK_KPI_ENTREGA_SQL = "SELECT 1 FROM kpi_tempo_entrega WHERE id = 1 FOR UPDATE;"
+
+# Atualiza o primeiro evento e a entrega de cada pacote em `pacote_entrega` e
+# aplica ao agregado `kpi_tempo_entrega` apenas a diferença entre a contribuição
+# nova e a anterior de cada pacote, o que mantém o KPI correto com eventos
+# atrasados ou fora de ordem. `{origem}` é a relação com os eventos novos.
+ATUALIZAR_KPI_ENTREGA_SQL = """
+    WITH novos AS (
+        SELECT
+            id_pacote,
+            MIN(data_evento) AS primeiro_evento,
+            MAX(CASE WHEN status_rastreamento = 'ENTREGUE' THEN data_evento END) AS data_entrega
+        FROM {origem}
+        GROUP BY id_pacote
+    ),
+    anteriores AS (
+        SELECT pe.id_pacote, pe.primeiro_evento, pe.data_entrega
+        FROM pacote_entrega pe
+        JOIN novos USING (id_pacote)
+    ),
+    atualizados AS (
+        INSERT INTO pacote_entrega (id_pacote, primeiro_evento, data_entrega)
+        SELECT id_pacote, primeiro_evento, data_entrega FROM novos
+        ON CONFLICT (id_pacote) DO UPDATE
+        SET primeiro_evento = LEAST(pacote_entrega.primeiro_evento, EXCLUDED.primeiro_evento),
+            data_entrega = GREATEST(pacote_entrega.data_entrega, EXCLUDED.data_entrega)
+        RETURNING primeiro_evento, data_entrega
+    )
+    UPDATE kpi_tempo_entrega
+    SET soma_duracao = soma_duracao
+            + COALESCE((SELECT SUM(data_entrega - primeiro_evento) FROM atualizados), INTERVAL '0')
+            - COALESCE((SELECT SUM(data_entrega - primeiro_evento) FROM anteriores), INTERVAL '0'),
+        total_entregas = total_entregas
+            + (SELECT COUNT(data_entrega) FROM atualizados)
+            - (SELECT COUNT(data_entrega) FROM anteriores)
+    WHERE id = 1;
+"""
+ORIGEM_VALUES = (
+    "(VALUES {valores}) AS origem (id_pacote, status_rastreamento, data_evento)"
+)
+
+# Colunas dos eventos devolvidos pelo RETURNING do INSERT em lote
+COLUNAS_EVENTO = ("id_pacote", "status_rastreamento", "data_evento")
+
+PREPARE_ATUALIZAR_KPI_ENTREGA = (
+    "PREPARE atualizar_kpi_entrega (integer, text, timestamptz) AS"
+    + ATUALIZAR_KPI_ENTREGA_SQL.format(
+        origem=ORIGEM_VALUES.format(valores="($1, $2, $3)")
+    )
+)
 
+_pool: ThreadedConnectionPool | None = None
+# Conexões do pool que já têm os statements preparados. Guarda referências fracas
+# às próprias conexões, e não seus `id()`, que o Python reutiliza depois que uma
+# conexão fechada é coletada
+_conexoes_preparadas: weakref.WeakSet = weakref.WeakSet()
+
+
+def _get_database_url() -> str:
     logger.info("Carregando .env...")
     load_dotenv()
     database_url = os.getenv("TIMESCALE_DATABASE_URL")
     if not database_url:
         raise ValueError("TIMESCALE_DATABASE_URL não definida no .env.")
+    return database_url
 
-    return psycopg2.connect(database_url)
 
+def get_db_connection():
+    """
+    Retorna uma conexão de banco de dados (padrão DBAPI) para o TimescaleDB.
+    """
+    return psycopg2.connect(_get_database_url())
 
-def load_single_record(pacote_data: dict, evento_data: dict):
+
+def init_pool(minconn: int = POOL_MIN_CONEXOES, maxconn: int = POOL_MAX_CONEXOES):
+    """
+    Cria o pool de conexões de longa duração usado pelas cargas do consumer.
+    Deve ser chamada uma vez na inicialização; chamadas repetidas são ignoradas.
     """
-    Carrega um único pacote e evento no TimescaleDB de forma idempotente.
-    Gerencia sua própria conexão e transação.
+    global _pool
+    if _pool is not None:
+        return
+
+    _pool = ThreadedConnectionPool(minconn, maxconn, _get_database_url())
+    logger.info(f"Pool de conexões criado (mín. {minconn}, máx. {maxconn}).")
+
+
+def close_pool():
     """
-    conn = None
+    Fecha todas as conexões do pool.
+    """
+    global _pool
+    if _pool is None:
+        return
+
+    _pool.closeall()
+    _pool = None
+    _conexoes_preparadas.clear()
+    logger.info("Pool de conexões encerrado.")
+
+
+def _prepare_statements(conn):
+    """
+    Prepara os upserts no servidor na primeira vez que a conexão é usada,
+    evitando que o Postgres analise e planeje as queries a cada evento.
+    """
+    if conn in _conexoes_preparadas:
+        return
+
+    with conn.cursor() as cursor:
+        cursor.execute(PREPARE_UPSERT_PACOTE)
+        cursor.execute(PREPARE_UPSERT_EVENTO)
+        cursor.execute(PREPARE_UPSERT_STATUS_ATUAL)
+        cursor.execute(PREPARE_ATUALIZAR_KPI_ENTREGA)
+    conn.commit()
+    _conexoes_preparadas.add(conn)
+
+
+@contextmanager
+def _pooled_connection():
+    """
+    Empresta uma conexão do pool dentro de uma transação: faz commit ao final,
+    rollback em caso de erro, e descarta a conexão se ela estiver quebrada.
+    """
+    if _pool is None:
+        init_pool()
+
+    conn = _pool.getconn()
+    quebrada = False
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        _prepare_statements(conn)
+        yield conn
+        conn.commit()
+    except ERROS_CONEXAO:
+        quebrada = True
+        raise
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if quebrada or conn.closed:
+            _conexoes_preparadas.discard(conn)
+        _pool.putconn(conn, close=quebrada or bool(conn.closed))
+
 
+def _run_with_reconnect(carga, descricao: str):
+    """
+    Executa `carga(cursor)` em uma conexão do pool. Se a conexão cair, ela é
+    descartada e a carga é repetida em uma nova conexão; os upserts são
+    idempotentes, então repetir é seguro.
+    """
+    for tentativa in range(1, TENTATIVAS_RECONEXAO + 1):
+        try:
+            with _pooled_connection() as conn:
+                with conn.cursor() as cursor:
+                    return carga(cursor)
+        except ERROS_CONEXAO as e:
+            if tentativa == TENTATIVAS_RECONEXAO:
+                logger.exception(f"ERRO: Falha de conexão ao carregar {descricao}.")
+                raise
+            logger.warning(
+                f"Conexão com o banco perdida ao carregar {descricao}, reconectando: {e}"
+            )
+        except Exception:
+            logger.exception(
+                f"ERRO: Falha ao carregar {descricao}. Realizando rollback..."
+            )
+            raise
+
+
+def load_single_record(
+    pacote_data: dict, evento_data: dict, cache: HotKeyCache | None = None
+):
+    """
+    Carrega um único pacote e evento no TimescaleDB de forma idempotente,
+    usando uma conexão do pool e os statements preparados.
+    Com `cache`, pula o upsert de pacotes já conhecidos e eventos já gravados.
+    """
+    gravar_pacote = True
+    if cache is not None:
+        pacotes, eventos = cache.filter_new([pacote_data], [evento_data])
+        if not eventos:
+            logger.debug(
+                "Evento do pacote %s já gravado, ignorando.", pacote_data["id_pacote"]
+            )
+            return
+        gravar_pacote = bool(pacotes)
+
+    def carga(cursor):
         # 1. Upsert na tabela 'pacotes'
-        upsert_pacote_sql = """
-            INSERT INTO pacotes (id_pacote, origem, destino)
-            VALUES (%(id_pacote)s, %(origem)s, %(destino)s)
-            ON CONFLICT (id_pacote) DO NOTHING;
-        """
-        cursor.execute(upsert_pacote_sql, pacote_data)
-        logger.info(f"[*] {cursor.rowcount} novos registros de pacotes inseridos.")
+        if gravar_pacote:
+            cursor.execute(
+                "EXECUTE upsert_pacote (%(id_pacote)s, %(origem)s, %(destino)s);",
+                pacote_data,
+            )
+            logger.debug(
+                "[*] %s novos registros de pacotes inseridos.", cursor.rowcount
+            )
 
         # 2. Upsert na tabela 'eventos_rastreamento'
-        upsert_evento_sql = """
+        cursor.execute(
+            "EXECUTE upsert_evento (%(id_pacote)s, %(status_rastreamento)s, %(data_evento)s);",
+            evento_data,
+        )
+        eventos_inseridos = cursor.rowcount
+        logger.debug("[*] %s novos registros de eventos inseridos.", eventos_inseridos)
+
+        # Um evento já gravado com a mesma chave (talvez com outro status) é
+        # descartado pelo ON CONFLICT, então não altera a projeção nem o KPI
+        if not eventos_inseridos:
+            return
+
+        # 3. Projeção do status atual do pacote
+        cursor.execute(
+            "EXECUTE upsert_status_atual (%(id_pacote)s, %(status_rastreamento)s, %(data_evento)s);",
+            evento_data,
+        )
+
+        # 4. KPI de tempo de entrega
+        cursor.execute(LOCK_KPI_ENTREGA_SQL)
+        cursor.execute(
+            "EXECUTE atualizar_kpi_entrega (%(id_pacote)s, %(status_rastreamento)s, %(data_evento)s);",
+            evento_data,
+        )
+
+    _run_with_reconnect(carga, f"o pacote {pacote_data['id_pacote']}")
+    if cache is not None:
+        cache.mark_persisted([pacote_data], [evento_data])
+    # Executado a cada mensagem: os argumentos são passados ao logger, e não
+    # formatados em f-strings, para que fora do DEBUG a mensagem nem seja montada
+    logger.debug(
+        "Registro para o pacote %s processado com sucesso.", pacote_data["id_pacote"]
+    )
+
+
+def _latest_per_pacote(eventos: List[dict]) -> List[dict]:
+    """
+    Mantém apenas o evento mais recente de cada pacote do lote.
+    """
+    ultimos = {}
+    for evento in eventos:
+        atual = ultimos.get(evento["id_pacote"])
+        if atual is None or evento["data_evento"] > atual["data_evento"]:
+            ultimos[evento["id_pacote"]] = evento
+    return list(ultimos.values())
+
+
+def load_batch(
+    pacotes: List[dict], eventos: List[dict], cache: HotKeyCache | None = None
+) -> int:
+    """
+    Carrega um lote de pacotes e eventos no TimescaleDB em uma única transação,
+    com um INSERT de múltiplas linhas por tabela. Retorna a quantidade de eventos novos.
+    Com `cache`, pacotes já conhecidos e eventos já gravados não são enviados ao banco.
+    """
+    if cache is not None:
+        pacotes, eventos = cache.filter_new(pacotes, eventos)
+        if not eventos:
+            logger.debug("Todos os eventos do lote já foram gravados, ignorando.")
+            return 0
+
+    def carga(cursor):
+        # 1. Upsert em lote na tabela 'pacotes'
+        if pacotes:
+            execute_values(
+                cursor,
+                """
+                INSERT INTO pacotes (id_pacote, origem, destino)
+                VALUES %s
+                ON CONFLICT (id_pacote) DO NOTHING;
+                """,
+                pacotes,
+                template="(%(id_pacote)s, %(origem)s, %(destino)s)",
+                page_size=len(pacotes) or 1,
+            )
+            logger.info(f"[*] {cursor.rowcount} novos registros de pacotes inseridos.")
+
+        # 2. Upsert em lote na tabela 'eventos_rastreamento'. A projeção e o KPI
+        # usam apenas os eventos inseridos: um evento já gravado com a mesma chave
+        # (talvez com outro status) é descartado pelo ON CONFLICT
+        linhas = execute_values(
+            cursor,
+            """
             INSERT INTO eventos_rastreamento (id_pacote, status_rastreamento, data_evento)
-            VALUES (%(id_pacote)s, %(status_rastreamento)s, %(data_evento)s)
-            ON CONFLICT (id_pacote, data_evento) DO NOTHING;
-        """
-        cursor.execute(upsert_evento_sql, evento_data)
-        logger.info(f"[*] {cursor.rowcount} novos registros de eventos inseridos.")
+            VALUES %s
+            ON CONFLICT (id_pacote, data_evento) DO NOTHING
+            RETURNING id_pacote, status_rastreamento, data_evento;
+            """,
+            eventos,
+            template="(%(id_pacote)s, %(status_rastreamento)s, %(data_evento)s)",
+            page_size=len(eventos) or 1,
+            fetch=True,
+        )
+        inseridos = [dict(zip(COLUNAS_EVENTO, linha)) for linha in linhas]
+        logger.info(f"[*] {len(inseridos)} novos registros de eventos inseridos.")
+        if not inseridos:
+            return 0
 
-        # Se tudo deu certo, comita a transação
-        conn.commit()
-        logger.info(
-            f"Registro para o pacote {pacote_data['id_pacote']} processado com sucesso."
+        # 3. Projeção do status atual, com um único evento (o mais novo) por pacote,
+        # já que um mesmo INSERT não pode atualizar a mesma linha duas vezes
+        ultimos = _latest_per_pacote(inseridos)
+        execute_values(
+            cursor,
+            """
+            INSERT INTO pacote_status_atual (id_pacote, status_rastreamento, data_evento)
+            VALUES %s
+            ON CONFLICT (id_pacote) DO UPDATE
+            SET status_rastreamento = EXCLUDED.status_rastreamento,
+                data_evento = EXCLUDED.data_evento,
+                atualizado_em = clock_timestamp()
+            WHERE pacote_status_atual.data_evento < EXCLUDED.data_evento;
+            """,
+            ultimos,
+            template="(%(id_pacote)s, %(status_rastreamento)s, %(data_evento)s)",
+            page_size=len(ultimos),
         )
 
-    except Exception as e:
-        logger.exception(
-            "ERRO: Falha ao carregar registro único. Realizando rollback..."
+        # 4. KPI de tempo de entrega
+        cursor.execute(LOCK_KPI_ENTREGA_SQL)
+        execute_values(
+            cursor,
+            ATUALIZAR_KPI_ENTREGA_SQL.format(origem=ORIGEM_VALUES.format(valores="%s")),
+            inseridos,
+            template="(%(id_pacote)s, %(status_rastreamento)s, %(data_evento)s)",
+            page_size=len(inseridos),
         )
-        if conn:
-            conn.rollback()
+        return len(inseridos)
+
+    eventos_inseridos = _run_with_reconnect(carga, f"o lote de {len(eventos)} eventos")
+    if cache is not None:
+        cache.mark_persisted(pacotes, eventos)
+    logger.info(f"Lote com {len(eventos)} eventos processado com sucesso.")
+    return eventos_inseridos
+
+
+def load_batch_isolating_errors(
+    pacotes: List[dict], eventos: List[dict], cache: HotKeyCache | None = None
+) -> List[int]:
+    """
+    Carrega o lote com `load_batch`. Se o banco o rejeitar por um erro nos dados,
+    carrega os registros um a um para que um registro inválido não impeça a
+    gravação dos demais. `pacotes` e `eventos` devem estar alinhados (um pacote
+    por evento). Retorna os índices dos registros rejeitados pelo banco.
+    Erros de conexão (`ERROS_CONEXAO`) são propagados para que a carga seja repetida.
+    """
+    try:
+        load_batch(pacotes, eventos, cache)
+        return []
+    except ERROS_CONEXAO:
         raise
-    finally:
-        if conn:
-            conn.close()
+    except psycopg2.Error as e:
+        logger.warning(
+            f"Lote de {len(eventos)} eventos rejeitado pelo banco, "
+            f"carregando registro a registro: {e}"
+        )
+
+    rejeitados = []
+    for indice, (pacote, evento) in enumerate(zip(pacotes, eventos)):
+        try:
+            load_single_record(pacote, evento, cache)
+        except ERROS_CONEXAO:
+            raise
+        except psycopg2.Error as e:
+            logger.error(
+                f"Registro rejeitado pelo banco e descartado: {evento}. Erro: {e}"
+            )
+            rejeitados.append(indice)
+    return rejeitados
+
+
+def fetch_package_state() -> list[tuple]:
+    """
+    Lê o estado atual de cada pacote (status e data do status, primeiro evento
+    e data de entrega), usado para inicializar o agregador de KPIs do consumer.
+    """
+
+    def carga(cursor):
+        cursor.execute(
+            """
+            SELECT
+                s.id_pacote,
+                s.status_rastreamento,
+                s.data_evento,
+                e.primeiro_evento,
+                e.data_entrega
+            FROM pacote_status_atual s
+            LEFT JOIN pacote_entrega e USING (id_pacote);
+            """
+        )
+        return cursor.fetchall()
+
+    return _run_with_reconnect(carga, "o estado dos pacotes")
+
+
+def save_kpi_snapshot(snapshot: dict):
+    """
+    Grava o snapshot mais recente dos KPIs na tabela `kpi_snapshot` (uma linha).
+    """
+
+    def carga(cursor):
+        cursor.execute(
+            """
+            INSERT INTO kpi_snapshot (id, gerado_em, dados)
+            VALUES (1, %(gerado_em)s, %(dados)s)
+            ON CONFLICT (id) DO UPDATE
+            SET gerado_em = EXCLUDED.gerado_em, dados = EXCLUDED.dados;
+            """,
+            {"gerado_em": snapshot["gerado_em"], "dados": Json(snapshot)},
+        )
+
+    _run_with_reconnect(carga, "o snapshot de KPIs")
@@ -26,4 +26,91 @@ CREATE TABLE eventos_rastreamento (
 SELECT create_hypertable('eventos_rastreamento', 'data_evento');
 
 -- Índice para otimização de joins com a tabela pacotes.
-CREATE INDEX idx_eventos_id_pacote ON eventos_rastreamento(id_pacote);
\ No newline at end of file
+CREATE INDEX idx_eventos_id_pacote ON eventos_rastreamento(id_pacote);
+
+-- Projeção com o status mais recente de cada pacote, mantida pelo consumer.
+-- Permite contar pacotes por status sem varrer todo o histórico de eventos.
+-- `atualizado_em` marca a última alteração da linha e permite à dashboard
+-- buscar apenas os pacotes que mudaram desde a última atualização.
+CREATE TABLE pacote_status_atual (
+    id_pacote INT PRIMARY KEY,
+    status_rastreamento TEXT NOT NULL,
+    data_evento TIMESTAMP WITH TIME ZONE NOT NULL,
+    atualizado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT clock_timestamp(),
+
+    CONSTRAINT fk_status_atual_pacotes
+        FOREIGN KEY(id_pacote)
+        REFERENCES pacotes(id_pacote)
+);
+
+CREATE INDEX idx_status_atual_status ON pacote_status_atual(status_rastreamento);
+CREATE INDEX idx_status_atual_atualizado_em ON pacote_status_atual(atualizado_em);
+
+-- Primeiro evento e data de entrega de cada pacote, mantidos pelo consumer.
+CREATE TABLE pacote_entrega (
+    id_pacote INT PRIMARY KEY,
+    primeiro_evento TIMESTAMP WITH TIME ZONE NOT NULL,
+    data_entrega TIMESTAMP WITH TIME ZONE,
+
+    CONSTRAINT fk_entrega_pacotes
+        FOREIGN KEY(id_pacote)
+        REFERENCES pacotes(id_pacote)
+);
+
+-- Soma e contagem dos tempos de entrega, para ler o KPI de tempo médio em uma linha.
+CREATE TABLE kpi_tempo_entrega (
+    id SMALLINT PRIMARY KEY CHECK (id = 1),
+    soma_duracao INTERVAL NOT NULL,
+    total_entregas BIGINT NOT NULL
+);
+
+INSERT INTO kpi_tempo_entrega (id, soma_duracao, total_entregas) VALUES (1, INTERVAL '0', 0);
+
+-- Último snapshot dos KPIs publicado pelo agregador do consumer (uma linha).
+CREATE TABLE kpi_snapshot (
+    id SMALLINT PRIMARY KEY CHECK (id = 1),
+    gerado_em TIMESTAMP WITH TIME ZONE NOT NULL,
+    dados JSONB NOT NULL
+);
+
+-- Continuous aggregates: agregações materializadas e atualizadas
+-- incrementalmente pelo TimescaleDB. Com materialized_only = false, as
+-- consultas juntam o que já foi materializado aos eventos mais recentes
+-- ainda não processados, então as dashboards continuam em tempo real.
+
+-- Eventos por status a cada hora (transições de status ao longo do tempo).
+CREATE MATERIALIZED VIEW eventos_status_hora
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket(INTERVAL '1 hour', data_evento) AS hora,
+    status_rastreamento,
+    COUNT(*) AS total_eventos
+FROM eventos_rastreamento
+GROUP BY hora, status_rastreamento;
+
+-- Entregas por dia.
+CREATE MATERIALIZED VIEW entregas_dia
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket(INTERVAL '1 day', data_evento) AS dia,
+    COUNT(*) AS total_entregas
+FROM eventos_rastreamento
+WHERE status_rastreamento = 'ENTREGUE'
+GROUP BY dia;
+
+-- Políticas de atualização. O end_offset deixa o intervalo corrente para a parte
+-- em tempo real da consulta. O start_offset é NULL (desde o início do histórico):
+-- os eventos chegam com a data de origem, inclusive em reprocessamentos e cargas
+-- de CSVs antigos, e um evento mais velho que o start_offset nunca seria
+-- materializado, sumindo das consultas assim que a marca d'água avançasse. Como o
+-- TimescaleDB registra as alterações na hypertable, cada execução só recalcula
+-- os buckets que receberam eventos, e não o histórico inteiro.
+SELECT add_continuous_aggregate_policy('eventos_status_hora',
+    start_offset => NULL,
+    end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '5 minutes');
+
+SELECT add_continuous_aggregate_policy('entregas_dia',
+    start_offset => NULL,
+    end_offset => INTERVAL '1 day',
+    schedule_interval => INTERVAL '1 hour');
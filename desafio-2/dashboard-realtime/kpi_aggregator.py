@@ -0,0 +1,189 @@
+import json
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from etl.load import fetch_package_state, save_kpi_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo entre duas publicações do snapshot
+SNAPSHOT_INTERVAL_S = float(os.getenv("KPI_SNAPSHOT_INTERVAL_S", "5"))
+
+# Arquivo usado quando o destino do snapshot é "arquivo"
+SNAPSHOT_PATH = os.getenv("KPI_SNAPSHOT_PATH", "kpi_snapshot.json")
+
+DESTINO_ARQUIVO = "arquivo"
+DESTINO_TABELA = "tabela"
+
+VERSAO_SNAPSHOT = 1
+STATUS_ENTREGUE = "ENTREGUE"
+
+
+def _utc(data: datetime) -> datetime:
+    return data if data.tzinfo else data.replace(tzinfo=timezone.utc)
+
+
+def _duracao(primeiro_evento: datetime, data_entrega: datetime | None) -> float | None:
+    if data_entrega is None:
+        return None
+    return (data_entrega - primeiro_evento).total_seconds()
+
+
+class KpiAggregator:
+    """
+    Mantém em memória os KPIs da dashboard a partir dos eventos persistidos:
+    status atual de cada pacote, contagem por status e a soma/contagem dos
+    tempos de entrega. Segue as mesmas regras do loader: o status só muda com
+    um evento mais novo, e o início e a entrega de um pacote são o menor evento
+    e a maior entrega vistos, então eventos atrasados e repetidos são tratados.
+
+    O agregador enxerga apenas as partições lidas por este consumer; com várias
+    instâncias no mesmo grupo, cada uma publicaria uma visão parcial.
+    """
+
+    def __init__(self):
+        # id_pacote -> [status, data do status, primeiro evento, data de entrega]
+        self._pacotes: dict[int, list] = {}
+        self._contagem: Counter = Counter()
+        self._soma_duracao_s = 0.0
+        self._total_entregas = 0
+
+    def load_initial_state(self):
+        """
+        Inicializa o estado a partir das projeções mantidas no banco, para que
+        o primeiro snapshot já reflita todo o histórico.
+        """
+        linhas = fetch_package_state()
+        for id_pacote, status, data_status, primeiro_evento, data_entrega in linhas:
+            primeiro_evento = _utc(primeiro_evento or data_status)
+            data_entrega = _utc(data_entrega) if data_entrega else None
+            self._pacotes[id_pacote] = [
+                status,
+                _utc(data_status),
+                primeiro_evento,
+                data_entrega,
+            ]
+            self._contagem[status] += 1
+            duracao = _duracao(primeiro_evento, data_entrega)
+            if duracao is not None:
+                self._soma_duracao_s += duracao
+                self._total_entregas += 1
+        logger.info(f"Agregador de KPIs inicializado com {len(linhas)} pacotes.")
+
+    def apply(self, evento: dict):
+        """
+        Aplica um evento já persistido (no formato de `transform_single_record`).
+        """
+        id_pacote = evento["id_pacote"]
+        status = evento["status_rastreamento"]
+        data = _utc(evento["data_evento"])
+        entrega = data if status == STATUS_ENTREGUE else None
+
+        estado = self._pacotes.get(id_pacote)
+        if estado is None:
+            self._pacotes[id_pacote] = [status, data, data, entrega]
+            self._contagem[status] += 1
+            if entrega is not None:
+                self._total_entregas += 1
+            return
+
+        status_atual, data_status, primeiro_evento, data_entrega = estado
+        duracao_anterior = _duracao(primeiro_evento, data_entrega)
+
+        if data > data_status:
+            self._contagem[status_atual] -= 1
+            self._contagem[status] += 1
+            estado[0], estado[1] = status, data
+
+        estado[2] = primeiro_evento = min(primeiro_evento, data)
+        if entrega is not None:
+            estado[3] = data_entrega = max(data_entrega or entrega, entrega)
+
+        duracao_nova = _duracao(primeiro_evento, data_entrega)
+        if duracao_anterior is not None:
+            self._soma_duracao_s -= duracao_anterior
+            self._total_entregas -= 1
+        if duracao_nova is not None:
+            self._soma_duracao_s += duracao_nova
+            self._total_entregas += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "versao": VERSAO_SNAPSHOT,
+            "gerado_em": datetime.now(timezone.utc).isoformat(),
+            "status": {s: total for s, total in self._contagem.items() if total > 0},
+            "total_pacotes": len(self._pacotes),
+            "soma_duracao_s": self._soma_duracao_s,
+            "total_entregas": self._total_entregas,
+        }
+
+
+def _write_file(path: str, snapshot: dict):
+    """
+    Grava o snapshot de forma atômica, para que a dashboard nunca leia um
+    arquivo pela metade.
+    """
+    caminho_temp = f"{path}.tmp"
+    with open(caminho_temp, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(caminho_temp, path)
+
+
+class SnapshotPublisher:
+    """
+    Aplica os eventos persistidos ao agregador e publica o snapshot no destino
+    escolhido no máximo uma vez a cada `intervalo_s` segundos.
+    Deve ser usado apenas pela thread que grava no banco.
+    """
+
+    def __init__(
+        self,
+        destino: str,
+        path: str = SNAPSHOT_PATH,
+        intervalo_s: float = SNAPSHOT_INTERVAL_S,
+    ):
+        self.destino = destino
+        self.path = path
+        self.intervalo_s = intervalo_s
+        self.agregador = KpiAggregator()
+        self.agregador.load_initial_state()
+        self._ultima_publicacao = 0.0
+        self._pendente = True
+
+    def on_persisted(self, eventos: list[dict]):
+        for evento in eventos:
+            self.agregador.apply(evento)
+        self._pendente = True
+        self.tick()
+
+    def tick(self):
+        """
+        Publica o snapshot se houver mudanças e o intervalo já tiver passado.
+        Deve ser chamada também quando não chegam eventos, para que as últimas
+        mudanças não fiquem sem publicar.
+        """
+        if time.monotonic() - self._ultima_publicacao >= self.intervalo_s:
+            self.publish()
+
+    def publish(self):
+        """
+        Publica o snapshot imediatamente, se houver mudanças não publicadas.
+        """
+        if not self._pendente:
+            return
+        snapshot = self.agregador.snapshot()
+        try:
+            if self.destino == DESTINO_TABELA:
+                save_kpi_snapshot(snapshot)
+            else:
+                _write_file(self.path, snapshot)
+        except Exception as e:
+            # Uma falha ao publicar não deve parar o consumo; o próximo
+            # snapshot substitui este
+            logger.warning(f"Falha ao publicar o snapshot de KPIs: {e}")
+            return
+        self._ultima_publicacao = time.monotonic()
+        self._pendente = False
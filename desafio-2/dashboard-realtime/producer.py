@@ -1,8 +1,16 @@
+import argparse
+import csv
 import json
 import logging
+import os
+import struct
+import threading
 import time
+from typing import Iterable, Iterator
 from kafka import KafkaProducer
 
+from etl.codec import FORMATO_BINARIO, FORMATO_JSON, encode_binary
+
 
 def setup_logging():
     """
@@ -21,19 +29,72 @@ logger = logging.getLogger(__name__)
 KAFKA_BROKER_URL = "localhost:9094"
 TOPIC_NAME = "eventos_rastreamento"
 
+# Agrupamento e compressão dos envios: o producer espera até LINGER_MS para
+# juntar mensagens em lotes de até BATCH_SIZE bytes por partição
+PRODUCER_LINGER_MS = int(os.getenv("PRODUCER_LINGER_MS", "20"))
+PRODUCER_BATCH_SIZE = int(os.getenv("PRODUCER_BATCH_SIZE", str(64 * 1024)))
+PRODUCER_COMPRESSION = os.getenv("PRODUCER_COMPRESSION", "gzip") or None
+
+# Formato das mensagens: JSON ou o binário compacto de etl/codec.py
+PRODUCER_FORMAT = os.getenv("PRODUCER_FORMAT", FORMATO_JSON)
+
+# A cada quantos eventos o progresso do envio em massa é registrado no log
+INTERVALO_LOG_PROGRESSO = 10_000
+
+
+def _serializar_chave(id_pacote) -> bytes | None:
+    return None if id_pacote is None else str(id_pacote).encode("utf-8")
+
+
+def _serializar_json(evento: dict) -> bytes:
+    return json.dumps(evento).encode("utf-8")
 
-def inicializar_producer() -> KafkaProducer | None:
+
+def _serializar_binario(evento: dict) -> bytes:
+    """
+    Serializa no formato binário. Eventos que não cabem no layout (ex.: um
+    `id_pacote` não numérico ou um campo ausente em uma linha curta do CSV)
+    seguem em JSON, que o consumer também aceita.
+    """
+    try:
+        return encode_binary(evento)
+    except (
+        AttributeError,
+        KeyError,
+        TypeError,
+        ValueError,
+        OverflowError,
+        struct.error,
+    ):
+        return _serializar_json(evento)
+
+
+def inicializar_producer(
+    linger_ms: int = PRODUCER_LINGER_MS,
+    batch_size: int = PRODUCER_BATCH_SIZE,
+    compression_type: str | None = PRODUCER_COMPRESSION,
+    formato: str = PRODUCER_FORMAT,
+) -> KafkaProducer | None:
     """
     Tenta criar e retornar uma instância do KafkaProducer.
     Retorna None em caso de falha.
+
+    As mensagens usam o `id_pacote` como chave, para que todos os eventos de
+    um pacote caiam na mesma partição e sejam consumidos em ordem.
     """
 
     try:
         producer = KafkaProducer(
             bootstrap_servers=KAFKA_BROKER_URL,
-            value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+            key_serializer=_serializar_chave,
+            value_serializer=(
+                _serializar_binario if formato == FORMATO_BINARIO else _serializar_json
+            ),
             acks="all",
             retries=5,
+            linger_ms=linger_ms,
+            batch_size=batch_size,
+            compression_type=compression_type,
         )
         logger.info("Kafka Producer conectado com sucesso")
         return producer
@@ -53,7 +114,7 @@ def enviar_evento(producer: KafkaProducer, evento: dict):
     """
 
     try:
-        future = producer.send(TOPIC_NAME, value=evento)
+        future = producer.send(TOPIC_NAME, key=evento.get("id_pacote"), value=evento)
         result = future.get(timeout=10)  # Espera 10 segundos
         logger.info(
             f"Evento enviado com sucesso para o tópico '{result.topic}' na partição {result.partition}."
@@ -62,45 +123,177 @@ def enviar_evento(producer: KafkaProducer, evento: dict):
         logger.exception(f"Falha ao enviar evento para o Kafka: {e}")
 
 
+class _ContadorEnvio:
+    """
+    Contadores de confirmações e falhas dos envios assíncronos. Os callbacks
+    rodam na thread de I/O do producer, por isso o acesso é protegido por lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enviados = 0
+        self.falhas = 0
+
+    def sucesso(self, _metadata):
+        with self._lock:
+            self.enviados += 1
+
+    def erro(self, excecao):
+        with self._lock:
+            self.falhas += 1
+        logger.error(f"Falha ao enviar evento para o Kafka: {excecao}")
+
+
+def enviar_eventos(
+    producer: KafkaProducer, eventos: Iterable[dict], taxa: float | None = None
+) -> dict:
+    """
+    Envia eventos em massa sem esperar a confirmação de cada um: o resultado de
+    cada envio é tratado por callbacks, e o producer agrupa as mensagens em lotes.
+    Retorna a quantidade de eventos confirmados, falhos e o tempo total.
+
+    Args:
+        `producer`: A instância do KafkaProducer.
+        `eventos`: Os eventos a enviar, em ordem.
+        `taxa`: Eventos por segundo a sustentar. None envia o mais rápido possível.
+    """
+
+    contador = _ContadorEnvio()
+    inicio = time.monotonic()
+    total = 0
+
+    for evento in eventos:
+        if taxa:
+            # Ritmo constante: o i-ésimo evento só sai no instante i / taxa
+            adiantamento = inicio + total / taxa - time.monotonic()
+            if adiantamento > 0:
+                time.sleep(adiantamento)
+
+        producer.send(
+            TOPIC_NAME, key=evento.get("id_pacote"), value=evento
+        ).add_callback(contador.sucesso).add_errback(contador.erro)
+        total += 1
+
+        if total % INTERVALO_LOG_PROGRESSO == 0:
+            decorrido = time.monotonic() - inicio
+            logger.info(
+                f"{total} eventos enfileirados ({total / decorrido:.0f} eventos/s)."
+            )
+
+    producer.flush()
+    duracao = time.monotonic() - inicio
+    logger.info(
+        f"Envio concluído: {contador.enviados} eventos confirmados e {contador.falhas} "
+        f"falhas em {duracao:.2f}s ({total / duracao if duracao else 0:.0f} eventos/s)."
+    )
+    return {
+        "enviados": contador.enviados,
+        "falhas": contador.falhas,
+        "duracao_s": duracao,
+    }
+
+
+def ler_eventos_csv(file_path: str, limite: int | None = None) -> Iterator[dict]:
+    """
+    Lê o `rastreamento.csv` linha a linha, no formato que a API envia. Os dados
+    não são validados aqui: linhas sujas também chegam ao tópico, como em produção.
+    """
+    with open(file_path, newline="", encoding="utf-8") as f:
+        for i, linha in enumerate(csv.DictReader(f)):
+            if limite is not None and i >= limite:
+                return
+            try:
+                linha["id_pacote"] = int(linha["id_pacote"])
+            except (KeyError, TypeError, ValueError):
+                pass
+            yield linha
+
+
+def enviar_exemplos(producer: KafkaProducer):
+    """
+    Simula requisições no endpoint da API com alguns eventos de exemplo.
+    """
+    evento_1 = {
+        "id_pacote": 1333,
+        "origem": "Natal",
+        "destino": "Paraíba",
+        "status_rastreamento": "AGUARDANDO RETIRADA",
+        "data_atualizacao": "2025-10-12T08:15:00Z",
+    }
+    enviar_evento(producer, evento_1)
+
+    time.sleep(5)
+
+    evento_2 = {
+        "id_pacote": 1411,
+        "origem": "Acre",
+        "destino": "Rondônia",
+        "status_rastreamento": "EXTRAVIADO",
+        "data_atualizacao": "2025-10-12T14:30:00Z",
+    }
+    enviar_evento(producer, evento_2)
+
+    time.sleep(5)
+
+    evento_3 = {
+        "id_pacote": 1333,
+        "origem": "Natal",
+        "destino": "Paraíba",
+        "status_rastreamento": "ENTREGUE",
+        "data_atualizacao": "2025-10-13T17:40:00Z",
+    }
+    enviar_evento(producer, evento_3)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Produtor de eventos de rastreamento.")
+    parser.add_argument(
+        "--replay",
+        metavar="CSV",
+        help="Reenvia os eventos do CSV (ex.: rastreamento.csv) em vez dos exemplos.",
+    )
+    parser.add_argument(
+        "--taxa",
+        type=float,
+        default=0,
+        help="Eventos por segundo no replay (0 envia o mais rápido possível).",
+    )
+    parser.add_argument("--limite", type=int, help="Máximo de eventos do CSV a enviar.")
+    parser.add_argument("--linger-ms", type=int, default=PRODUCER_LINGER_MS)
+    parser.add_argument("--batch-size", type=int, default=PRODUCER_BATCH_SIZE)
+    parser.add_argument(
+        "--compressao",
+        default=PRODUCER_COMPRESSION,
+        help="gzip, snappy, lz4 ou zstd (os três últimos exigem bibliotecas extras).",
+    )
+    parser.add_argument(
+        "--formato",
+        choices=[FORMATO_JSON, FORMATO_BINARIO],
+        default=PRODUCER_FORMAT,
+        help="Codificação das mensagens; o consumer aceita os dois formatos.",
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
     setup_logging()
+    args = parse_args()
     logger.info("Iniciando script do produtor de eventos...")
 
-    kafka_producer = inicializar_producer()
+    kafka_producer = inicializar_producer(
+        args.linger_ms, args.batch_size, args.compressao, args.formato
+    )
 
     if kafka_producer:
-        # Simulando requisições no endpoint da API
-
-        evento_1 = {
-            "id_pacote": 1333,
-            "origem": "Natal",
-            "destino": "Paraíba",
-            "status_rastreamento": "AGUARDANDO RETIRADA",
-            "data_atualizacao": "2025-10-12T08:15:00Z",
-        }
-        enviar_evento(kafka_producer, evento_1)
-
-        time.sleep(5)
-
-        evento_2 = {
-            "id_pacote": 1411,
-            "origem": "Acre",
-            "destino": "Rondônia",
-            "status_rastreamento": "EXTRAVIADO",
-            "data_atualizacao": "2025-10-12T14:30:00Z",
-        }
-        enviar_evento(kafka_producer, evento_2)
-
-        time.sleep(5)
-
-        evento_3 = {
-            "id_pacote": 1333,
-            "origem": "Natal",
-            "destino": "Paraíba",
-            "status_rastreamento": "ENTREGUE",
-            "data_atualizacao": "2025-10-13T17:40:00Z",
-        }
-        enviar_evento(kafka_producer, evento_3)
+        if args.replay:
+            logger.info(f"Reenviando eventos de '{args.replay}'...")
+            enviar_eventos(
+                kafka_producer,
+                ler_eventos_csv(args.replay, args.limite),
+                taxa=args.taxa or None,
+            )
+        else:
+            enviar_exemplos(kafka_producer)
 
         kafka_producer.flush()
         kafka_producer.close()
@@ -1,73 +1,192 @@
+import json
 import os
+from datetime import timedelta
+
 import streamlit as st
 import pandas as pd
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 
+from src.incremental import StatusIncremental
 
-def buscar_dados_do_banco():
+# Intervalo de atualização da dashboard. Os resultados das queries ficam em um
+# cache compartilhado entre todas as sessões pelo mesmo tempo, então o banco
+# recebe uma consulta por intervalo, independente do número de espectadores.
+INTERVALO_ATUALIZACAO_S = 5
+
+# As séries por hora e por dia mudam devagar e podem ficar mais tempo em cache
+TTL_SERIES_S = 60
+
+# Origem dos KPIs: "banco" calcula a partir das projeções; "arquivo" e "tabela"
+# leem o snapshot publicado pelo consumer (`consumer.py --snapshot`)
+FONTE_BANCO = "banco"
+FONTE_ARQUIVO = "arquivo"
+FONTE_TABELA = "tabela"
+
+
+@st.cache_resource
+def get_engine():
     """
-    Conecta ao TimescaleDB e executa as queries para os KPIs.
+    Cria a engine (e seu pool de conexões) uma única vez por processo.
     """
-    print("Buscando dados no banco...")
     load_dotenv(".env")
     db_url = os.getenv("TIMESCALE_DATABASE_URL")
     if not db_url:
-        st.error(
+        raise ValueError(
             "A variável TIMESCALE_DATABASE_URL não foi encontrada no arquivo .env."
         )
+    return create_engine(db_url, pool_pre_ping=True)
+
+
+@st.cache_resource
+def get_status_incremental() -> StatusIncremental:
+    """
+    Estado incremental da contagem por status, compartilhado entre as sessões.
+    """
+    return StatusIncremental()
+
+
+@st.cache_data(ttl=INTERVALO_ATUALIZACAO_S, show_spinner=False)
+def _consultar_kpis():
+    """
+    Executa as queries dos KPIs. Erros são propagados para não ficarem em cache.
+    """
+    print("Buscando dados no banco...")
+    with get_engine().connect() as conn:
+        # Query #1: Contagem de pacotes por status atual. Apenas os pacotes
+        # alterados desde a última atualização são lidos da projeção
+        df_status = get_status_incremental().atualizar(conn)
+
+        # Query #2: Tempo médio de entrega, lido do agregado mantido pelo loader
+        query_tempo_entrega = text(
+            """
+            SELECT soma_duracao / NULLIF(total_entregas, 0) AS tempo_medio_entrega
+            FROM kpi_tempo_entrega
+            WHERE id = 1;
+        """
+        )
+        tempo_medio = conn.execute(query_tempo_entrega).scalar_one_or_none()
+
+    return df_status, tempo_medio
+
+
+def _fonte_kpis() -> str:
+    load_dotenv(".env")
+    return os.getenv("KPI_FONTE", FONTE_BANCO)
+
+
+def _snapshot_para_kpis(snapshot: dict):
+    """
+    Converte o snapshot do agregador para o mesmo formato das queries.
+    """
+    contagem = snapshot["status"]
+    df_status = pd.DataFrame(
+        {
+            "status_rastreamento": list(contagem.keys()),
+            "total_pacotes": list(contagem.values()),
+        }
+    )
+    tempo_medio = None
+    if snapshot["total_entregas"]:
+        tempo_medio = timedelta(
+            seconds=snapshot["soma_duracao_s"] / snapshot["total_entregas"]
+        )
+    return df_status, tempo_medio
+
+
+@st.cache_data(ttl=INTERVALO_ATUALIZACAO_S, show_spinner=False)
+def _ler_snapshot(fonte: str):
+    """
+    Lê o último snapshot publicado. Erros são propagados para não ficarem em cache.
+    """
+    if fonte == FONTE_TABELA:
+        with get_engine().connect() as conn:
+            snapshot = conn.execute(
+                text("SELECT dados FROM kpi_snapshot WHERE id = 1;")
+            ).scalar_one_or_none()
+        if snapshot is None:
+            raise ValueError("Nenhum snapshot de KPIs foi publicado ainda.")
+    else:
+        with open(os.getenv("KPI_SNAPSHOT_PATH", "kpi_snapshot.json")) as f:
+            snapshot = json.load(f)
+    return _snapshot_para_kpis(snapshot)
+
+
+def buscar_dados_do_banco():
+    """
+    Retorna os KPIs (contagem por status e tempo médio de entrega), consultando
+    o TimescaleDB no máximo uma vez por intervalo de atualização.
+    """
+    try:
+        return _consultar_kpis()
+    except Exception as e:
+        st.error(f"Erro ao conectar ou buscar dados do banco: {e}")
         return None, None
 
+
+def buscar_dados_do_snapshot(fonte: str):
+    """
+    Retorna os KPIs a partir do snapshot mantido em memória pelo consumer e
+    publicado em um arquivo JSON ou na tabela `kpi_snapshot`. A leitura tem
+    custo constante, independente do volume de eventos.
+    """
     try:
-        engine = create_engine(db_url)
-        with engine.connect() as conn:
-            # Query #1: Contagem de pacotes por status atual
-            query_status = text(
-                """
-                WITH ultimo_evento AS (
-                    SELECT 
-                        id_pacote, 
-                        status_rastreamento, 
-                        ROW_NUMBER() OVER(PARTITION BY id_pacote ORDER BY data_evento DESC) as rn
-                    FROM eventos_rastreamento             
-                )
-                SELECT
-                    status_rastreamento,
-                    COUNT(id_pacote) AS total_pacotes
-                FROM ultimo_evento
-                WHERE rn = 1
-                GROUP BY status_rastreamento;
+        return _ler_snapshot(fonte)
+    except Exception as e:
+        st.error(f"Erro ao ler o snapshot de KPIs: {e}")
+        return None, None
+
+
+def buscar_kpis():
+    """
+    Retorna os KPIs da origem configurada em `KPI_FONTE` (padrão: "banco").
+    """
+    fonte = _fonte_kpis()
+    if fonte in (FONTE_ARQUIVO, FONTE_TABELA):
+        return buscar_dados_do_snapshot(fonte)
+    return buscar_dados_do_banco()
+
+
+@st.cache_data(ttl=TTL_SERIES_S, show_spinner=False)
+def _consultar_series():
+    """
+    Executa as queries das séries temporais. Erros são propagados para não ficarem em cache.
+    """
+    with get_engine().connect() as conn:
+        # Query #3: Eventos por status nas últimas 24 horas com dados
+        query_eventos_hora = text(
             """
-            )
-            df_status = pd.read_sql(query_status, conn)
-
-            # Query #2: Tempo médio de entrega
-            query_tempo_entrega = text(
-                """
-                WITH entregas_finalizadas AS (
-                    SELECT
-                        id_pacote,
-                        MIN(data_evento) AS data_inicio,
-                        MAX(CASE 
-                                WHEN status_rastreamento = 'ENTREGUE' THEN data_evento 
-                                ELSE NULL 
-                            END) AS data_entrega
-                    FROM
-                        eventos_rastreamento
-                    GROUP BY id_pacote                
-                )
-                                   
-                SELECT
-                    AVG(data_entrega - data_inicio) AS tempo_medio_entrega
-                FROM
-                    entregas_finalizadas
-                WHERE
-                    data_entrega IS NOT NULL;
+            SELECT hora, status_rastreamento, total_eventos
+            FROM eventos_status_hora
+            WHERE hora > (SELECT MAX(hora) FROM eventos_status_hora) - INTERVAL '24 hours'
+            ORDER BY hora;
+        """
+        )
+        df_eventos_hora = pd.read_sql(query_eventos_hora, conn)
+
+        # Query #4: Entregas por dia nos últimos 30 dias com dados
+        query_entregas_dia = text(
             """
-            )
-            tempo_medio = conn.execute(query_tempo_entrega).scalar_one_or_none()
+            SELECT dia, total_entregas
+            FROM entregas_dia
+            WHERE dia > (SELECT MAX(dia) FROM entregas_dia) - INTERVAL '30 days'
+            ORDER BY dia;
+        """
+        )
+        df_entregas_dia = pd.read_sql(query_entregas_dia, conn)
+
+    return df_eventos_hora, df_entregas_dia
 
-        return df_status, tempo_medio
+
+def buscar_series_do_banco():
+    """
+    Busca as séries temporais da dashboard nos continuous aggregates
+    `eventos_status_hora` e `entregas_dia`. As janelas são contadas a partir do
+    bucket mais recente, então o custo não cresce com o histórico.
+    Retorna uma tupla com (eventos por status e hora, entregas por dia).
+    """
+    try:
+        return _consultar_series()
     except Exception as e:
-        st.error(f"Erro ao conectar ou buscar dados do banco: {e}")
+        st.error(f"Erro ao buscar séries temporais do banco: {e}")
         return None, None
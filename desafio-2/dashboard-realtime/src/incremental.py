@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+import pandas as pd
+from sqlalchemy import text
+
+# Intervalo máximo entre duas sincronizações completas da projeção
+INTERVALO_RESYNC_S = 300
+
+# Margem de sobreposição da busca incremental. Uma transação do consumer pode
+# confirmar uma linha com `atualizado_em` anterior à marca d'água já lida; a
+# margem faz essas linhas serem lidas de novo no intervalo seguinte.
+MARGEM_WATERMARK = timedelta(seconds=30)
+
+# Acima dessa quantidade de linhas alteradas, recarregar tudo é mais barato
+MAX_LINHAS_DELTA = 50_000
+
+
+class StatusIncremental:
+    """
+    Mantém em memória o status atual de cada pacote e a contagem por status,
+    aplicando a cada atualização apenas as linhas de `pacote_status_atual`
+    alteradas desde a última leitura (marca d'água em `atualizado_em`).
+
+    Uma sincronização completa é feita na primeira leitura, periodicamente e
+    quando uma lacuna é detectada (muito tempo sem atualizar ou um delta grande
+    demais). O objeto é compartilhado entre as sessões, por isso usa um lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status: dict[int, str] = {}
+        self._contagem: Counter = Counter()
+        self._watermark = None
+        self._ultimo_resync = 0.0
+        self._ultima_atualizacao = 0.0
+
+    def _resync(self, conn):
+        print("Sincronizando status completo dos pacotes...")
+        linhas = conn.execute(
+            text(
+                """
+                SELECT id_pacote, status_rastreamento, atualizado_em
+                FROM pacote_status_atual;
+            """
+            )
+        ).all()
+
+        self._status = {id_pacote: status for id_pacote, status, _ in linhas}
+        self._contagem = Counter(self._status.values())
+        self._watermark = max((linha[2] for linha in linhas), default=None)
+        self._ultimo_resync = time.monotonic()
+
+    def _aplicar_delta(self, conn) -> bool:
+        """
+        Aplica as linhas alteradas desde a marca d'água. Retorna False se o
+        delta for grande demais e uma sincronização completa for preferível.
+        """
+        linhas = conn.execute(
+            text(
+                """
+                SELECT id_pacote, status_rastreamento, atualizado_em
+                FROM pacote_status_atual
+                WHERE atualizado_em > :desde
+                ORDER BY atualizado_em
+                LIMIT :limite;
+            """
+            ),
+            {
+                "desde": self._watermark - MARGEM_WATERMARK,
+                "limite": MAX_LINHAS_DELTA + 1,
+            },
+        ).all()
+
+        if len(linhas) > MAX_LINHAS_DELTA:
+            return False
+
+        # Reaplicar uma linha já vista (pela margem) não altera nada
+        for id_pacote, status, atualizado_em in linhas:
+            anterior = self._status.get(id_pacote)
+            if anterior != status:
+                if anterior is not None:
+                    self._contagem[anterior] -= 1
+                self._contagem[status] += 1
+                self._status[id_pacote] = status
+            self._watermark = max(self._watermark, atualizado_em)
+
+        return True
+
+    def atualizar(self, conn) -> pd.DataFrame:
+        """
+        Atualiza o estado com as alterações recentes e retorna a contagem de
+        pacotes por status, no mesmo formato da query agregada.
+        """
+        with self._lock:
+            agora = time.monotonic()
+            precisa_resync = (
+                self._watermark is None
+                or agora - self._ultimo_resync > INTERVALO_RESYNC_S
+                # Sem atualizações por muito tempo (ninguém assistindo): a
+                # margem pode não cobrir o que foi confirmado nesse período
+                or agora - self._ultima_atualizacao > MARGEM_WATERMARK.total_seconds()
+            )
+            if precisa_resync or not self._aplicar_delta(conn):
+                self._resync(conn)
+            self._ultima_atualizacao = agora
+
+            contagem = {
+                status: total for status, total in self._contagem.items() if total > 0
+            }
+            return pd.DataFrame(
+                {
+                    "status_rastreamento": list(contagem.keys()),
+                    "total_pacotes": list(contagem.values()),
+                }
+            )
@@ -0,0 +1,214 @@
+"""
+Verifica os continuous aggregates `eventos_status_hora` e `entregas_dia` contra
+contagens feitas diretamente em `eventos_rastreamento`.
+
+O script grava eventos sintéticos com datas antigas (fora de qualquer janela
+relativa a now()) e recentes, executa as políticas de atualização dos dois
+agregados, como o agendador do TimescaleDB faria, e compara cada bucket
+materializado com a contagem dos eventos brutos. Ao final os eventos sintéticos
+são removidos e os agregados, atualizados de novo.
+
+A verificação usa o TimescaleDB de `TIMESCALE_DATABASE_URL` (o container do
+docker-compose); prefira um banco de teste. Termina com código 1 se algum
+bucket divergir.
+
+Uso (a partir de desafio-2/dashboard-realtime):
+    python verificar_agregados.py --eventos 2000
+"""
+
+import argparse
+import logging
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+from psycopg2.extras import execute_values
+
+from etl.codec import STATUS_POR_CODIGO
+from etl.load import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Faixa de `id_pacote` dos pacotes sintéticos, no topo do intervalo de 32 bits
+# para não colidir com os dados do producer
+ID_PACOTE_INICIAL = 2_000_000_000
+
+# Datas dos eventos sintéticos: um bloco antigo, como o de um reprocessamento de
+# CSVs de 2025, e um bloco nas últimas horas
+INICIO_HISTORICO = datetime(2025, 1, 1, tzinfo=timezone.utc)
+DURACAO_HISTORICO = timedelta(days=180)
+DURACAO_RECENTE = timedelta(hours=6)
+
+AGREGADOS = ("eventos_status_hora", "entregas_dia")
+
+COMPARAR_EVENTOS_HORA_SQL = """
+    WITH bruto AS (
+        SELECT
+            time_bucket(INTERVAL '1 hour', data_evento) AS hora,
+            status_rastreamento,
+            COUNT(*) AS total_eventos
+        FROM eventos_rastreamento
+        GROUP BY 1, 2
+    )
+    SELECT hora, status_rastreamento, a.total_eventos, b.total_eventos
+    FROM eventos_status_hora a
+    FULL JOIN bruto b USING (hora, status_rastreamento)
+    WHERE a.total_eventos IS DISTINCT FROM b.total_eventos;
+"""
+
+COMPARAR_ENTREGAS_DIA_SQL = """
+    WITH bruto AS (
+        SELECT
+            time_bucket(INTERVAL '1 day', data_evento) AS dia,
+            COUNT(*) AS total_entregas
+        FROM eventos_rastreamento
+        WHERE status_rastreamento = 'ENTREGUE'
+        GROUP BY 1
+    )
+    SELECT dia, a.total_entregas, b.total_entregas
+    FROM entregas_dia a
+    FULL JOIN bruto b USING (dia)
+    WHERE a.total_entregas IS DISTINCT FROM b.total_entregas;
+"""
+
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] [%(name)s] - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+
+def gerar_eventos(quantidade: int, seed: int = 42) -> list[tuple]:
+    """
+    Gera `quantidade` eventos (id_pacote, status, data), metade no bloco antigo
+    e metade nas últimas horas. Cada pacote recebe um único evento.
+    """
+    rng = random.Random(seed)
+    agora = datetime.now(timezone.utc)
+    status = list(STATUS_POR_CODIGO.values())
+
+    eventos = []
+    for i in range(quantidade):
+        if i % 2 == 0:
+            data = INICIO_HISTORICO + DURACAO_HISTORICO * rng.random()
+        else:
+            data = agora - DURACAO_RECENTE * rng.random()
+        eventos.append((ID_PACOTE_INICIAL + i, rng.choice(status), data))
+    return eventos
+
+
+def inserir_eventos(conn, eventos: list[tuple]):
+    with conn.cursor() as cursor:
+        execute_values(
+            cursor,
+            """
+            INSERT INTO pacotes (id_pacote, origem, destino) VALUES %s
+            ON CONFLICT (id_pacote) DO NOTHING;
+            """,
+            [(id_pacote, "Origem", "Destino") for id_pacote, _, _ in eventos],
+        )
+        execute_values(
+            cursor,
+            """
+            INSERT INTO eventos_rastreamento (id_pacote, status_rastreamento, data_evento)
+            VALUES %s
+            ON CONFLICT (id_pacote, data_evento) DO NOTHING;
+            """,
+            eventos,
+        )
+
+
+def remover_eventos(conn, quantidade: int):
+    with conn.cursor() as cursor:
+        faixa = (ID_PACOTE_INICIAL, ID_PACOTE_INICIAL + quantidade)
+        cursor.execute(
+            "DELETE FROM eventos_rastreamento WHERE id_pacote >= %s AND id_pacote < %s;",
+            faixa,
+        )
+        cursor.execute(
+            "DELETE FROM pacotes WHERE id_pacote >= %s AND id_pacote < %s;", faixa
+        )
+
+
+def executar_politicas(conn):
+    """
+    Executa agora o job da política de atualização de cada agregado, o mesmo
+    que o agendador do TimescaleDB executa periodicamente.
+    """
+    with conn.cursor() as cursor:
+        for agregado in AGREGADOS:
+            cursor.execute(
+                """
+                SELECT j.job_id
+                FROM timescaledb_information.jobs j
+                JOIN timescaledb_information.continuous_aggregates c
+                    ON j.hypertable_schema = c.materialization_hypertable_schema
+                    AND j.hypertable_name = c.materialization_hypertable_name
+                WHERE c.view_name = %s
+                    AND j.proc_name = 'policy_refresh_continuous_aggregate';
+                """,
+                (agregado,),
+            )
+            linha = cursor.fetchone()
+            if linha is None:
+                raise RuntimeError(
+                    f"Política de atualização de '{agregado}' não encontrada."
+                )
+            cursor.execute("CALL run_job(%s);", linha)
+            logger.info(f"Política de '{agregado}' executada (job {linha[0]}).")
+
+
+def comparar(conn) -> int:
+    """
+    Compara os agregados às contagens brutas. Retorna o número de buckets divergentes.
+    """
+    divergencias = 0
+    with conn.cursor() as cursor:
+        for agregado, sql in (
+            ("eventos_status_hora", COMPARAR_EVENTOS_HORA_SQL),
+            ("entregas_dia", COMPARAR_ENTREGAS_DIA_SQL),
+        ):
+            cursor.execute(sql)
+            linhas = cursor.fetchall()
+            for linha in linhas[:10]:
+                logger.error(f"'{agregado}' diverge das contagens brutas: {linha}")
+            if linhas:
+                logger.error(f"'{agregado}': {len(linhas)} buckets divergentes.")
+            else:
+                logger.info(f"'{agregado}' confere com as contagens brutas.")
+            divergencias += len(linhas)
+    return divergencias
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--eventos", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    # `run_job` e `refresh_continuous_aggregate` não rodam dentro de uma transação
+    conn.autocommit = True
+    try:
+        inserir_eventos(conn, gerar_eventos(args.eventos, args.seed))
+        logger.info(f"{args.eventos} eventos sintéticos gravados.")
+        try:
+            executar_politicas(conn)
+            divergencias = comparar(conn)
+        finally:
+            remover_eventos(conn, args.eventos)
+            executar_politicas(conn)
+            logger.info("Eventos sintéticos removidos.")
+    finally:
+        conn.close()
+
+    sys.exit(1 if divergencias else 0)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()